@@ -0,0 +1,128 @@
+import atexit
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Optional
+
+from confluent_kafka import Producer
+
+from periodic import PeriodicTask
+
+
+@dataclass
+class ClickEvent:
+    short_code: str
+    user_agent: str = ''
+    ip_address: str = ''
+    referrer: str = ''
+    device_info: Optional[str] = None
+    sec_ch_ua_platform: str = ''
+    sec_ch_ua: str = ''
+    sec_ch_ua_mobile: str = ''
+    timestamp: str = ''
+
+    @classmethod
+    def from_metadata(cls, short_code: str, metadata) -> 'ClickEvent':
+        return cls(
+            short_code=short_code,
+            user_agent=metadata.user_agent,
+            ip_address=metadata.ip_address,
+            referrer=metadata.referrer,
+            sec_ch_ua_platform=metadata.sec_ch_ua_platform,
+            sec_ch_ua=metadata.sec_ch_ua,
+            sec_ch_ua_mobile=metadata.sec_ch_ua_mobile,
+            timestamp=datetime.utcnow().isoformat(),
+        )
+
+
+class ClickEventPublisher:
+    """
+    Non-blocking Kafka publisher for redirect events.
+
+    `publish` only appends to librdkafka's local buffer, which is bounded by
+    `max_buffered` messages; when it is full the event is dropped and counted
+    rather than stalling the redirect. Messages are batched for `linger_ms` and
+    delivery callbacks are served by a background poll. The producer is created
+    per process so its internal threads are never inherited across fork.
+    """
+
+    def __init__(self, broker: str, topic: str, linger_ms: int = 50, batch_size: int = 10000,
+                 max_buffered: int = 100000, poll_interval: float = 0.1):
+        self.topic = topic
+        self.config = {
+            'bootstrap.servers': broker,
+            'linger.ms': linger_ms,
+            'batch.num.messages': batch_size,
+            'queue.buffering.max.messages': max_buffered,
+            'compression.type': 'lz4',
+            'acks': 1,
+        }
+        self._producer = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._task = PeriodicTask("kafka-poller", poll_interval, self._poll)
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.delivery_errors = 0
+
+    def _get_producer(self) -> Producer:
+        if self._pid != os.getpid() or self._producer is None:
+            with self._lock:
+                if self._pid != os.getpid() or self._producer is None:
+                    self._producer = Producer(self.config)
+                    self._pid = os.getpid()
+                    atexit.register(self.flush)
+        self._task.ensure_started()
+        return self._producer
+
+    def _on_delivery(self, err, msg):
+        if err is not None:
+            self.delivery_errors += 1
+            logging.error("Click event delivery failed: %s", err)
+        else:
+            self.delivered += 1
+
+    def _poll(self):
+        if self._producer is not None and self._pid == os.getpid():
+            # Non-blocking: a blocking poll would stall the whole eventlet/gevent hub
+            self._producer.poll(0)
+
+    def publish(self, event: ClickEvent) -> bool:
+        producer = self._get_producer()
+        try:
+            producer.produce(
+                self.topic,
+                key=event.short_code,
+                value=json.dumps(asdict(event)),
+                on_delivery=self._on_delivery,
+            )
+        except BufferError:
+            self.dropped += 1
+            return False
+        self.published += 1
+        return True
+
+    def queue_length(self) -> int:
+        if self._producer is None or self._pid != os.getpid():
+            return 0
+        return len(self._producer)
+
+    def flush(self, timeout: float = 5.0) -> int:
+        """Wait for buffered events to be delivered; returns the number still undelivered"""
+        if self._producer is None or self._pid != os.getpid():
+            return 0
+        return self._producer.flush(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue_length(),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "delivery_errors": self.delivery_errors,
+        }
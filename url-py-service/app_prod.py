@@ -1,31 +1,41 @@
 import os
 import redis
-import uuid
-from flask import Flask, request, g, jsonify, redirect, Response
+from flask import Flask, request, g, jsonify, redirect, Response, stream_with_context
 from threading import Thread
 import time
-from dataclasses import dataclass, field
-from dataclass_wizard import JSONSerializable
-from typing import Optional
-from datetime import datetime
-from confluent_kafka import Producer
+from typing import Optional, Tuple
+from itertools import islice
 import json
 import logging
 from flask_cors import CORS
 from urllib.parse import urlparse
-import psycopg2
-from psycopg2 import sql
-import html
 from redis.exceptions import ConnectionError, AuthenticationError, TimeoutError, RedisError
 
 from flask_socketio import SocketIO, emit
 
-from db.pg_connector import get_from_database
-from validations import is_valid_url, is_valid_url_cache
+from db.pg_connector import lookup_url_entry, lookup_urls, insert_urls, copy_urls, add_clicks, existing_short_codes, find_short_code_by_hash, fetch_urls_page, LISTING_COLUMNS, pool_stats, replica_stats, reset_pools, warm_pools, ShortCodeConflict
+from db.write_behind import create_write_behind
+from click_counter import create_click_counter
+from analytics import ClickEvent, ClickEventPublisher
+from url_cache import LocalURLCache, CacheInvalidator
+from url_listing import ListingCache, encode_cursor, decode_cursor
+from redis_store import URLStore
+from cache_codec import CacheTTLPolicy, create_codec
+from log_config import configure_logging, logging_stats
+from metrics import latency_summary, counter, histogram, gauge, render_prometheus, ensure_sync_started
+from event_bus import EventBus
+from stats import StatsAggregator
+from codegen import CodeGenerator, PoolRefiller
+from code_lease import ShortCodeLease
+from redis_lock import RedisLock
+from singleflight import SingleFlight
+from dedup import URLDeduplicator, url_hash
+from models import RequestMetadata, URLData
+from validations import is_valid_url, is_valid_short_code, validate_many, validation_cache_stats, short_code_rejects
+from bulk import NDJSON_MIMETYPE, bulk_format, read_items, batched, csv_header, encode_results, result_line
 
-# LOGGING
-logging.basicConfig(level=logging.DEBUG)
-logging.debug("Debug message")
+# LOGGING - queued, sampled JSON logs; see log_config.py for the environment variables
+configure_logging()
 
 # Environment variables for Redis connection
 REDIS_PC = os.getenv('REDIS_PC')
@@ -34,40 +44,137 @@ REDIS_PASSWORD = os.getenv('REDIS_PASSWORD', 'Welcome@Inf0r')
 REDIS_PORT_CACHE = 6379
 REDIS_PORT_PRE_GEN = 6379
 REDIS_DB = 0
+# Per-pool, per-worker connection cap; a request waits up to REDIS_POOL_TIMEOUT
+# seconds for a free connection instead of failing when all are in use
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', '2'))
 
 # Environment variablesW
 KAFKA_TOPIC = os.getenv('KAFKA_TOPIC', 'url-shortening')
 KAFKA_BROKER = os.getenv('KAFKA_BROKER')
-DB_HOST = os.getenv('DB_HOST')
-DB_NAME = "yourdbname"
-DB_USER = "yourusername"
-DB_PASSWORD = "yourpassword"
-DB_PORT = 5432
+KAFKA_LINGER_MS = int(os.getenv('KAFKA_LINGER_MS', '50'))
+KAFKA_MAX_BUFFERED = int(os.getenv('KAFKA_MAX_BUFFERED', '100000'))
 URL_LENGTH_MAX = 8
 
+# Write-behind for new URL rows: 'off' (inline INSERT), 'memory' or 'redis' (durable stream)
+WRITE_BEHIND_MODE = os.getenv('WRITE_BEHIND_MODE', 'memory')
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', '500'))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', '0.5'))
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv('WRITE_BEHIND_MAX_QUEUE', '10000'))
+WRITE_BEHIND_ENQUEUE_TIMEOUT = float(os.getenv('WRITE_BEHIND_ENQUEUE_TIMEOUT', '0.05'))
+
+# Click aggregation: 'local' (per-worker sharded counter) or 'redis' (shared hash on the pre-gen Redis)
+CLICK_COUNTER_BACKEND = os.getenv('CLICK_COUNTER_BACKEND', 'local')
+CLICK_FLUSH_INTERVAL = float(os.getenv('CLICK_FLUSH_INTERVAL', '5'))
+
+# Per-worker L1 cache in front of the Redis URL cache
+L1_CACHE_SIZE = int(os.getenv('L1_CACHE_SIZE', '10000'))
+L1_CACHE_TTL = float(os.getenv('L1_CACHE_TTL', '60'))
+L1_NEGATIVE_TTL = float(os.getenv('L1_NEGATIVE_TTL', '5'))
+L1_INVALIDATION_CHANNEL = os.getenv('L1_INVALIDATION_CHANNEL', 'url-cache:invalidate')
+
+# Redis URL cache storage: 'compact' (tagged, dictionary-compressed bytes) or 'escaped' (legacy
+# html-escaped strings); both read either format. A CACHE_HASH_PREFIX (e.g. 'u:') groups mappings
+# into CACHE_HASH_BUCKETS small hashes instead of one key per link.
+CACHE_CODEC = os.getenv('CACHE_CODEC', 'compact')
+CACHE_COMPRESS_MIN_LENGTH = int(os.getenv('CACHE_COMPRESS_MIN_LENGTH', '24'))
+CACHE_HASH_PREFIX = os.getenv('CACHE_HASH_PREFIX', '')
+CACHE_HASH_BUCKETS = int(os.getenv('CACHE_HASH_BUCKETS', '65536'))
+
+# Cache expiry: new links, backfills after a miss (scaled by clicks), and hot links
+CACHE_TTL_NEW = int(os.getenv('CACHE_TTL_NEW', str(7 * 86400)))
+CACHE_TTL_MISS = int(os.getenv('CACHE_TTL_MISS', '3600'))
+CACHE_TTL_HOT = int(os.getenv('CACHE_TTL_HOT', str(30 * 86400)))
+CACHE_HOT_HITS = int(os.getenv('CACHE_HOT_HITS', '3'))
+
+# Stampede protection: entries with less than CACHE_STALE_WINDOW seconds left are served
+# and refreshed in the background; misses are filled once per code across workers
+CACHE_STALE_WINDOW = float(os.getenv('CACHE_STALE_WINDOW', '300'))
+CACHE_FILL_LOCK_MS = int(os.getenv('CACHE_FILL_LOCK_MS', '2000'))
+CACHE_FILL_WAIT_MS = int(os.getenv('CACHE_FILL_WAIT_MS', '250'))
+
+# Built-in short-code generator keeping the pre-gen `short_urls` list topped up
+CODEGEN_ENABLED = os.getenv('CODEGEN_ENABLED', 'true').lower() == 'true'
+SHORT_CODE_POOL_LOW_WATER = int(os.getenv('SHORT_CODE_POOL_LOW_WATER', '10000'))
+SHORT_CODE_POOL_HIGH_WATER = int(os.getenv('SHORT_CODE_POOL_HIGH_WATER', '50000'))
+SHORT_CODE_REFILL_INTERVAL = float(os.getenv('SHORT_CODE_REFILL_INTERVAL', '5'))
+
+# Codes leased per LPOP into a per-worker buffer (0 = claim one code per request)
+CODE_LEASE_SIZE = int(os.getenv('CODE_LEASE_SIZE', '500'))
+
+# Bulk shorten: items per validate/claim/pipeline/COPY round, and the cap per request
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '500'))
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', '1000000'))
+
+# /api/v1/urls listing: page size bounds and the per-worker page cache TTL
+LISTING_DEFAULT_LIMIT = int(os.getenv('LISTING_DEFAULT_LIMIT', '50'))
+LISTING_MAX_LIMIT = int(os.getenv('LISTING_MAX_LIMIT', '200'))
+LISTING_CACHE_TTL = float(os.getenv('LISTING_CACHE_TTL', '2'))
+LISTING_DEFAULT_FIELDS = ('id', 'original_url', 'short_code', 'clicks', 'created_at')
+
+# Real-time dashboard events (SSE fan-out through a capped Redis stream on the cache Redis)
+EVENT_STREAM_MAXLEN = int(os.getenv('EVENT_STREAM_MAXLEN', '10000'))
+EVENT_COALESCE_INTERVAL = float(os.getenv('EVENT_COALESCE_INTERVAL', '1'))
+SSE_CLIENT_QUEUE_SIZE = int(os.getenv('SSE_CLIENT_QUEUE_SIZE', '256'))
+SOCKETIO_EVENTS = os.getenv('SOCKETIO_EVENTS', 'false').lower() == 'true'
+
+# Pre-aggregated dashboard stats (counters, time buckets, top links) on the cache Redis
+STATS_FLUSH_INTERVAL = float(os.getenv('STATS_FLUSH_INTERVAL', '5'))
+STATS_TOP_K = int(os.getenv('STATS_TOP_K', '100'))
+
+# Batch resolve: max codes per request (bounds the response size)
+RESOLVE_BATCH_MAX = int(os.getenv('RESOLVE_BATCH_MAX', '1000'))
+
+# Opt-in: shortening a non-custom URL that was shortened before returns the existing code
+URL_DEDUP = os.getenv('URL_DEDUP', 'false').lower() == 'true'
+URL_DEDUP_TTL = int(os.getenv('URL_DEDUP_TTL', '86400'))
+
+# Set by gunicorn.conf.py when the app is preloaded in the master: client
+# initialization then runs per worker in the post_fork hook instead of at import
+DEFER_WORKER_INIT = os.getenv('DEFER_WORKER_INIT', '').lower() in ('1', 'true')
+
 # Redis Clients - Connection pools
-redis_pool_pre_gen = redis.ConnectionPool(
+redis_pool_pre_gen = redis.BlockingConnectionPool(
     host=REDIS_URL,
     port=REDIS_PORT_PRE_GEN,
     password=REDIS_PASSWORD,
     db=REDIS_DB,
-    max_connections=10,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
     socket_timeout=5,
     socket_connect_timeout=5,
     decode_responses=True,
 )
 
-redis_pool_cache = redis.ConnectionPool(
+# When the cache and the pre-gen pool are the same instance, share one pool so
+# claiming a code and caching its mapping can be a single atomic script call
+REDIS_SHARED_INSTANCE = REDIS_PC == REDIS_URL and REDIS_PORT_CACHE == REDIS_PORT_PRE_GEN
+
+redis_pool_cache = redis_pool_pre_gen if REDIS_SHARED_INSTANCE else redis.BlockingConnectionPool(
     host=REDIS_PC,
     port=REDIS_PORT_CACHE,
     password=REDIS_PASSWORD,
     db=REDIS_DB,
-    max_connections=10,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
     socket_timeout=5,
     socket_connect_timeout=5,
     decode_responses=True,
 )
 
+# Binary-safe pool for reading cached URL values (compressed values are not UTF-8)
+redis_pool_cache_raw = redis.BlockingConnectionPool(
+    host=REDIS_PC,
+    port=REDIS_PORT_CACHE,
+    password=REDIS_PASSWORD,
+    db=REDIS_DB,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
+    socket_timeout=5,
+    socket_connect_timeout=5,
+    decode_responses=False,
+)
+
 # Global Redis client variables
 redis_client_pre_gen = None
 redis_client_cache = None
@@ -81,7 +188,7 @@ def initialize_redis_client(pool):
         try:
             redis_client = redis.Redis(connection_pool=pool)
             if redis_client.ping():
-                logging.error("Connected to Redis!")
+                logging.info("Connected to Redis!")
                 return redis_client
             else:
                 logging.error("Failed to connect to Redis.")
@@ -90,13 +197,13 @@ def initialize_redis_client(pool):
             logging.error("Redis authentication failed. Check your password.")
             break
         except ConnectionError:
-            logging.error(f"Redis connection failed. Retrying in {delay} seconds... (Attempt {attempt + 1}/{retries})")
+            logging.error("Redis connection failed. Retrying in %s seconds... (Attempt %s/%s)", delay, attempt + 1, retries)
             time.sleep(delay)
         except TimeoutError:
-            logging.error(f"Redis connection timed out. Retrying in {delay} seconds... (Attempt {attempt + 1}/{retries})")
+            logging.error("Redis connection timed out. Retrying in %s seconds... (Attempt %s/%s)", delay, attempt + 1, retries)
             time.sleep(delay)
         except Exception as e:
-            logging.error(f"Unexpected error connecting to Redis: {e}")
+            logging.error("Unexpected error connecting to Redis: %s", e)
             break
 
     logging.error("Failed to initialize Redis after multiple attempts.")
@@ -118,78 +225,235 @@ def init_redis_clients():
     
     return redis_client_pre_gen, redis_client_cache
 
-# Initialize Redis clients immediately when module loads
-try:
-    init_redis_clients()
-    logging.info("Redis clients initialized successfully")
-except Exception as e:
-    logging.error(f"Failed to initialize Redis clients: {e}")
-    # Don't raise here - let the app start and handle errors in endpoints
+# Cached /api/v1/urls pages, versioned through the cache Redis
+url_listing = ListingCache(redis.Redis(connection_pool=redis_pool_cache), ttl=LISTING_CACHE_TTL)
+
+def store_url_rows(url_data_dicts: list) -> int:
+    """Insert URL rows, then expire every worker's cached listing pages"""
+    inserted = insert_urls(url_data_dicts)
+    url_listing.bump()
+    return inserted
+
+# Write-behind stage for new URL rows (the durable mode keeps its stream on the pre-gen Redis)
+url_writer = create_write_behind(
+    WRITE_BEHIND_MODE,
+    store_url_rows,
+    redis_client=redis.Redis(connection_pool=redis_pool_pre_gen),
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+    max_queue=WRITE_BEHIND_MAX_QUEUE,
+    enqueue_timeout=WRITE_BEHIND_ENQUEUE_TIMEOUT,
+)
+
+# Redirect clicks are aggregated and merged into urls.clicks periodically
+click_counter = create_click_counter(
+    CLICK_COUNTER_BACKEND,
+    add_clicks,
+    redis_client=redis.Redis(connection_pool=redis_pool_pre_gen),
+    flush_interval=CLICK_FLUSH_INTERVAL,
+)
+
+# L1 cache with cross-worker invalidation over pub/sub on the cache Redis
+l1_cache = LocalURLCache(max_size=L1_CACHE_SIZE, ttl=L1_CACHE_TTL, negative_ttl=L1_NEGATIVE_TTL)
+l1_invalidator = CacheInvalidator(
+    redis.Redis(connection_pool=redis_pool_cache),
+    l1_cache,
+    channel=L1_INVALIDATION_CHANNEL,
+)
+
+# Redis data-access layer for the URL cache and the pre-gen pool
+url_store = URLStore(
+    redis.Redis(connection_pool=redis_pool_cache_raw),
+    redis.Redis(connection_pool=redis_pool_pre_gen),
+    same_instance=REDIS_SHARED_INSTANCE,
+    invalidation_channel=L1_INVALIDATION_CHANNEL,
+    codec=create_codec(CACHE_CODEC, compress_min_length=CACHE_COMPRESS_MIN_LENGTH),
+    hash_prefix=CACHE_HASH_PREFIX,
+    hash_buckets=CACHE_HASH_BUCKETS,
+)
+# Coalesces concurrent cache fills for the same code within this worker
+cache_fills = SingleFlight(wait_timeout=5.0)
+cache_fill_redis = redis.Redis(connection_pool=redis_pool_cache)
+
+cache_ttl = CacheTTLPolicy(
+    new_ttl=CACHE_TTL_NEW,
+    miss_ttl=CACHE_TTL_MISS,
+    hot_ttl=CACHE_TTL_HOT,
+    hot_hits=CACHE_HOT_HITS,
+)
+
+# Hash-index front for shorten-time dedup, on the cache Redis
+url_dedup = URLDeduplicator(
+    redis.Redis(connection_pool=redis_pool_cache),
+    find_short_code_by_hash,
+    ttl=URL_DEDUP_TTL,
+) if URL_DEDUP else None
+
+# Per-worker buffer of codes leased in blocks from the pre-gen pool
+code_lease = ShortCodeLease(url_store, lease_size=CODE_LEASE_SIZE) if CODE_LEASE_SIZE > 0 else None
+
+# Background refiller for the pre-gen pool
+pool_refiller = PoolRefiller(
+    redis.Redis(connection_pool=redis_pool_pre_gen),
+    CodeGenerator(redis.Redis(connection_pool=redis_pool_pre_gen), exists_fn=existing_short_codes),
+    low_water=SHORT_CODE_POOL_LOW_WATER,
+    high_water=SHORT_CODE_POOL_HIGH_WATER,
+    interval=SHORT_CODE_REFILL_INTERVAL,
+) if CODEGEN_ENABLED else None
+
+# Shorten/redirect events for the dashboard streams, coalesced per worker
+event_bus = EventBus(
+    redis.Redis(connection_pool=redis_pool_cache),
+    maxlen=EVENT_STREAM_MAXLEN,
+    coalesce_interval=EVENT_COALESCE_INTERVAL,
+    client_queue_size=SSE_CLIENT_QUEUE_SIZE,
+)
+
+# Rolling counters and rollups behind /api/v1/stats
+dashboard_stats = StatsAggregator(
+    redis.Redis(connection_pool=redis_pool_cache),
+    flush_interval=STATS_FLUSH_INTERVAL,
+    top_k=STATS_TOP_K,
+)
+
+# Request metrics for /metrics; label sets used on every redirect are bound once here
+http_requests = counter('http_requests_total', help="Requests by route, method and status",
+                        labelnames=('route', 'method', 'status'))
+http_request_seconds = histogram('http_request_seconds', help="Request latency by route", labelnames=('route',))
+resolve_seconds = histogram('resolve_seconds', help="Redirect latency by where the URL was found",
+                            labelnames=('outcome',))
+resolve_latency = {
+    outcome: resolve_seconds.labels(outcome)
+    for outcome in ('l1_hit', 'l1_negative', 'redis_hit', 'redis_stale', 'db_fallback', 'miss',
+                    'db_error', 'invalid', 'unavailable')
+}
 
 # Configure Flask
+CORS_ORIGINS = ["https://www.bigshort.one", "https://bigshort.one", "http://localhost:4173"]
+
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins=["https://www.bigshort.one", "https://bigshort.one", "http://localhost:4173"])
+socketio = SocketIO(app, cors_allowed_origins=CORS_ORIGINS)
 
 CORS(app, resources={
     r"/*": {
-        "origins": ["https://www.bigshort.one", "https://bigshort.one", "http://localhost:4173"],
+        "origins": CORS_ORIGINS,
         "methods": ["GET", "POST", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"],
         "supports_credentials": True
     },
 })
 
-# Kafka Topic
-producer = Producer({'bootstrap.servers': KAFKA_BROKER}) if KAFKA_BROKER else None
-
-# Connect to the Postgres Database
-def get_db_connection():
-    return psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
+# Kafka Topic - redirect events for url_clicks (loaded by click_consumer.py)
+click_events = ClickEventPublisher(
+    KAFKA_BROKER,
+    KAFKA_TOPIC,
+    linger_ms=KAFKA_LINGER_MS,
+    max_buffered=KAFKA_MAX_BUFFERED,
+) if KAFKA_BROKER else None
+
+def init_worker():
+    """Per-process initialization; runs in every worker after fork (see gunicorn.conf.py)"""
+    global redis_client_pre_gen, redis_client_cache
 
-@dataclass
-class RequestMetadata:
-    user_agent: str = ''
-    ip_address: str = ''
-    referrer: str = ''
-    sec_ch_ua_platform: str = ''
-    sec_ch_ua: str = ''
-    sec_ch_ua_mobile: str = ''
+    # Never reuse sockets opened by a parent process
+    redis_pool_pre_gen.reset()
+    if redis_pool_cache is not redis_pool_pre_gen:
+        redis_pool_cache.reset()
+    redis_pool_cache_raw.reset()
+    reset_pools()
+    redis_client_pre_gen = None
+    redis_client_cache = None
+
+    try:
+        init_redis_clients()
+        logging.info("Redis clients initialized successfully")
+    except Exception as e:
+        logging.error("Failed to initialize Redis clients: %s", e)
+        # Don't raise here - let the app start and handle errors in endpoints
+
+    try:
+        warm_pools()
+    except Exception as e:
+        logging.error("Failed to warm the database pools: %s", e)
+
+    # Background tasks are per process; the Kafka producer is created lazily per process
+    l1_invalidator.ensure_started()
+    ensure_sync_started()
+    if pool_refiller is not None:
+        pool_refiller.ensure_started()
+    if SOCKETIO_EVENTS:
+        event_bus.add_listener(lambda event: socketio.emit(event.type, json.loads(event.data)))
+
+def shutdown_worker():
+    """Graceful worker exit: hand back leased codes and flush everything buffered"""
+    if code_lease is not None:
+        code_lease.release_all()
+    if url_writer is not None:
+        url_writer.stop()
+    click_counter.flush()
+    if click_events is not None:
+        click_events.flush()
+    try:
+        event_bus.flush()
+    except Exception as e:
+        logging.error("Failed to flush dashboard events: %s", e)
+    try:
+        dashboard_stats.flush()
+    except Exception as e:
+        logging.error("Failed to flush dashboard stats: %s", e)
+
+# Initialize clients immediately when the module loads, unless a pre-fork server does it per worker
+if not DEFER_WORKER_INIT:
+    init_worker()
 
 # Middleware to set request metadata before each request
 @app.before_request
 def set_request_metadata():
-    forwarded_for = request.headers.get('X-Forwarded-For', '')
-    g.request_metadata = RequestMetadata(
-        user_agent=request.headers.get('User-Agent', ''),
-        ip_address=forwarded_for.split(',')[0].strip() if forwarded_for else request.remote_addr,
-        referrer=request.headers.get('Referer', ''),
-        sec_ch_ua_platform=request.headers.get('sec-ch-ua-platform', ''),
-        sec_ch_ua=request.headers.get('sec-ch-ua', ''),
-        sec_ch_ua_mobile=request.headers.get('sec-ch-ua-mobile', '')
-    )
+    g.request_started = time.perf_counter()
+    g.request_metadata = RequestMetadata.from_headers(request.headers, request.remote_addr)
+
+def observe_request(route: str, method: str, status: int, elapsed: float, outcome: Optional[str] = None):
+    http_requests.labels(route, method, status).inc()
+    http_request_seconds.labels(route).observe(elapsed)
+    if outcome is not None:
+        resolve_latency[outcome].observe(elapsed)
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    observe_request(route, request.method, response.status_code, time.perf_counter() - started,
+                    g.get('resolve_outcome'))
+    return response
 
-@dataclass
-class URLData(JSONSerializable):
-    url: str = ""
-    short_url: str = ""
-    is_public: bool = False
-    clicks: int = 0
-    custom_url: bool = False
-    id: str = field(default_factory=lambda: uuid.uuid4().hex)
-    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
-    user_agent: Optional[str] = None
-    ip_address: Optional[str] = None
-    referrer: Optional[str] = None
-    device_info: Optional[str] = None
-    sec_ch_ua_platform: Optional[str] = None
-    sec_ch_ua: Optional[str] = None
-    sec_ch_ua_mobile: Optional[str] = None
+def db_pool_connections() -> dict:
+    connections = {}
+    pools = [('primary', pool_stats())] + [(replica['name'], replica['pool'])
+                                           for replica in replica_stats()['replicas']]
+    for name, stats in pools:
+        connections[(name, 'idle')] = stats['idle']
+        connections[(name, 'in_use')] = stats['in_use']
+    return connections
+
+# Queue depths and client counts, read when /metrics is scraped
+gauge('short_code_pool_depth', lambda: pool_refiller.depth if pool_refiller else None,
+      help="Codes in the pre-gen pool at the refiller's last check", aggregate='max')
+gauge('code_lease_buffered', lambda: code_lease.stats()['buffered'] if code_lease else None,
+      help="Short codes leased by workers and not yet handed out")
+gauge('write_behind_queued', lambda: url_writer.stats().get('queued') if url_writer else None,
+      help="URL rows waiting in the workers' write-behind queues")
+gauge('kafka_producer_queue_length', lambda: click_events.queue_length() if click_events else None,
+      help="Click events buffered in the Kafka producer")
+gauge('sse_clients', lambda: event_bus.stats()['clients'], help="Connected SSE clients")
+gauge('db_pool_connections', db_pool_connections, help="Postgres pool connections by pool and state",
+      labelnames=('pool', 'state'))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint (all workers' metrics when METRICS_MULTIPROC_DIR is set)"""
+    return Response(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # Health check endpoint
 @app.route('/health', methods=['GET'])
@@ -204,10 +468,68 @@ def health_check():
         redis_client_pre_gen.ping()
         redis_client_cache.ping()
         
-        return jsonify({"status": "healthy", "redis": "connected"}), 200
+        return jsonify({
+            "status": "healthy",
+            "redis": "connected",
+            "db_pool": pool_stats(),
+            "db_replicas": replica_stats(),
+            "write_behind": url_writer.stats() if url_writer else None,
+            "clicks": click_counter.stats(),
+            "click_events": click_events.stats() if click_events else None,
+            "l1_cache": l1_cache.stats(),
+            "redis_latency": latency_summary('redis_'),
+            "short_code_pool": pool_refiller.stats() if pool_refiller else None,
+            "code_lease": code_lease.stats() if code_lease else None,
+            "validation_cache": validation_cache_stats(),
+            "short_code_rejects": short_code_rejects,
+            "url_listing": url_listing.stats(),
+            "cache_ttl": cache_ttl.stats(),
+            "cache_fills": cache_fills.stats(),
+            "event_bus": event_bus.stats(),
+            "stats": dashboard_stats.stats(),
+            "dedup": url_dedup.stats() if url_dedup else None,
+            "logging": logging_stats(),
+        }), 200
     except Exception as e:
         return jsonify({"status": "unhealthy", "error": str(e)}), 503
 
+def claim_short_code(original_url: str, digest: Optional[str] = None,
+                     public: bool = False) -> Tuple[Optional[str], bool]:
+    """
+    Take a short code and cache `original_url` under it (broadcasting an L1
+    invalidation). With a dedup `digest`, the code is reserved for that hash
+    and visibility first; if a concurrent request got there before us, our
+    code is returned to the pool and theirs is used.
+
+    Returns (short_code, reused), or (None, False) when no code is available.
+    """
+    if code_lease is None and digest is None:
+        return url_store.claim_and_store(original_url, ttl=cache_ttl.new_ttl), False
+
+    codes = claim_short_codes(1)
+    if not codes:
+        return None, False
+    short_code = codes[0]
+    reserved = False
+    if digest is not None:
+        try:
+            reserved, winner = url_dedup.reserve(digest, public, short_code)
+        except Exception:
+            return_short_codes(codes)
+            raise
+        if winner:
+            return_short_codes(codes)
+            return winner, True
+        # Not reserved and no winner: go ahead with our own code, unreserved
+    try:
+        url_store.store_url(short_code, original_url, ttl=cache_ttl.new_ttl, publish=True)
+    except Exception:
+        if reserved:
+            url_dedup.release(digest, public, short_code)
+        return_short_codes(codes)
+        raise
+    return short_code, False
+
 # Endpoint for URL shortening
 @app.route('/api/v1/shorten', methods=['POST'])
 def shorten_url():
@@ -227,12 +549,7 @@ def shorten_url():
         return jsonify({"success": False, "message": "Invalid URL data"}), 400
 
     # Populate additional fields from request metadata
-    url_data.user_agent = g.request_metadata.user_agent
-    url_data.ip_address = g.request_metadata.ip_address
-    url_data.referrer = g.request_metadata.referrer
-    url_data.sec_ch_ua_platform = g.request_metadata.sec_ch_ua_platform
-    url_data.sec_ch_ua = g.request_metadata.sec_ch_ua
-    url_data.sec_ch_ua_mobile = g.request_metadata.sec_ch_ua_mobile
+    url_data.apply_metadata(g.request_metadata)
     
     original_url = url_data.url
     is_valid, error_message = is_valid_url(original_url)
@@ -246,10 +563,26 @@ def shorten_url():
         if len(original_url) < 8:
             return jsonify({"success": False, "message": "Custom URLs must be at least 8 characters long."}), 400
 
+    # Claim a pre-generated code and store the mapping in Redis. This also
+    # broadcasts an L1 invalidation so no worker keeps a negative entry for it.
+    if pool_refiller is not None:
+        pool_refiller.ensure_started()
+
+    digest = url_hash(original_url) if url_dedup is not None and not url_data.custom_url else None
+
     try:
-        redis_url = redis_client_pre_gen.lpop('short_urls')
+        reused = False
+        redis_url = url_dedup.find(digest, url_data.is_public) if digest else None
+        if redis_url:
+            reused = True
+        else:
+            redis_url, reused = claim_short_code(original_url, digest, url_data.is_public)
+            if not redis_url and pool_refiller is not None:
+                # Pool ran dry between refills: generate just this code and retry once
+                pool_refiller.top_up(1)
+                redis_url, reused = claim_short_code(original_url, digest, url_data.is_public)
     except Exception as e:
-        logging.error(f"Redis pre-gen error: {e}")
+        logging.error("Redis claim/store error: %s", e)
         return jsonify({"success": False, "message": "Service temporarily unavailable"}), 503
 
     short_url = f"www.bigshort.one/{redis_url}"
@@ -257,187 +590,585 @@ def shorten_url():
     if not redis_url:
         return jsonify({"success": False, "message": "No available short URLs left in the pool."}), 500
 
-    # Store the mapping in Redis (defensive operation)
-    try:
-        redis_client_cache.set(redis_url, html.escape(original_url), keepttl=False)
-    except Exception as e:
-        logging.error(f"Failed to store URL mapping in Redis: {e}")
-        return jsonify({"success": False, "message": "Internal server error"}), 500
-    
+    if reused:
+        # Same URL shortened before: no new code, row or events
+        return jsonify({"success": True, "shortUrl": short_url}), 200
+
+    l1_cache.invalidate(redis_url)
     url_data.short_url = redis_url
 
-    def save_to_db(url_data_dict: dict):
+    def save_to_db(url_data_dict: dict) -> bool:
+        """False when the code turned out to belong to another row"""
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            insert_query = sql.SQL("""
-                INSERT INTO urls (id, original_url, short_code, display, clicks, custom_url, created_at, 
-                sec_ch_ua_platform, sec_ch_ua, sec_ch_ua_mobile)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """)
-            cursor.execute(insert_query, (
-                url_data_dict['id'],
-                url_data_dict['url'],
-                url_data_dict['shortUrl'],
-                url_data_dict['isPublic'],
-                url_data_dict['clicks'],
-                url_data_dict['customUrl'],
-                url_data_dict['createdAt'],
-                url_data_dict['secChUaPlatform'],
-                url_data_dict['secChUa'],
-                url_data_dict['secChUaMobile']
-            ))
-            conn.commit()
-            cursor.close()
-            conn.close()
+            store_url_rows([url_data_dict])
+        except ShortCodeConflict as e:
+            logging.error("Short code %s is already taken in the database: %s", redis_url, e)
+            return False
         except Exception as e:
-            logging.error(f"Database error: {str(e)}")
+            logging.error("Database error: %s", e)
+        return True
     
     url_data_dict = url_data.to_dict(skip_defaults=False)
-    logging.info(f"URL INFO ==> {url_data_dict}")
-    save_to_db(url_data_dict)
+    if digest:
+        url_data_dict['urlHash'] = digest
+    logging.debug("Shortened %s -> %s", redis_url, original_url)
+
+    # Hand the row to the write-behind stage; insert inline when it is disabled or full
+    queued = False
+    if url_writer is not None:
+        try:
+            queued = url_writer.submit(url_data_dict)
+        except Exception as e:
+            logging.error("Write-behind enqueue failed: %s", e)
+    if not queued and not save_to_db(url_data_dict):
+        # Our cached mapping would shadow the existing row until it expired
+        drop_unpersisted([redis_url], reuse=False)
+        if digest:
+            url_dedup.release(digest, url_data.is_public, redis_url)
+        return jsonify({"success": False, "message": "Service temporarily unavailable"}), 503
+
+    event_bus.publish_new_url(redis_url, original_url, url_data.created_at)
+    dashboard_stats.record_created(url_data.sec_ch_ua_platform)
     
     response = {"success": True, "shortUrl": short_url}
     
     return jsonify(response), 200
 
+def claim_short_codes(count: int) -> list:
+    """Take up to `count` codes, from the worker's lease when enabled"""
+    if code_lease is not None:
+        return code_lease.acquire_many(count)
+    return url_store.claim_codes(count)
+
+def return_short_codes(codes: list):
+    if code_lease is not None:
+        code_lease.give_back(codes)
+    else:
+        url_store.return_codes(codes)
+
+def persist_bulk_rows(url_data_dicts: list) -> Tuple[list, list]:
+    """
+    COPY a bulk batch into urls; on failure hand the rows to the write-behind
+    stage to retry. When a short code turned out to be taken, the rows are
+    inserted one by one to find out which.
+
+    Returns (failed, taken): positions of the rows that were neither written
+    nor queued, and of those whose code already belongs to another row.
+    """
+    try:
+        copy_urls(url_data_dicts)
+        url_listing.bump()
+        return [], []
+    except ShortCodeConflict as e:
+        logging.error("Bulk COPY of %d rows hit a taken short code, inserting row by row: %s",
+                      len(url_data_dicts), e)
+        retry, taken = [], []
+        for position, url_data_dict in enumerate(url_data_dicts):
+            try:
+                insert_urls([url_data_dict])
+            except ShortCodeConflict:
+                taken.append(position)
+            except Exception:
+                retry.append(position)
+        url_listing.bump()
+    except Exception as e:
+        logging.error("Bulk COPY of %d rows failed: %s", len(url_data_dicts), e)
+        retry, taken = list(range(len(url_data_dicts))), []
+
+    failed = []
+    for position in retry:
+        try:
+            queued = url_writer is not None and url_writer.submit(url_data_dicts[position])
+        except Exception:
+            queued = False
+        if not queued:
+            failed.append(position)
+    if failed or taken:
+        logging.error("Could not persist %d bulk rows (%d with taken short codes)",
+                      len(failed) + len(taken), len(taken))
+    return failed + taken, taken
+
+def drop_unpersisted(codes: list, reuse: bool = True):
+    """
+    Forget the cached mappings of codes whose rows were never written, and put
+    the codes back in the pool unless `reuse` is off (e.g. another row has them).
+    """
+    if not codes:
+        return
+    try:
+        url_store.delete_urls(codes, publish=True)
+    except Exception as e:
+        # The codes are not reused while their mappings may still be cached
+        logging.error("Failed to drop %d unpersisted mappings: %s", len(codes), e)
+        return
+    if reuse:
+        return_short_codes(codes)
+
+def shorten_batch(items: list, metadata: RequestMetadata) -> list:
+    """
+    Shorten one batch of bulk items: one validation pass, one code claim, one
+    Redis pipeline and one COPY. Returns one result per item, in input order.
+
+    URL_DEDUP is not applied here: looking up every item would cost a Redis
+    and possibly a DB round trip per URL, and bulk imports are campaign links
+    that are usually wanted as distinct codes. Rows still record their URL hash,
+    so later single shortens can reuse them.
+    """
+    results = [None] * len(items)
+    pending = []
+    verdicts = validate_many(item.fields['url'] if item.fields else '' for item in items)
+    for index, (item, (is_valid, error_message)) in enumerate(zip(items, verdicts)):
+        if item.error is not None:
+            results[index] = result_line(item)
+        elif not is_valid:
+            results[index] = result_line(item, message=error_message)
+        elif item.fields['customUrl'] and len(item.fields['url']) < 8:
+            results[index] = result_line(item, message="Custom URLs must be at least 8 characters long.")
+        else:
+            pending.append(index)
+
+    if not pending:
+        return results
+
+    codes = []
+    try:
+        codes = claim_short_codes(len(pending))
+        if len(codes) < len(pending) and pool_refiller is not None:
+            # Pool ran dry between refills: generate just the missing codes and retry once
+            pool_refiller.top_up(len(pending) - len(codes))
+            codes += claim_short_codes(len(pending) - len(codes))
+
+        mappings = {code: items[index].fields['url'] for index, code in zip(pending, codes)}
+        url_store.store_urls(mappings, ttl=cache_ttl.new_ttl, publish=True)
+    except Exception as e:
+        logging.error("Redis claim/store error in bulk batch: %s", e)
+        if codes:
+            return_short_codes(codes)
+        for index in pending:
+            results[index] = result_line(items[index], message="Service temporarily unavailable")
+        return results
+
+    url_data_dicts = []
+    for index, short_code in zip(pending, codes):
+        item = items[index]
+        l1_cache.invalidate(short_code)
+        url_data = URLData(
+            url=item.fields['url'],
+            short_url=short_code,
+            is_public=item.fields['isPublic'],
+            custom_url=item.fields['customUrl'],
+        )
+        url_data.apply_metadata(metadata)
+        url_data_dict = url_data.to_dict(skip_defaults=False)
+        if url_dedup is not None and not url_data.custom_url:
+            url_data_dict['urlHash'] = url_hash(url_data.url)
+        url_data_dicts.append(url_data_dict)
+        results[index] = result_line(item, short_code=short_code)
+    for index in pending[len(codes):]:
+        results[index] = result_line(items[index], message="No available short URLs left in the pool.")
+
+    failed, taken = persist_bulk_rows(url_data_dicts)
+    if failed:
+        for position in failed:
+            results[pending[position]] = result_line(items[pending[position]],
+                                                     message="Service temporarily unavailable")
+        drop_unpersisted([codes[position] for position in failed if position not in taken])
+        drop_unpersisted([codes[position] for position in taken], reuse=False)
+
+    created = len(url_data_dicts) - len(failed)
+    if created:
+        event_bus.count_new_urls(created)
+        dashboard_stats.record_created(metadata.sec_ch_ua_platform, created)
+    return results
+
+# Bulk URL shortening - NDJSON or CSV streamed in, results streamed back per batch
+@app.route('/api/v1/shorten/bulk', methods=['POST'])
+def shorten_bulk():
+    if redis_client_pre_gen is None or redis_client_cache is None:
+        logging.error("Redis clients not available")
+        return jsonify({"success": False, "message": "Service temporarily unavailable"}), 503
+
+    if pool_refiller is not None:
+        pool_refiller.ensure_started()
+
+    fmt = bulk_format(request.mimetype)
+    metadata = g.request_metadata
+
+    def generate_results():
+        if fmt == 'csv':
+            yield csv_header()
+        items = read_items(request.stream, fmt)
+        for batch in batched(islice(items, BULK_MAX_ITEMS), BULK_BATCH_SIZE):
+            yield encode_results(shorten_batch(batch, metadata), fmt)
+        extra = next(items, None)
+        if extra is not None:
+            message = f"Bulk requests are limited to {BULK_MAX_ITEMS} items"
+            yield encode_results([result_line(extra, message=message)], fmt)
+
+    return Response(
+        stream_with_context(generate_results()),
+        mimetype='text/csv' if fmt == 'csv' else NDJSON_MIMETYPE,
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def record_redirect(short_url_key: str, metadata: RequestMetadata):
+    """Count a redirect and publish its analytics event; neither may fail the redirect"""
+    try:
+        click_counter.incr(short_url_key)
+    except Exception as e:
+        logging.error("Failed to count click for %s: %s", short_url_key, e)
+
+    event_bus.record_click(short_url_key)
+    dashboard_stats.record_click(short_url_key, metadata.sec_ch_ua_platform)
+
+    if click_events is not None:
+        try:
+            click_events.publish(ClickEvent.from_metadata(short_url_key, metadata))
+        except Exception as e:
+            logging.error("Failed to publish click event for %s: %s", short_url_key, e)
+
+def load_into_cache(short_code: str) -> Optional[str]:
+    """Read a mapping from the DB and backfill Redis; links with more clicks stay cached longer"""
+    entry = lookup_url_entry(short_code)
+    if not entry:
+        return None
+    original_url, clicks = entry
+    try:
+        url_store.store_url(short_code, original_url, ttl=cache_ttl.ttl_for_backfill(clicks))
+    except Exception as e:
+        logging.error("Failed to update cache: %s", e)
+    return original_url
+
+def fill_cache_from_database(short_code: str, wait: bool = True) -> Optional[str]:
+    """
+    Cache fill guarded by a short Redis lock, so one worker queries the DB per
+    code. Workers that lose the race poll Redis for the winner's write for up to
+    CACHE_FILL_WAIT_MS before reading the DB themselves (or give up when `wait`
+    is False). Raises on DB errors.
+    """
+    lock = RedisLock(cache_fill_redis, f"cache-fill:{short_code}", ttl_ms=CACHE_FILL_LOCK_MS)
+    try:
+        acquired = lock.acquire()
+    except Exception as e:
+        logging.error("Cache fill lock error: %s", e)
+        return load_into_cache(short_code)
+
+    if acquired:
+        try:
+            return load_into_cache(short_code)
+        finally:
+            try:
+                lock.release()
+            except Exception as e:
+                logging.error("Cache fill unlock error: %s", e)
+
+    if not wait:
+        return None
+    deadline = time.monotonic() + CACHE_FILL_WAIT_MS / 1000
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        try:
+            original_url = url_store.get_url(short_code)
+        except Exception:
+            break
+        if original_url:
+            return original_url
+    return load_into_cache(short_code)
+
+def refresh_in_background(short_code: str):
+    """Stale-while-revalidate: re-read a soon-to-expire entry without delaying the redirect"""
+    key = ('refresh', short_code)
+    if cache_fills.in_flight(key):
+        return
+
+    def refresh():
+        try:
+            cache_fills.do(key, lambda: fill_cache_from_database(short_code, wait=False))
+        except Exception as e:
+            logging.error("Background cache refresh failed for %s: %s", short_code, e)
+
+    Thread(target=refresh, daemon=True).start()
+
+def resolve_from_l1(short_url_key: str, metadata: RequestMetadata) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    The in-process step of a redirect: (outcome, original_url) when the L1
+    cache answers, with the redirect already recorded on a hit (original_url
+    is None for a cached miss). None when the code is not in L1.
+    """
+    l1_invalidator.ensure_started()
+    found, original_url = l1_cache.get(short_url_key)
+    if not found:
+        return None
+    if original_url is None:
+        return 'l1_negative', None
+    record_redirect(short_url_key, metadata)
+    return 'l1_hit', original_url
+
 @app.route('/<short_url>', methods=['GET'])
 def resolve_url(short_url):
-    logging.info(f"ENTERED REDIRECT +++++++++++++++++---> {short_url}")
-    
-    # Check if Redis cache client is available
-    if redis_client_cache is None:
-        logging.error("Redis cache client not available")
-        return jsonify({"success": False, "message": "Service temporarily unavailable"}), 503
-    
-    is_valid, error_message = is_valid_url_cache(short_url)
+    is_valid, error_message = is_valid_short_code(short_url)
     if not is_valid:
+        g.resolve_outcome = 'invalid'
         return jsonify({"success": False, "message": error_message}), 400
     
     if not short_url:
+        g.resolve_outcome = 'invalid'
         return jsonify({"success": False, "message": "short_url is required"}), 400
 
     # First, split out the short_url from the bigshort.one/<short_url>
     short_url_key = short_url.split("/")[-1]
-    logging.info(f"Trying to get the cache --- {short_url_key}")
+
+    # L1 - in-process cache, no network I/O
+    answer = resolve_from_l1(short_url_key, g.request_metadata)
+    if answer is not None:
+        g.resolve_outcome, original_url = answer
+        if original_url is None:
+            return jsonify({"success": False, "message": "URL not found"}), 404
+        return redirect(original_url, code=302)
+
+    # Check if Redis cache client is available
+    if redis_client_cache is None:
+        logging.error("Redis cache client not available")
+        g.resolve_outcome = 'unavailable'
+        return jsonify({"success": False, "message": "Service temporarily unavailable"}), 503
     
+    ttl_ms = -1
     try:
-        if redis_client_cache.exists(short_url_key):
-            logging.info(f"CACHE - Found")
-            original_url = redis_client_cache.get(short_url_key)
-            logging.info(f"Type of original_url: {type(original_url)}")
-            logging.info(f"Value found: {original_url}")
-        else:
-            logging.info("Key not found in cache!")
-            original_url = None
+        original_url, ttl_ms = url_store.get_url_with_ttl(short_url_key)
+        logging.debug("Cache lookup for %s: %s", short_url_key, original_url)
     except Exception as e:
-        logging.error(f"Redis cache error: {e}")
+        logging.error("Redis cache error: %s", e)
         original_url = None
     
-    logging.info(f"URL retrieved? short url ==> {short_url_key} and original url ==> {original_url}")
-    
     if original_url:
-        return redirect(html.unescape(original_url), code=302)
+        l1_cache.set(short_url_key, original_url)
+        # Popular links get their cache entry extended; nearly expired ones are refreshed from the DB
+        touch_ttl = cache_ttl.touch_ttl(short_url_key)
+        g.resolve_outcome = 'redis_hit'
+        if 0 <= ttl_ms < CACHE_STALE_WINDOW * 1000:
+            g.resolve_outcome = 'redis_stale'
+            refresh_in_background(short_url_key)
+        elif touch_ttl:
+            try:
+                url_store.touch(short_url_key, touch_ttl)
+            except Exception as e:
+                logging.error("Failed to extend cache TTL: %s", e)
+        record_redirect(short_url_key, g.request_metadata)
+        return redirect(original_url, code=302)
     
-    # If not found in the redis cache, check the DB 
-    original_url = get_from_database(short_url_key)
-    logging.info(f"We found this from DB!! ==> {original_url}")
+    # If not found in the redis cache, check the DB - once per code, however many requests are waiting
+    try:
+        try:
+            original_url = cache_fills.do(short_url_key, lambda: fill_cache_from_database(short_url_key))
+        except TimeoutError as e:
+            # The in-flight fill is stuck; read the DB ourselves rather than give up on the link
+            logging.warning("%s; reading the database directly", e)
+            entry = lookup_url_entry(short_url_key)
+            original_url = entry[0] if entry else None
+    except Exception as e:
+        # Not knowing is not the same as not found: no 404 (and no negative L1 entry)
+        logging.error("Database error: %s", e)
+        g.resolve_outcome = 'db_error'
+        return jsonify({"success": False, "message": "Service temporarily unavailable"}), 503
+    logging.debug("Database lookup for %s: %s", short_url_key, original_url)
     
     if original_url:
-        # Update cache with new TTL
-        try:
-            redis_client_cache.setex(short_url_key, 3600, original_url)  # 1 hour TTL
-        except Exception as e:
-            logging.error(f"Failed to update cache: {e}")
-        
-        logging.info(f"Redirecting to url {original_url}")
+        g.resolve_outcome = 'db_fallback'
+        l1_cache.set(short_url_key, original_url)
+        record_redirect(short_url_key, g.request_metadata)
         return redirect(original_url, code=302)
     
+    g.resolve_outcome = 'miss'
+    l1_cache.set_negative(short_url_key)
     return jsonify({"success": False, "message": "URL not found"}), 404
 
+def resolve_codes(short_codes: list) -> dict:
+    """
+    Resolve many codes without redirect side effects: L1, then one MGET, then one
+    ANY() query for the misses, which are backfilled into Redis and L1.
+    Returns {short_code: original_url or None}; codes the DB could not be asked
+    about are left out.
+    """
+    resolved = {}
+    misses = []
+    for short_code in short_codes:
+        found, original_url = l1_cache.get(short_code)
+        if found:
+            resolved[short_code] = original_url
+        else:
+            misses.append(short_code)
+
+    if misses:
+        try:
+            cached = url_store.get_urls(misses)
+        except Exception as e:
+            logging.error("Redis MGET error: %s", e)
+            cached = [None] * len(misses)
+        db_misses = []
+        for short_code, value in zip(misses, cached):
+            if value:
+                resolved[short_code] = value
+                l1_cache.set(short_code, value)
+            else:
+                db_misses.append(short_code)
+        misses = db_misses
+
+    if misses:
+        try:
+            found_urls = lookup_urls(misses)
+        except Exception as e:
+            logging.error("Database error: %s", e)
+            return resolved
+        for short_code in misses:
+            original_url = found_urls.get(short_code)
+            resolved[short_code] = original_url
+            if original_url:
+                l1_cache.set(short_code, original_url)
+            else:
+                l1_cache.set_negative(short_code)
+        try:
+            url_store.store_urls(found_urls, ttl=cache_ttl.miss_ttl)
+        except Exception as e:
+            logging.error("Failed to update cache: %s", e)
+
+    return resolved
+
+# Batch resolve for link checkers - no redirect, no click counting, no analytics events
+@app.route('/api/v1/resolve/batch', methods=['POST'])
+def resolve_batch():
+    data = request.get_json(silent=True) or {}
+    short_urls = data.get('shortUrls', data.get('codes'))
+    if not isinstance(short_urls, list) or not short_urls:
+        return jsonify({"success": False, "message": "shortUrls must be a non-empty list"}), 400
+    if len(short_urls) > RESOLVE_BATCH_MAX:
+        return jsonify({
+            "success": False,
+            "message": f"At most {RESOLVE_BATCH_MAX} short URLs can be resolved per request"
+        }), 413
+
+    l1_invalidator.ensure_started()
+
+    # Accept bare codes or full bigshort.one/<code> links
+    short_codes = [str(short_url).split("/")[-1] for short_url in short_urls]
+    valid_codes = {code for code in short_codes if is_valid_short_code(code)[0]}
+    resolved = resolve_codes(list(valid_codes))
+
+    results = []
+    for short_url, short_code in zip(short_urls, short_codes):
+        if short_code in resolved:
+            original_url = resolved[short_code]
+            results.append({"shortUrl": short_url, "found": original_url is not None, "url": original_url})
+        elif short_code in valid_codes:
+            results.append({"shortUrl": short_url, "found": False, "message": "Lookup failed"})
+        else:
+            results.append({"shortUrl": short_url, "found": False, "message": "Invalid short code"})
+
+    return jsonify({"success": True, "results": results}), 200
+
+def listing_item(row: dict, fields: tuple) -> dict:
+    item = {}
+    for field in fields:
+        value = row[field]
+        if field == 'id':
+            value = str(value)
+        elif field == 'short_code':
+            value = f"www.bigshort.one/{value}"
+        elif field == 'created_at':
+            value = value.isoformat()
+        item[field] = value
+    return item
+
 @app.route('/api/v1/urls', methods=['GET'])
 def fetch_url_list():
+    """
+    Newest URLs first, keyset-paginated on (created_at, id).
+
+    Query args: limit, cursor (the previous page's nextCursor), fields
+    (comma-separated), public=true, custom=true. Pages are served from a
+    short-TTL cache and carry an ETag, so polling clients get 304s.
+    """
+    fields_arg = request.args.get('fields')
+    fields = tuple(f.strip() for f in fields_arg.split(',') if f.strip()) if fields_arg else LISTING_DEFAULT_FIELDS
+    unknown = set(fields) - set(LISTING_COLUMNS)
+    if unknown or not fields:
+        return jsonify({"success": False, "message": f"fields must be a subset of: {', '.join(LISTING_COLUMNS)}"}), 400
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Query to fetch the last 100 URLs based on creation date
-        fetch_query = """
-            SELECT * 
-            FROM urls 
-            ORDER BY created_at DESC
-            LIMIT 50;
-        """
-        cursor.execute(fetch_query)
-        rows = cursor.fetchall()
-        
-        urls = []
-        for row in rows:
-            url_data = {
-                'id': row[0],
-                'original_url': row[1],
-                'short_code': f"www.bigshort.one/{row[2]}",
-                'clicks': row[4],
-                'created_at': row[6].isoformat()
-            }
-            urls.append(url_data)
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({"success": True, "urls": urls}), 200
-    
-    except Exception as e:
-        logging.error(f"Database error: {str(e)}")
-        return jsonify({"success": False, "message": "Error fetching URLs."}), 500
+        limit = min(max(int(request.args.get('limit', LISTING_DEFAULT_LIMIT)), 1), LISTING_MAX_LIMIT)
+        cursor = request.args.get('cursor') or None
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
 
+    public_only = request.args.get('public', '').lower() in ('1', 'true')
+    custom_only = request.args.get('custom', '').lower() in ('1', 'true')
 
-@app.route('/api/v1/sse/url-updates', methods=['GET'])
-def sse_url_updates():
-    """Server-Sent Events endpoint for real-time URL updates"""
-    def generate_url_updates():
-        sample_urls = [
-            {'url': 'https://github.com/user/repo', 'short': 'abc123'},
-            {'url': 'https://stackoverflow.com/questions/123', 'short': 'def456'},
-            {'url': 'https://medium.com/article', 'short': 'ghi789'},
-            {'url': 'https://youtube.com/watch?v=abc', 'short': 'jkl012'},
-        ]
-        
-        while True:
-            try:
-                current_time = datetime.utcnow().isoformat()
-                sample_url = sample_urls[int(time.time()) % len(sample_urls)]
-                
-                url_update = {
-                    'timestamp': current_time,
-                    'type': 'new_url' if int(time.time()) % 3 == 0 else 'click_update',
-                    'original_url': sample_url['url'],
-                    'short_code': sample_url['short'],
-                    'clicks': int(time.time()) % 50,
-                    'created_at': current_time
-                }
-                
-                yield f"data: {json.dumps(url_update)}\n\n"
-                time.sleep(4)  # Send URL update every 4 seconds
-                
-            except Exception as e:
-                logging.error(f"SSE URL updates error: {e}")
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-                break
-    
+    version = url_listing.version()
+    cache_key = f"{version}|{','.join(fields)}|{limit}|{public_only}|{custom_only}|{cursor or ''}"
+    page = url_listing.get(cache_key) if version is not None else None
+
+    if page is None:
+        try:
+            # One extra row tells whether there is a next page
+            rows = fetch_urls_page(fields, limit + 1, after, public_only=public_only, custom_only=custom_only)
+        except Exception as e:
+            logging.error("Database error: %s", e)
+            return jsonify({"success": False, "message": "Error fetching URLs."}), 500
+
+        next_cursor = encode_cursor(rows[limit - 1]['created_at'], rows[limit - 1]['id']) if len(rows) > limit else None
+        body = json.dumps({
+            "success": True,
+            "urls": [listing_item(row, fields) for row in rows[:limit]],
+            "nextCursor": next_cursor,
+        }).encode()
+        etag = url_listing.set(cache_key, body) if version is not None else url_listing.etag_for(body)
+    else:
+        body, etag = page
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+@app.route('/api/v1/stats', methods=['GET'])
+def fetch_stats():
+    """Dashboard totals, per-minute/hour/day series, platform breakdowns and top links"""
+    try:
+        return jsonify({"success": True, **dashboard_stats.snapshot()}), 200
+    except Exception as e:
+        logging.error("Stats error: %s", e)
+        return jsonify({"success": False, "message": "Error fetching stats."}), 503
+
+def sse_response(types=None):
+    """Stream dashboard events to one client, resuming after Last-Event-ID when given"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
     return Response(
-        generate_url_updates(),
+        event_bus.stream(types, last_event_id),
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache',
             'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no',
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Headers': 'Cache-Control'
         }
     )
 
+@app.route('/api/v1/sse/url-updates', methods=['GET'])
+def sse_url_updates():
+    """Server-Sent Events endpoint for real-time URL updates (new URLs and coalesced clicks)"""
+    return sse_response(('new_url', 'click_update'))
 
+@app.route('/api/v1/sse/stats', methods=['GET'])
+def sse_stats():
+    """Per-interval totals: URLs created, clicks and active links"""
+    return sse_response(('stats',))
 
+@app.route('/api/v1/sse/activity', methods=['GET'])
+def sse_activity():
+    """Every dashboard event"""
+    return sse_response()
 
 
 # def send_time_ticks():
@@ -0,0 +1,108 @@
+"""
+Asyncio/ASGI serving mode.
+
+Serves every route of app_prod.py (`/<short_url>`, `/api/v1/shorten`,
+`/api/v1/urls`, `/health`, ...) under an ASGI server, using the Flask
+handlers themselves rather than a second copy of them. Redirects whose code
+is in the worker's L1 cache are answered on the event loop, through the same
+`resolve_from_l1` step as the Flask route (click counting, events, stats and
+request metrics included). Everything else - L1 misses, shortening, listing,
+SSE - runs the Flask app on a pool of ASGI_THREADS threads, so replica
+routing, single-flight cache fills, dedup and write-behind behave exactly as
+under gunicorn.
+
+The Flask handlers use blocking redis-py and psycopg2: a thread is held per
+request that leaves the L1 cache (and per open SSE stream), so size
+ASGI_THREADS together with REDIS_MAX_CONNECTIONS and DB_POOL_MAX.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000 --workers 4
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from a2wsgi import WSGIMiddleware
+
+import app_prod
+from models import RequestMetadata
+from validations import is_valid_short_code
+
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', '32'))
+
+CORS_ORIGINS = frozenset(app_prod.CORS_ORIGINS)
+REDIRECT_ROUTE = '/<short_url>'
+
+flask_app = WSGIMiddleware(app_prod.app, workers=ASGI_THREADS)
+
+
+class Headers:
+    """Case-insensitive view over ASGI header pairs"""
+
+    def __init__(self, raw_headers):
+        self._headers = {}
+        for name, value in raw_headers:
+            self._headers.setdefault(name.decode('latin-1').lower(), value.decode('latin-1'))
+
+    def get(self, name: str, default=None):
+        return self._headers.get(name.lower(), default)
+
+
+def _short_code(scope) -> Optional[str]:
+    """The code of a `GET /<short_url>` request, or None for any other route"""
+    path = scope['path']
+    if scope['method'] != 'GET' or path.count('/') != 1 or len(path) < 2:
+        return None
+    return path[1:]
+
+
+async def _send_redirect(send, location: str, origin: Optional[str]):
+    headers = [(b'location', location.encode()), (b'content-length', b'0')]
+    if origin in CORS_ORIGINS:
+        headers += [
+            (b'access-control-allow-origin', origin.encode()),
+            (b'access-control-allow-credentials', b'true'),
+            (b'vary', b'Origin'),
+        ]
+    await send({'type': 'http.response.start', 'status': 302, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # Blocking flushes (Redis, Postgres, Kafka); keep them off the event loop
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, app_prod.shutdown_worker)
+            except Exception as e:
+                logging.error("Worker shutdown failed: %s", e)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    short_code = _short_code(scope)
+    if short_code is not None and is_valid_short_code(short_code)[0]:
+        started = time.perf_counter()
+        headers = Headers(scope['headers'])
+        client = scope.get('client')
+        metadata = RequestMetadata.from_headers(headers, client[0] if client else None)
+        answer = app_prod.resolve_from_l1(short_code, metadata)
+        # Only L1 hits are answered here; a cached miss goes to Flask for its 404 body
+        if answer is not None and answer[1] is not None:
+            outcome, original_url = answer
+            await _send_redirect(send, original_url, headers.get('origin'))
+            app_prod.observe_request(REDIRECT_ROUTE, 'GET', 302, time.perf_counter() - started, outcome)
+            return
+
+    await flask_app(scope, receive, send)
@@ -0,0 +1,134 @@
+"""
+Memory per million links for the Redis URL cache storage formats.
+
+Loads N synthetic (or real, --urls-file) links into an EMPTY Redis database for
+each layout, measures the used_memory delta and extrapolates to 1M links:
+
+    escaped-keys   legacy: one key per link, html-escaped string value
+    compact-keys   one key per link, tagged/dictionary-compressed value
+    compact-hash   compact values in hash buckets (~100 links per bucket)
+
+    python benchmarks/cache_memory.py --host localhost --db 15 --count 200000
+    python benchmarks/cache_memory.py --offline --count 200000   # value sizes only
+
+The target database is flushed after each layout, so never point it at a
+database holding real data.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_codec import CompactCodec, EscapedCodec  # noqa: E402
+from codegen import FeistelPermutation, encode_base62  # noqa: E402
+from redis_store import URLStore  # noqa: E402
+
+HOSTS = [
+    'https://www.youtube.com/watch?v=', 'https://github.com/', 'https://www.amazon.com/dp/',
+    'https://medium.com/@', 'https://docs.google.com/document/d/', 'https://www.linkedin.com/in/',
+    'https://shop.example.com/products/', 'https://blog.example.org/2024/', 'https://news.example.net/article/',
+]
+WORDS = ['spring', 'sale', 'guide', 'python', 'release', 'notes', 'summer', 'launch', 'deal', 'how-to',
+         'scaling', 'redis', 'postgres', 'campaign', 'product', 'review', 'video', 'docs', 'team', 'update']
+ALPHABET = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+
+def synthetic_url(rng: random.Random) -> str:
+    url = rng.choice(HOSTS)
+    if url.endswith('='):
+        url += ''.join(rng.choices(ALPHABET, k=11))
+    else:
+        url += '/'.join('-'.join(rng.choices(WORDS, k=rng.randint(1, 4))) for _ in range(rng.randint(1, 3)))
+    if rng.random() < 0.4:
+        url += (f"?utm_source={rng.choice(['newsletter', 'twitter', 'facebook'])}"
+                f"&utm_medium={rng.choice(['email', 'social', 'cpc'])}"
+                f"&utm_campaign={rng.choice(WORDS)}_{rng.randint(2020, 2025)}")
+    return url
+
+
+def load_urls(args) -> list:
+    if args.urls_file:
+        with open(args.urls_file) as f:
+            urls = [line.strip() for line in f if line.strip()]
+        return [urls[i % len(urls)] for i in range(args.count)]
+    rng = random.Random(args.seed)
+    return [synthetic_url(rng) for _ in range(args.count)]
+
+
+def codes(count: int) -> list:
+    # Same permutation as codegen.CodeGenerator, so codes are spread like real ones
+    permutation = FeistelPermutation(62 ** 7)
+    return [encode_base62(permutation.permute(i), 7) for i in range(count)]
+
+
+def value_sizes(urls: list) -> dict:
+    escaped, compact = EscapedCodec(), CompactCodec()
+    return {
+        "raw": sum(len(url.encode()) for url in urls) / len(urls),
+        "escaped": sum(len(escaped.encode(url).encode()) for url in urls) / len(urls),
+        "compact": sum(len(compact.encode(url)) for url in urls) / len(urls),
+    }
+
+
+def measure(client, name: str, store: URLStore, short_codes: list, urls: list, batch: int) -> dict:
+    if client.dbsize():
+        raise SystemExit(f"Database is not empty; refusing to run the {name} layout")
+    client.execute_command('MEMORY', 'PURGE')
+    before = client.info('memory')['used_memory']
+    started = time.monotonic()
+    for start in range(0, len(short_codes), batch):
+        store.store_urls(dict(zip(short_codes[start:start + batch], urls[start:start + batch])))
+    elapsed = time.monotonic() - started
+    after = client.info('memory')['used_memory']
+    keys = client.dbsize()
+    client.flushdb()
+
+    per_link = (after - before) / len(short_codes)
+    return {
+        "layout": name,
+        "keys": keys,
+        "bytes_per_link": round(per_link, 1),
+        "mb_per_million_links": round(per_link * 1_000_000 / 2 ** 20, 1),
+        "load_seconds": round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis URL cache memory per million links")
+    parser.add_argument('--host', default=os.getenv('REDIS_PC', 'localhost'))
+    parser.add_argument('--port', type=int, default=6379)
+    parser.add_argument('--password', default=os.getenv('REDIS_PASSWORD'))
+    parser.add_argument('--db', type=int, default=15, help="Scratch database (flushed after each layout)")
+    parser.add_argument('--count', type=int, default=200000, help="Links loaded per layout")
+    parser.add_argument('--batch', type=int, default=1000, help="Links per pipeline")
+    parser.add_argument('--urls-file', help="Real URLs, one per line (reused cyclically)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--offline', action='store_true', help="Only report encoded value sizes")
+    args = parser.parse_args()
+
+    urls = load_urls(args)
+    report = {"count": args.count, "avg_value_bytes": {k: round(v, 1) for k, v in value_sizes(urls).items()}}
+
+    if not args.offline:
+        import redis
+
+        client = redis.Redis(host=args.host, port=args.port, password=args.password, db=args.db)
+        short_codes = codes(args.count)
+        layouts = [
+            ("escaped-keys", URLStore(client, client, codec=EscapedCodec())),
+            ("compact-keys", URLStore(client, client, codec=CompactCodec())),
+            ("compact-hash", URLStore(client, client, codec=CompactCodec(), hash_prefix='u:',
+                                      hash_buckets=max(1, args.count // 100))),
+        ]
+        report["hash_limits"] = client.config_get('hash-max-*')
+        report["layouts"] = [measure(client, name, store, short_codes, urls, args.batch) for name, store in layouts]
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""
+Load test for the hot endpoints of a running instance, with JSON results that
+can be compared across builds.
+
+Phases, in order:
+
+    seed       POST /api/v1/shorten for --links links (their codes drive the redirects)
+    redirect   GET /<code>, codes drawn from a Zipf distribution (--zipf-s), for --duration s
+    shorten    bursts of --burst-size POST /api/v1/shorten, one burst every --burst-interval s
+    list       GET /api/v1/urls, following nextCursor for --list-pages pages per walk
+
+Each phase runs --concurrency threads over keep-alive connections and reports
+requests, errors, status codes, throughput and p50/p95/p99 latency.
+
+    docker compose -f docker-compose.bench.yml up -d --build
+    python benchmarks/load.py run --base-url http://localhost:5000 --output before.json
+    ...
+    python benchmarks/load.py run --base-url http://localhost:5000 --output after.json
+    python benchmarks/load.py compare before.json after.json --threshold 0.10
+
+`compare` exits with status 1 when any endpoint's p95/p99 grew, or its
+throughput or success rate fell, by more than the threshold. Only compare runs
+made with the same arguments on the same machine; the arguments are stored in
+the result file and a mismatch is reported.
+"""
+import argparse
+import bisect
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cache_memory import synthetic_url  # noqa: E402
+
+# Arguments that change what a run measures; compare() warns when they differ
+RUN_PARAMETERS = ('links', 'zipf_s', 'concurrency', 'duration', 'burst_size', 'burst_interval',
+                  'list_pages', 'list_limit', 'seed')
+
+
+class ZipfSampler:
+    """Ranks 0..n-1 with P(rank k) proportional to 1 / (k + 1) ** s"""
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.rng = rng
+        total = 0.0
+        self.cdf = []
+        for k in range(n):
+            total += 1.0 / (k + 1) ** s
+            self.cdf.append(total)
+        self.total = total
+
+    def sample(self) -> int:
+        return min(bisect.bisect_left(self.cdf, self.rng.random() * self.total), len(self.cdf) - 1)
+
+
+class Recorder:
+    """Latencies and status codes of one endpoint, shared by the phase's threads"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, status: Optional[int]):
+        with self._lock:
+            if status is None:
+                self.errors += 1
+                self.statuses['error'] += 1
+            else:
+                self.latencies.append(seconds)
+                self.statuses[str(status)] += 1
+
+    def summary(self, ok: Callable[[int], bool]) -> dict:
+        latencies = sorted(self.latencies)
+        elapsed = (self.finished or time.perf_counter()) - (self.started or 0)
+        requests = len(latencies) + self.errors
+        succeeded = sum(count for status, count in self.statuses.items() if status.isdigit() and ok(int(status)))
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 3)
+
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "success_rate": round(succeeded / requests, 4) if requests else None,
+            "statuses": dict(self.statuses),
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(requests / elapsed, 1) if elapsed > 0 else None,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+                "max": round(latencies[-1] * 1000, 3) if latencies else None,
+            },
+        }
+
+
+class Client:
+    """One keep-alive HTTP connection; reconnects after errors"""
+
+    def __init__(self, base_url: str, timeout: float):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method: str, path: str, body: Optional[dict] = None):
+        """(status, parsed JSON or None, seconds); status is None on a connection error"""
+        if self.conn is None:
+            self.conn = self.connection_class(self.netloc, timeout=self.timeout)
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        payload = json.dumps(body) if body is not None else None
+        started = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            return None, None, time.perf_counter() - started
+        elapsed = time.perf_counter() - started
+        parsed = None
+        if data and response.getheader('Content-Type', '').startswith('application/json'):
+            try:
+                parsed = json.loads(data)
+            except ValueError:
+                pass
+        return response.status, parsed, elapsed
+
+
+def run_threads(concurrency: int, worker: Callable[[int], None], recorder: Recorder):
+    recorder.started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.finished = time.perf_counter()
+
+
+def shorten_body(rng: random.Random) -> dict:
+    return {"url": synthetic_url(rng), "isPublic": rng.random() < 0.5, "customUrl": False}
+
+
+def seed_links(args) -> Tuple[List[str], Recorder]:
+    recorder = Recorder()
+    codes = []
+    codes_lock = threading.Lock()
+    per_thread = -(-args.links // args.concurrency)
+
+    def worker(index: int):
+        rng = random.Random(args.seed * 1000 + index)
+        client = Client(args.base_url, args.timeout)
+        for _ in range(min(per_thread, args.links - index * per_thread)):
+            status, body, seconds = client.request('POST', '/api/v1/shorten', shorten_body(rng))
+            recorder.record(seconds, status)
+            if status == 200 and body and body.get('shortUrl'):
+                with codes_lock:
+                    codes.append(body['shortUrl'].rsplit('/', 1)[-1])
+
+    run_threads(args.concurrency, worker, recorder)
+    # Stable rank order, so the same codes are hot in every run with the same seed
+    return sorted(codes), recorder
+
+
+def redirect_phase(args, codes: List[str]) -> Recorder:
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(index: int):
+        rng = random.Random(args.seed * 2000 + index)
+        ranked = codes[:]
+        random.Random(args.seed).shuffle(ranked)
+        sampler = ZipfSampler(len(ranked), args.zipf_s, rng)
+        client = Client(args.base_url, args.timeout)
+        while time.perf_counter() < deadline:
+            status, _body, seconds = client.request('GET', f"/{ranked[sampler.sample()]}")
+            recorder.record(seconds, status)
+
+    run_threads(args.concurrency, worker, recorder)
+    return recorder
+
+
+def shorten_phase(args) -> Recorder:
+    recorder = Recorder()
+    bursts = max(1, int(args.duration // args.burst_interval))
+    barrier = threading.Barrier(args.concurrency)
+
+    def worker(index: int):
+        rng = random.Random(args.seed * 3000 + index)
+        client = Client(args.base_url, args.timeout)
+        share = args.burst_size // args.concurrency + (index < args.burst_size % args.concurrency)
+        for burst in range(bursts):
+            # Every thread fires its share of the burst at the same moment
+            barrier.wait()
+            burst_started = time.perf_counter()
+            for _ in range(share):
+                status, _body, seconds = client.request('POST', '/api/v1/shorten', shorten_body(rng))
+                recorder.record(seconds, status)
+            remaining = args.burst_interval - (time.perf_counter() - burst_started)
+            if remaining > 0 and burst < bursts - 1:
+                time.sleep(remaining)
+
+    run_threads(args.concurrency, worker, recorder)
+    return recorder
+
+
+def list_phase(args) -> Recorder:
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(index: int):
+        client = Client(args.base_url, args.timeout)
+        while time.perf_counter() < deadline:
+            cursor = None
+            for _ in range(args.list_pages):
+                path = f"/api/v1/urls?limit={args.list_limit}" + (f"&cursor={cursor}" if cursor else "")
+                status, body, seconds = client.request('GET', path)
+                recorder.record(seconds, status)
+                cursor = body.get('nextCursor') if status == 200 and body else None
+                if not cursor or time.perf_counter() >= deadline:
+                    break
+
+    run_threads(args.concurrency, worker, recorder)
+    return recorder
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def run(args) -> dict:
+    phases = set(args.phases.split(','))
+    results = {}
+
+    codes, seed = seed_links(args)
+    results['seed'] = seed.summary(lambda status: status == 200)
+    if not codes:
+        raise SystemExit("Seeding created no links; is the service up and the short code pool filled?")
+
+    if 'redirect' in phases:
+        results['redirect'] = redirect_phase(args, codes).summary(lambda status: status == 302)
+    if 'shorten' in phases:
+        results['shorten'] = shorten_phase(args).summary(lambda status: status == 200)
+    if 'list' in phases:
+        results['list'] = list_phase(args).summary(lambda status: status in (200, 304))
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "base_url": args.base_url,
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "parameters": {name: getattr(args, name) for name in RUN_PARAMETERS},
+        },
+        "results": results,
+    }
+
+
+def change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if before is None or after is None or before == 0:
+        return None
+    return (after - before) / before
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> List[str]:
+    """Print a per-endpoint comparison; returns the regressions found"""
+    if baseline['meta']['parameters'] != candidate['meta']['parameters']:
+        print("warning: runs used different parameters, numbers are not directly comparable")
+
+    regressions = []
+    print(f"{'endpoint':<10} {'metric':<15} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for endpoint, before in baseline['results'].items():
+        after = candidate['results'].get(endpoint)
+        if after is None:
+            continue
+        rows = [
+            ('throughput_rps', before['throughput_rps'], after['throughput_rps'], -1),
+            ('success_rate', before['success_rate'], after['success_rate'], -1),
+            ('p50_ms', before['latency_ms']['p50'], after['latency_ms']['p50'], 0),
+            ('p95_ms', before['latency_ms']['p95'], after['latency_ms']['p95'], 1),
+            ('p99_ms', before['latency_ms']['p99'], after['latency_ms']['p99'], 1),
+        ]
+        for metric, old, new, worse_when in rows:
+            delta = change(old, new)
+            shown = f"{delta:+.1%}" if delta is not None else "n/a"
+            flag = ''
+            # worse_when: 1 = higher is worse, -1 = lower is worse, 0 = informational
+            if delta is not None and worse_when and delta * worse_when > threshold:
+                flag = '  REGRESSION'
+                regressions.append(f"{endpoint} {metric} {shown}")
+            print(f"{endpoint:<10} {metric:<15} {str(old):>12} {str(new):>12} {shown:>9}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the redirect, shorten and listing endpoints")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Run the load test and write JSON results")
+    run_parser.add_argument('--base-url', default=os.getenv('BENCH_BASE_URL', 'http://localhost:5000'))
+    run_parser.add_argument('--phases', default='redirect,shorten,list', help="Comma-separated phases after seeding")
+    run_parser.add_argument('--links', type=int, default=2000, help="Links created by the seed phase")
+    run_parser.add_argument('--zipf-s', type=float, default=1.1, help="Zipf exponent of redirect popularity")
+    run_parser.add_argument('--concurrency', type=int, default=16, help="Client threads per phase")
+    run_parser.add_argument('--duration', type=float, default=30, help="Seconds per timed phase")
+    run_parser.add_argument('--burst-size', type=int, default=200, help="Shorten requests per burst")
+    run_parser.add_argument('--burst-interval', type=float, default=2.0, help="Seconds between burst starts")
+    run_parser.add_argument('--list-pages', type=int, default=5, help="Pages followed per listing walk")
+    run_parser.add_argument('--list-limit', type=int, default=50)
+    run_parser.add_argument('--timeout', type=float, default=10)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--output', help="Write the JSON results here as well as to stdout")
+
+    compare_parser = commands.add_parser('compare', help="Compare two result files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help="Relative change that counts as a regression")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        report = run(args)
+        text = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.write(text + '\n')
+        print(text)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    regressions = compare(baseline, candidate, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {'; '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Streaming codecs for the bulk shorten endpoint.
+
+Input is read line by line from the request body, so a campaign file of any
+size is never held in memory:
+
+    NDJSON (default)  {"url": "https://...", "isPublic": true, "customUrl": false}
+                      or a bare JSON string per line
+    CSV (text/csv)    a header row with a `url` column (plus optional
+                      `is_public` / `custom_url`); without one, the first
+                      column of every row is the URL
+
+Results are written back in the same format, one per input item, in order.
+"""
+import csv
+import io
+import json
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+
+CSV_MIMETYPES = ('text/csv', 'application/csv')
+NDJSON_MIMETYPE = 'application/x-ndjson'
+RESULT_FIELDS = ('line', 'success', 'url', 'shortUrl', 'message')
+
+_TRUE_VALUES = ('1', 'true', 'yes', 't', 'y')
+
+
+class BulkItem:
+    __slots__ = ('line', 'fields', 'error')
+
+    def __init__(self, line: int, fields: Optional[dict] = None, error: Optional[str] = None):
+        self.line = line
+        self.fields = fields
+        self.error = error
+
+
+def bulk_format(mimetype: Optional[str]) -> str:
+    return 'csv' if mimetype in CSV_MIMETYPES else 'ndjson'
+
+
+def _decoded_lines(stream) -> Iterator[str]:
+    for raw in stream:
+        yield raw.decode('utf-8', errors='replace') if isinstance(raw, bytes) else raw
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in _TRUE_VALUES
+
+
+def _read_ndjson(stream) -> Iterator[BulkItem]:
+    for line_no, line in enumerate(_decoded_lines(stream), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield BulkItem(line_no, error="Invalid JSON")
+            continue
+        if isinstance(record, str):
+            record = {'url': record}
+        if not isinstance(record, dict):
+            yield BulkItem(line_no, error="Expected a JSON object or string")
+            continue
+        yield BulkItem(line_no, fields={
+            'url': str(record.get('url') or '').strip(),
+            'isPublic': _as_bool(record.get('isPublic', record.get('is_public'))),
+            'customUrl': _as_bool(record.get('customUrl', record.get('custom_url'))),
+        })
+
+
+def _read_csv(stream) -> Iterator[BulkItem]:
+    reader = csv.reader(_decoded_lines(stream))
+    columns = None
+    for row in reader:
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if columns is None:
+            header = [cell.strip().lower() for cell in row]
+            columns = {name: index for index, name in enumerate(header)}
+            if 'url' in columns:
+                continue
+            columns = {'url': 0}
+
+        def cell(name):
+            index = columns.get(name)
+            return row[index].strip() if index is not None and index < len(row) else ''
+
+        yield BulkItem(reader.line_num, fields={
+            'url': cell('url'),
+            'isPublic': _as_bool(cell('is_public')),
+            'customUrl': _as_bool(cell('custom_url')),
+        })
+
+
+def read_items(stream, fmt: str) -> Iterator[BulkItem]:
+    """Parse a request body stream lazily into BulkItems"""
+    return _read_csv(stream) if fmt == 'csv' else _read_ndjson(stream)
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def csv_header() -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(RESULT_FIELDS)
+    return buffer.getvalue()
+
+
+def encode_results(results: List[dict], fmt: str) -> str:
+    """Serialize one batch of result dicts as NDJSON lines or CSV rows"""
+    if fmt != 'csv':
+        return ''.join(json.dumps(result) + '\n' for result in results)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for result in results:
+        writer.writerow([result.get(field, '') for field in RESULT_FIELDS])
+    return buffer.getvalue()
+
+
+def result_line(item: BulkItem, short_code: Optional[str] = None, message: Optional[str] = None,
+                short_url_prefix: str = 'www.bigshort.one/') -> dict:
+    url = item.fields['url'] if item.fields else None
+    if short_code:
+        return {'line': item.line, 'success': True, 'url': url, 'shortUrl': f"{short_url_prefix}{short_code}"}
+    return {'line': item.line, 'success': False, 'url': url, 'message': message or item.error}
+
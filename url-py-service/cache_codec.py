@@ -0,0 +1,146 @@
+"""
+Storage format and TTL policy for the Redis URL cache.
+
+Values written by the compact codec start with a one-byte tag:
+
+    0x01  plain UTF-8 URL (short URLs, where compression would not pay off)
+    0x02  raw DEFLATE of the URL against PRESET_DICTIONARY
+
+Anything else is a legacy value, i.e. an html.escape()d URL as stored before
+this format existed, so existing caches keep working during a rollout. The
+preset dictionary is part of the 0x02 format: changing it requires a new tag.
+"""
+import html
+import math
+import threading
+import zlib
+from typing import Optional, Union
+
+PLAIN_TAG = b'\x01'
+DEFLATE_TAG = b'\x02'
+
+# Substrings common in shortened links; the most frequent ones go last, where
+# DEFLATE can reference them with the shortest distances
+PRESET_DICTIONARY = (
+    b"index.html.php.aspx?id=&page=&ref=&lang=en&source=&gclid=&fbclid="
+    b"https://docs.google.com/document/d/https://drive.google.com/file/d/"
+    b"https://open.spotify.com/https://www.linkedin.com/in/https://www.facebook.com/"
+    b"https://twitter.com/https://x.com/https://www.instagram.com/p/"
+    b"https://medium.com/@https://stackoverflow.com/questions/"
+    b"https://www.amazon.com/dp/https://github.com/"
+    b"&utm_content=&utm_term=?utm_source=&utm_medium=&utm_campaign="
+    b"https://www.youtube.com/watch?v=https://youtu.be/https://www.bigshort.one/"
+    b".org/.net/.io/.com/http://https://www."
+)
+
+
+class EscapedCodec:
+    """Legacy format: the html.escape()d URL as a plain string"""
+
+    name = 'escaped'
+
+    def encode(self, url: str) -> str:
+        return html.escape(url)
+
+    def decode(self, value: Union[bytes, str, None]) -> Optional[str]:
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return html.unescape(value)
+
+
+class CompactCodec(EscapedCodec):
+    """
+    Tagged binary format: URLs of `compress_min_length` bytes or more are
+    DEFLATE-compressed with a preset dictionary of common hosts and query
+    parameters; shorter ones are stored as-is. Decodes legacy values too.
+
+    Reading compressed values needs a Redis client with decode_responses=False.
+    """
+
+    name = 'compact'
+
+    def __init__(self, compress_min_length: int = 24, level: int = 9, dictionary: bytes = PRESET_DICTIONARY):
+        self.compress_min_length = compress_min_length
+        self.level = level
+        self.dictionary = dictionary
+
+    def encode(self, url: str) -> bytes:
+        raw = url.encode('utf-8')
+        if len(raw) >= self.compress_min_length:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15, zdict=self.dictionary)
+            packed = compressor.compress(raw) + compressor.flush()
+            if len(packed) < len(raw):
+                return DEFLATE_TAG + packed
+        return PLAIN_TAG + raw
+
+    def decode(self, value: Union[bytes, str, None]) -> Optional[str]:
+        if isinstance(value, bytes):
+            tag = value[:1]
+            if tag == PLAIN_TAG:
+                return value[1:].decode('utf-8')
+            if tag == DEFLATE_TAG:
+                decompressor = zlib.decompressobj(-15, zdict=self.dictionary)
+                return (decompressor.decompress(value[1:]) + decompressor.flush()).decode('utf-8')
+        return super().decode(value)
+
+
+def create_codec(name: str, compress_min_length: int = 24):
+    if name == 'escaped':
+        return EscapedCodec()
+    if name == 'compact':
+        return CompactCodec(compress_min_length=compress_min_length)
+    raise ValueError(f"Unknown cache codec: {name}")
+
+
+class CacheTTLPolicy:
+    """
+    Popularity-aware expiry for cached mappings.
+
+    New links get `new_ttl`. Links backfilled after a cache miss get `miss_ttl`,
+    scaled up with their click count (doubling per order of magnitude) and
+    capped at `hot_ttl`. Every `hot_hits` Redis hits a worker sees for the same
+    code, `touch_ttl` returns `hot_ttl` so the caller can extend the entry, which
+    keeps popular links resident while cold ones age out.
+    """
+
+    def __init__(self, new_ttl: int = 7 * 86400, miss_ttl: int = 3600, hot_ttl: int = 30 * 86400,
+                 hot_hits: int = 3, max_tracked: int = 100000):
+        self.new_ttl = new_ttl
+        self.miss_ttl = miss_ttl
+        self.hot_ttl = hot_ttl
+        self.hot_hits = hot_hits
+        self.max_tracked = max_tracked
+        self._hits = {}
+        self._lock = threading.Lock()
+
+        self.extensions = 0
+
+    def ttl_for_backfill(self, clicks: Optional[int] = None) -> int:
+        if not clicks or clicks <= 0:
+            return self.miss_ttl
+        return min(self.hot_ttl, int(self.miss_ttl * 2 ** math.log10(1 + clicks)))
+
+    def touch_ttl(self, short_code: str) -> Optional[int]:
+        """Count a Redis hit; returns the TTL to extend the entry to, or None"""
+        with self._lock:
+            if len(self._hits) >= self.max_tracked:
+                self._hits.clear()
+            hits = self._hits.get(short_code, 0) + 1
+            if hits < self.hot_hits:
+                self._hits[short_code] = hits
+                return None
+            self._hits.pop(short_code, None)
+            self.extensions += 1
+            return self.hot_ttl
+
+    def stats(self) -> dict:
+        return {
+            "new_ttl": self.new_ttl,
+            "miss_ttl": self.miss_ttl,
+            "hot_ttl": self.hot_ttl,
+            "tracked": len(self._hits),
+            "extensions": self.extensions,
+        }
+
@@ -0,0 +1,215 @@
+"""
+Consumer worker that bulk-loads redirect events from Kafka into url_clicks.
+
+    python click_consumer.py                          # consume KAFKA_TOPIC from KAFKA_BROKER
+    python click_consumer.py --file events.ndjson     # replay a file of JSON events (one per line)
+
+Offsets are committed only after a batch is in Postgres, so delivery is at-least-once.
+
+Connection-level database errors are retried until they clear. Any other load
+failure is retried CLICK_MAX_ATTEMPTS times, then the batch is split in half
+and each half loaded on its own, so one bad event ends up appended to the
+dead-letter file (CLICK_DEAD_LETTER_PATH, replayable with --file) instead of
+blocking the partition. Tombstones and values that are not JSON objects are
+skipped when read.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import time
+from typing import Callable, Optional
+
+from db.pg_connector import copy_click_events
+from db.pool import TRANSIENT_ERRORS, write_isolating
+
+KAFKA_TOPIC = os.getenv('KAFKA_TOPIC', 'url-shortening')
+KAFKA_BROKER = os.getenv('KAFKA_BROKER')
+KAFKA_GROUP_ID = os.getenv('KAFKA_CLICKS_GROUP_ID', 'url-clicks-loader')
+
+CLICK_MAX_ATTEMPTS = int(os.getenv('CLICK_MAX_ATTEMPTS', '3'))
+CLICK_DEAD_LETTER_PATH = os.getenv('CLICK_DEAD_LETTER_PATH', 'click_events.dead.ndjson')
+
+
+def parse_event(value) -> Optional[dict]:
+    """A click event from a raw message value, or None when it is not a JSON object"""
+    try:
+        event = json.loads(value)
+    except (TypeError, ValueError):
+        return None
+    return event if isinstance(event, dict) else None
+
+
+class KafkaEventSource:
+    """Reads click events from Kafka in batches; `commit` marks the last batch as loaded"""
+
+    def __init__(self, broker: str, topic: str, group_id: str):
+        from confluent_kafka import Consumer
+
+        self.consumer = Consumer({
+            'bootstrap.servers': broker,
+            'group.id': group_id,
+            'enable.auto.commit': False,
+            'auto.offset.reset': 'earliest',
+        })
+        self.consumer.subscribe([topic])
+
+    def read_batch(self, batch_size: int, timeout: float) -> list:
+        events = []
+        for message in self.consumer.consume(num_messages=batch_size, timeout=timeout):
+            if message.error():
+                logging.error("Kafka consumer error: %s", message.error())
+                continue
+            if message.value() is None:
+                # Tombstone (compaction marker), not an event
+                continue
+            event = parse_event(message.value())
+            if event is None:
+                logging.error("Skipping malformed click event at offset %s", message.offset())
+                continue
+            events.append(event)
+        return events
+
+    def commit(self):
+        self.consumer.commit(asynchronous=False)
+
+    def close(self):
+        self.consumer.close()
+
+
+class FileEventSource:
+    """File-backed stand-in for the broker: reads newline-delimited JSON events"""
+
+    def __init__(self, path: str):
+        self.file = open(path, 'r')
+        self.exhausted = False
+
+    def read_batch(self, batch_size: int, timeout: float) -> list:
+        events = []
+        for line in self.file:
+            line = line.strip()
+            if not line:
+                continue
+            event = parse_event(line)
+            if event is None:
+                logging.error("Skipping malformed click event line")
+                continue
+            events.append(event)
+            if len(events) >= batch_size:
+                return events
+        self.exhausted = True
+        return events
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.file.close()
+
+
+class DeadLetterFile:
+    """Appends click events that could not be loaded, one JSON object per line"""
+
+    def __init__(self, path: str = CLICK_DEAD_LETTER_PATH):
+        self.path = path
+        self.count = 0
+
+    def write(self, events: list, error: Exception):
+        with open(self.path, 'a') as f:
+            for event in events:
+                f.write(json.dumps(event, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.count += len(events)
+        logging.error("Dead-lettered %d click event(s) to %s: %s", len(events), self.path, error)
+
+
+class LoadInterrupted(Exception):
+    """The process was asked to stop while a batch was still failing"""
+
+
+def load_events(events: list, dead_letter: DeadLetterFile, max_attempts: int = CLICK_MAX_ATTEMPTS,
+                retry_delay: float = 1.0, should_stop: Optional[Callable[[], bool]] = None) -> int:
+    """
+    copy_click_events() that isolates poison events: after `max_attempts`
+    non-transient failures the batch is loaded in halves, down to single events
+    that go to `dead_letter`. Returns the number of rows inserted.
+    """
+    loaded = 0
+
+    def on_error(batch: list, error: Exception, failures: int):
+        if not isinstance(error, TRANSIENT_ERRORS):
+            logging.error("Failed to load %d click events: %s", len(batch), error)
+            return
+        logging.error("Failed to load %d click events, retrying: %s", len(batch), error)
+        if should_stop is not None and should_stop():
+            raise LoadInterrupted()
+        time.sleep(retry_delay)
+
+    def on_written(batch: list, inserted: int):
+        nonlocal loaded
+        loaded += inserted
+
+    write_isolating(events, copy_click_events, lambda event, error: dead_letter.write([event], error),
+                    max_attempts, on_error, on_written)
+    return loaded
+
+
+def run(source, batch_size: int = 5000, flush_interval: float = 1.0, dead_letter: DeadLetterFile = None,
+        max_attempts: int = CLICK_MAX_ATTEMPTS, retry_delay: float = 1.0):
+    """Load batches from `source` until it is exhausted or the process is asked to stop"""
+    dead_letter = dead_letter or DeadLetterFile()
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    loaded = 0
+    try:
+        while not stopping and not getattr(source, 'exhausted', False):
+            events = source.read_batch(batch_size, flush_interval)
+            if not events:
+                continue
+            try:
+                loaded += load_events(events, dead_letter, max_attempts, retry_delay, lambda: stopping)
+            except LoadInterrupted:
+                # Offsets stay uncommitted, so the batch is read again on the next start
+                return loaded
+            source.commit()
+            logging.info("Loaded %d click events (%d total)", len(events), loaded)
+    finally:
+        source.close()
+    return loaded
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Bulk-load redirect events into url_clicks")
+    parser.add_argument('--file', help="Read events from a newline-delimited JSON file instead of Kafka")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--flush-interval', type=float, default=1.0,
+                        help="Seconds to wait for a full batch before loading a partial one")
+    parser.add_argument('--max-attempts', type=int, default=CLICK_MAX_ATTEMPTS,
+                        help="Failed loads before a batch is split to isolate bad events")
+    parser.add_argument('--dead-letter', default=CLICK_DEAD_LETTER_PATH,
+                        help="File that events which cannot be loaded are appended to")
+    args = parser.parse_args()
+
+    if args.file:
+        source = FileEventSource(args.file)
+    else:
+        if not KAFKA_BROKER:
+            parser.error("KAFKA_BROKER is not set; pass --file to load from a file")
+        source = KafkaEventSource(KAFKA_BROKER, KAFKA_TOPIC, KAFKA_GROUP_ID)
+
+    run(source, batch_size=args.batch_size, flush_interval=args.flush_interval,
+        dead_letter=DeadLetterFile(args.dead_letter), max_attempts=max(1, args.max_attempts))
+
+
+if __name__ == '__main__':
+    main()
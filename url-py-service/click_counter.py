@@ -0,0 +1,153 @@
+import logging
+import threading
+import uuid
+import zlib
+from typing import Callable, Dict, Optional
+
+from redis.exceptions import ResponseError
+
+from periodic import PeriodicTask
+from redis_lock import RedisLock
+
+
+class LocalClickCounter:
+    """
+    In-process sharded click counter.
+
+    Each shard is a plain dict guarded by its own lock, so concurrent redirects for
+    different codes rarely contend. `flush` swaps every shard for an empty dict and
+    hands the merged deltas to `flush_fn`; on failure the deltas are merged back.
+    Clicks not yet flushed are lost if the worker dies.
+    """
+
+    def __init__(self, flush_fn: Callable[[Dict[str, int]], int], flush_interval: float = 5.0,
+                 shards: int = 16):
+        self.flush_fn = flush_fn
+        self._shards = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._flush_lock = threading.Lock()
+        self._task = PeriodicTask("click-flusher", flush_interval, self.flush)
+
+        self.flushed = 0
+        self.flush_errors = 0
+
+    def _shard(self, short_code: str) -> int:
+        return zlib.crc32(short_code.encode()) % len(self._shards)
+
+    def incr(self, short_code: str, amount: int = 1):
+        self._task.ensure_started()
+        index = self._shard(short_code)
+        with self._locks[index]:
+            shard = self._shards[index]
+            shard[short_code] = shard.get(short_code, 0) + amount
+
+    def _drain(self) -> Dict[str, int]:
+        deltas = {}
+        for index, lock in enumerate(self._locks):
+            with lock:
+                shard, self._shards[index] = self._shards[index], {}
+            deltas.update(shard)
+        return deltas
+
+    def flush(self):
+        with self._flush_lock:
+            deltas = self._drain()
+            if not deltas:
+                return
+            try:
+                self.flush_fn(deltas)
+                self.flushed += sum(deltas.values())
+            except Exception as e:
+                self.flush_errors += 1
+                logging.error("Click flush of %d codes failed, retrying next interval: %s", len(deltas), e)
+                for short_code, amount in deltas.items():
+                    index = self._shard(short_code)
+                    with self._locks[index]:
+                        shard = self._shards[index]
+                        shard[short_code] = shard.get(short_code, 0) + amount
+
+    def pending(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "local",
+            "pending_codes": self.pending(),
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+        }
+
+
+class RedisClickCounter:
+    """
+    Click counter shared by all workers through a Redis hash.
+
+    Redirects do one HINCRBY on `pending_key`. The flusher (any worker, serialized
+    by a short lock) renames the hash to `flushing_key`, applies it to Postgres and
+    deletes it. A failed flush leaves `flushing_key` in place and it is retried
+    before anything new is taken, so deltas are never dropped.
+
+    The batch is tagged with a token (a field of `flushing_key`, set once) that
+    `flush_fn(deltas, token)` must apply at most once, e.g. by recording it in
+    the same transaction (see add_clicks). A retry after the deltas were applied
+    but the key could not be deleted is then a no-op rather than a double count.
+    """
+
+    TOKEN_FIELD = '__flush_token__'
+
+    def __init__(self, redis_client, flush_fn: Callable[[Dict[str, int], Optional[str]], int],
+                 flush_interval: float = 5.0, pending_key: str = 'clicks:pending',
+                 flushing_key: str = 'clicks:flushing', lock_key: str = 'clicks:flush-lock'):
+        self.redis = redis_client
+        self.flush_fn = flush_fn
+        self.flush_interval = flush_interval
+        self.pending_key = pending_key
+        self.flushing_key = flushing_key
+        self._lock = RedisLock(redis_client, lock_key, ttl_ms=int(max(flush_interval * 4, 30) * 1000))
+        self._task = PeriodicTask("click-flusher", flush_interval, self.flush)
+
+        self.flushed = 0
+        self.flush_errors = 0
+
+    def incr(self, short_code: str, amount: int = 1):
+        self._task.ensure_started()
+        self.redis.hincrby(self.pending_key, short_code, amount)
+
+    def flush(self):
+        if not self._lock.acquire():
+            return  # another worker is flushing
+        try:
+            if not self.redis.exists(self.flushing_key):
+                try:
+                    self.redis.rename(self.pending_key, self.flushing_key)
+                except ResponseError:
+                    return  # nothing pending
+
+            # Kept by a retry, so it names this batch however many attempts it takes
+            self.redis.hsetnx(self.flushing_key, self.TOKEN_FIELD, uuid.uuid4().hex)
+            fields = self.redis.hgetall(self.flushing_key)
+            token = fields.pop(self.TOKEN_FIELD)
+            deltas = {code: int(amount) for code, amount in fields.items()}
+            if deltas and self.flush_fn(deltas, token):
+                self.flushed += sum(deltas.values())
+            self.redis.delete(self.flushing_key)
+        except Exception as e:
+            self.flush_errors += 1
+            logging.error("Click flush failed, retrying next interval: %s", e)
+        finally:
+            self._lock.release()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+        }
+
+
+def create_click_counter(backend: str, flush_fn: Callable[[Dict[str, int]], int],
+                         redis_client=None, flush_interval: float = 5.0):
+    """Build the click counter for CLICK_COUNTER_BACKEND ('local' or 'redis')"""
+    if (backend or 'local').lower() == 'redis' and redis_client is not None:
+        return RedisClickCounter(redis_client, flush_fn, flush_interval=flush_interval)
+    return LocalClickCounter(flush_fn, flush_interval=flush_interval)
@@ -0,0 +1,91 @@
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from typing import List, Optional
+
+
+class ShortCodeLease:
+    """
+    Per-worker buffer of short codes leased in blocks from the pre-gen pool.
+
+    One `LPOP short_urls <lease_size>` round trip serves the next `lease_size`
+    shorten requests with no network I/O. Unused codes are pushed back to the
+    head of the pool on graceful shutdown. If a worker crashes, at most
+    `lease_size` codes are lost; since every code is unique, losing one only
+    wastes it and never causes a duplicate.
+    """
+
+    def __init__(self, url_store, lease_size: int = 500):
+        self.url_store = url_store
+        self.lease_size = lease_size
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._pid = None
+
+        self.leases = 0
+        self.leased = 0
+        self.handed_out = 0
+        self.returned = 0
+
+    def _check_fork(self):
+        # Codes leased by a parent process belong to it; a child must never hand them out
+        if self._pid != os.getpid():
+            self._buffer = deque()
+            self._pid = os.getpid()
+            atexit.register(self.release_all)
+
+    def _lease(self, minimum: int) -> int:
+        codes = self.url_store.claim_codes(max(self.lease_size, minimum))
+        self._buffer.extend(codes)
+        if codes:
+            self.leases += 1
+            self.leased += len(codes)
+        return len(codes)
+
+    def acquire(self) -> Optional[str]:
+        """Hand out one code, leasing a new block when the buffer is empty. None if the pool is empty."""
+        codes = self.acquire_many(1)
+        return codes[0] if codes else None
+
+    def acquire_many(self, count: int) -> List[str]:
+        """Hand out up to `count` codes (fewer only if the pool runs dry)"""
+        with self._lock:
+            self._check_fork()
+            if len(self._buffer) < count:
+                self._lease(count - len(self._buffer))
+            codes = [self._buffer.popleft() for _ in range(min(count, len(self._buffer)))]
+            self.handed_out += len(codes)
+            return codes
+
+    def give_back(self, codes: List[str]):
+        """Return codes a caller took but did not use to the local buffer"""
+        with self._lock:
+            self._check_fork()
+            self._buffer.extendleft(reversed(codes))
+            self.handed_out -= len(codes)
+
+    def release_all(self):
+        """Push every unused leased code back to the pre-gen pool (graceful shutdown)"""
+        with self._lock:
+            if self._pid != os.getpid() or not self._buffer:
+                return
+            codes = list(self._buffer)
+            self._buffer.clear()
+        try:
+            self.url_store.return_codes(codes)
+            self.returned += len(codes)
+            logging.info("Returned %d leased short codes to the pool", len(codes))
+        except Exception as e:
+            logging.error("Failed to return %d leased short codes: %s", len(codes), e)
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._buffer),
+            "lease_size": self.lease_size,
+            "leases": self.leases,
+            "leased": self.leased,
+            "handed_out": self.handed_out,
+            "returned": self.returned,
+        }
@@ -0,0 +1,248 @@
+"""
+Short-code generation and pre-gen pool refilling.
+
+Codes are derived from a Redis sequence (INCRBY reserves a block per batch) that
+is scrambled by a keyed Feistel permutation and base62-encoded, so every
+sequence number maps to a distinct code of SHORT_CODE_LENGTH characters and
+adjacent sequence numbers give unrelated codes. Codes already in `urls` (e.g.
+issued by an older generator) are filtered out before they are pushed to the
+pool.
+
+SHORT_CODE_KEY selects the permutation. Keep it fixed for the life of a
+deployment: after changing it (or upgrading from the multiply-mod generator),
+empty the pre-gen list once, since new codes may repeat ones still queued there.
+
+Bulk pre-generation:
+
+    python codegen.py --count 5000000 --batch 20000
+"""
+import argparse
+import hashlib
+import logging
+import os
+import time
+from typing import Callable, Iterable, List
+
+from periodic import PeriodicTask
+from redis_lock import RedisLock
+
+BASE62_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+SHORT_CODE_LENGTH = int(os.getenv('SHORT_CODE_LENGTH', '7'))
+# Any string; keep it private if codes should not be predictable from one another
+SHORT_CODE_KEY = os.getenv('SHORT_CODE_KEY', 'url-py-service')
+
+POOL_KEY = 'short_urls'
+SEQUENCE_KEY = 'short_urls:sequence'
+REFILL_LOCK_KEY = 'short_urls:refill-lock'
+
+
+def encode_base62(number: int, length: int = SHORT_CODE_LENGTH) -> str:
+    chars = []
+    for _ in range(length):
+        number, remainder = divmod(number, 62)
+        chars.append(BASE62_ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+class FeistelPermutation:
+    """
+    Keyed bijection on range(space).
+
+    A balanced Feistel network over the smallest even number of bits covering
+    `space`, with cycle-walking (re-encrypting until the value falls back into
+    range) so the result is a permutation of range(space) itself. Every output
+    bit depends on every input bit, unlike an affine map where consecutive
+    inputs differ by a constant.
+    """
+
+    ROUNDS = 6
+    _MASK64 = (1 << 64) - 1
+
+    def __init__(self, space: int, key: str = SHORT_CODE_KEY):
+        if space < 2:
+            raise ValueError("Permutation space must hold at least two values")
+        self.space = space
+        self.half_bits = max(1, ((space - 1).bit_length() + 1) // 2)
+        self.half_mask = (1 << self.half_bits) - 1
+        self.round_keys = [
+            int.from_bytes(hashlib.blake2b(f"{key}:{i}".encode(), digest_size=8).digest(), 'big')
+            for i in range(self.ROUNDS)
+        ]
+
+    def _round(self, value: int, round_key: int) -> int:
+        # splitmix64 finaliser over the half-block and round key
+        x = (value ^ round_key) & self._MASK64
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & self._MASK64
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & self._MASK64
+        return (x ^ (x >> 31)) & self.half_mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.half_mask
+        for round_key in self.round_keys:
+            left, right = right, left ^ self._round(right, round_key)
+        return (left << self.half_bits) | right
+
+    def permute(self, value: int) -> int:
+        if not 0 <= value < self.space:
+            raise ValueError(f"{value} is outside the permutation space")
+        value = self._encrypt(value)
+        while value >= self.space:
+            value = self._encrypt(value)
+        return value
+
+
+class CodeGenerator:
+    """Turns reserved sequence numbers into unique base62 short codes"""
+
+    def __init__(self, redis_client, length: int = SHORT_CODE_LENGTH, key: str = SHORT_CODE_KEY,
+                 sequence_key: str = SEQUENCE_KEY,
+                 exists_fn: Callable[[List[str]], set] = None):
+        self.redis = redis_client
+        self.length = length
+        self.space = 62 ** length
+        self.permutation = FeistelPermutation(self.space, key)
+        self.sequence_key = sequence_key
+        self.exists_fn = exists_fn
+
+        self.generated = 0
+        self.collisions = 0
+
+    def _code_for(self, sequence: int) -> str:
+        if sequence >= self.space:
+            raise RuntimeError(f"Short-code space of length {self.length} is exhausted")
+        return encode_base62(self.permutation.permute(sequence), self.length)
+
+    def generate(self, count: int) -> List[str]:
+        """Reserve `count` sequence numbers and return the codes not already in use"""
+        end = self.redis.incrby(self.sequence_key, count)
+        codes = [self._code_for(sequence) for sequence in range(end - count, end)]
+        self.generated += len(codes)
+
+        if self.exists_fn is not None:
+            taken = self.exists_fn(codes)
+            if taken:
+                self.collisions += len(taken)
+                codes = [code for code in codes if code not in taken]
+        return codes
+
+
+def push_codes(redis_client, codes: Iterable[str], pool_key: str = POOL_KEY, chunk_size: int = 10000) -> int:
+    """RPUSH codes onto the pool in chunks, one pipeline round trip per call"""
+    codes = list(codes)
+    pipe = redis_client.pipeline(transaction=False)
+    for start in range(0, len(codes), chunk_size):
+        pipe.rpush(pool_key, *codes[start:start + chunk_size])
+    if codes:
+        pipe.execute()
+    return len(codes)
+
+
+class PoolRefiller:
+    """
+    Keeps the pre-gen list above `low_water` by topping it up to `high_water`.
+
+    Runs on every worker; a short Redis lock ensures only one of them refills
+    at a time. A request that finds the pool empty calls `top_up()` for just
+    the codes it needs rather than waiting for a full refill. Pool depth and
+    refill counters are exposed through `stats()`.
+    """
+
+    def __init__(self, redis_client, generator: CodeGenerator, low_water: int = 10000,
+                 high_water: int = 50000, batch_size: int = 10000, interval: float = 5.0,
+                 pool_key: str = POOL_KEY, lock_key: str = REFILL_LOCK_KEY):
+        self.redis = redis_client
+        self.generator = generator
+        self.low_water = low_water
+        self.high_water = high_water
+        self.batch_size = batch_size
+        self.pool_key = pool_key
+        self._lock = RedisLock(redis_client, lock_key, ttl_ms=60000)
+        self._task = PeriodicTask("pool-refiller", interval, self.refill_if_needed, run_on_stop=False)
+
+        self.depth = None
+        self.refills = 0
+        self.codes_pushed = 0
+        self.top_ups = 0
+        self.last_refill_at = None
+
+    def ensure_started(self):
+        self._task.ensure_started()
+
+    def refill_if_needed(self) -> int:
+        self.depth = self.redis.llen(self.pool_key)
+        if self.depth >= self.low_water:
+            return 0
+
+        if not self._lock.acquire():
+            return 0
+        try:
+            pushed = 0
+            depth = self.redis.llen(self.pool_key)
+            while depth < self.high_water:
+                codes = self.generator.generate(min(self.batch_size, self.high_water - depth))
+                pushed += push_codes(self.redis, codes, self.pool_key)
+                depth = self.redis.llen(self.pool_key)
+            self.depth = depth
+            if pushed:
+                self.refills += 1
+                self.codes_pushed += pushed
+                self.last_refill_at = time.time()
+                logging.info("Refilled short-code pool with %d codes (depth %d)", pushed, depth)
+            return pushed
+        finally:
+            self._lock.release()
+
+    def top_up(self, count: int) -> int:
+        """Push `count` fresh codes for a request that found the pool empty, and refill in the background"""
+        pushed = push_codes(self.redis, self.generator.generate(count), self.pool_key)
+        self.top_ups += 1
+        self.codes_pushed += pushed
+        self._task.wake()
+        return pushed
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "low_water": self.low_water,
+            "high_water": self.high_water,
+            "refills": self.refills,
+            "codes_pushed": self.codes_pushed,
+            "top_ups": self.top_ups,
+            "collisions": self.generator.collisions,
+            "last_refill_at": self.last_refill_at,
+        }
+
+
+def main():
+    import redis
+
+    from db.pg_connector import existing_short_codes
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Bulk pre-generate short codes into the pre-gen Redis pool")
+    parser.add_argument('--count', type=int, required=True, help="Number of codes to push")
+    parser.add_argument('--batch', type=int, default=20000, help="Codes generated and pushed per round trip")
+    parser.add_argument('--skip-db-check', action='store_true',
+                        help="Do not filter codes against urls.short_code")
+    args = parser.parse_args()
+
+    client = redis.Redis(
+        host=os.getenv('REDIS_URL'),
+        port=6379,
+        password=os.getenv('REDIS_PASSWORD', 'Welcome@Inf0r'),
+        decode_responses=True,
+    )
+    generator = CodeGenerator(client, exists_fn=None if args.skip_db_check else existing_short_codes)
+
+    pushed = 0
+    started = time.monotonic()
+    while pushed < args.count:
+        pushed += push_codes(client, generator.generate(min(args.batch, args.count - pushed)))
+        logging.info("Pushed %d/%d codes", pushed, args.count)
+    elapsed = time.monotonic() - started
+    logging.info("Done: %d codes in %.1fs, pool depth %d", pushed, elapsed, client.llen(POOL_KEY))
+
+
+if __name__ == '__main__':
+    main()
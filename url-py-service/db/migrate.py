@@ -0,0 +1,152 @@
+"""
+Schema migrations: numbered SQL files in db/migrations, applied in order.
+
+    python -m db.migrate            # apply pending migrations
+    python -m db.migrate --list     # show applied / pending
+
+Applied versions are recorded in schema_migrations. Each file runs in its own
+transaction together with its bookkeeping row, and a session advisory lock
+keeps concurrent runners (e.g. several containers starting at once) from
+applying the same file twice. Migrations are written to be idempotent, so a
+database created from schema.sql can be brought under migration control by
+simply running them.
+
+Statements that cannot run inside a transaction (CREATE/DROP INDEX
+CONCURRENTLY) go in a file marked with a line
+
+    -- migrate: no-transaction
+
+Such a file is run in autocommit mode one statement at a time; each statement
+must end with ';' at the end of a line. A failure part-way leaves the earlier
+statements applied, so every statement must be safe to re-run.
+"""
+import argparse
+import logging
+import os
+import re
+from typing import List, Tuple
+
+from db.pg_connector import get_db_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_([a-z0-9_]+)\.sql$')
+NO_TRANSACTION = re.compile(r'^--\s*migrate:\s*no-transaction\s*$', re.MULTILINE)
+STATEMENT_END = re.compile(r';[ \t]*$', re.MULTILINE)
+
+# Arbitrary constant shared by every runner
+MIGRATION_LOCK_ID = 7301244
+
+
+def available_migrations(directory: str = MIGRATIONS_DIR) -> List[Tuple[str, str]]:
+    """[(version, path), ...] sorted by version"""
+    migrations = []
+    for name in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(name)
+        if match:
+            migrations.append((match.group(1), os.path.join(directory, name)))
+    return migrations
+
+
+def split_statements(text: str) -> List[str]:
+    """Statements of a no-transaction migration, without comment lines"""
+    statements = []
+    for chunk in STATEMENT_END.split(text):
+        statement = '\n'.join(line for line in chunk.splitlines() if not line.strip().startswith('--')).strip()
+        if statement:
+            statements.append(statement)
+    return statements
+
+
+def _apply(conn, version: str, name: str, text: str):
+    if not NO_TRANSACTION.search(text):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(text)
+                cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return
+
+    # Each statement is sent on its own: several in one query string run as one implicit transaction
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for statement in split_statements(text):
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+    finally:
+        conn.autocommit = False
+
+
+def _ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(conn) -> set:
+    with conn.cursor() as cursor:
+        _ensure_table(cursor)
+        cursor.execute("SELECT version FROM schema_migrations")
+        versions = {row[0] for row in cursor.fetchall()}
+    conn.commit()
+    return versions
+
+
+def migrate(directory: str = MIGRATIONS_DIR) -> List[str]:
+    """Apply every pending migration; returns the file names applied"""
+    applied = []
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        try:
+            done = applied_versions(conn)
+            for version, path in available_migrations(directory):
+                if version in done:
+                    continue
+                name = os.path.basename(path)
+                with open(path, 'r') as f:
+                    text = f.read()
+                try:
+                    _apply(conn, version, name, text)
+                except Exception:
+                    logging.error("Migration %s failed; later migrations were not applied", name)
+                    raise
+                logging.info("Applied migration %s", name)
+                applied.append(name)
+        finally:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+    return applied
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Apply schema migrations from db/migrations")
+    parser.add_argument('--list', action='store_true', help="Show applied and pending migrations without applying")
+    args = parser.parse_args()
+
+    if args.list:
+        with get_db_connection() as conn:
+            done = applied_versions(conn)
+        for version, path in available_migrations():
+            print(f"{'applied' if version in done else 'pending'}  {os.path.basename(path)}")
+        return
+
+    applied = migrate()
+    if applied:
+        logging.info("Applied %d migration(s)", len(applied))
+    else:
+        logging.info("Schema is up to date")
+
+
+if __name__ == '__main__':
+    main()
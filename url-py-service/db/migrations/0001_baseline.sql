@@ -0,0 +1,32 @@
+-- Schema as created by schema.sql/init.sql before migrations existed.
+-- A no-op on those databases; creates the tables on an empty one.
+
+CREATE TABLE IF NOT EXISTS urls (
+    id UUID PRIMARY KEY,
+    original_url TEXT NOT NULL,
+    short_code VARCHAR(10) UNIQUE NOT NULL,
+    display BOOLEAN DEFAULT FALSE,
+    clicks INTEGER DEFAULT 0,
+    custom_url BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sec_ch_ua_platform TEXT,
+    sec_ch_ua TEXT,
+    sec_ch_ua_mobile TEXT
+);
+
+CREATE TABLE IF NOT EXISTS url_clicks (
+    id SERIAL PRIMARY KEY,
+    url_id UUID REFERENCES urls(id) ON DELETE CASCADE,
+    user_agent TEXT,
+    ip_address INET,
+    referrer TEXT,
+    device_info TEXT,
+    sec_ch_ua_platform TEXT,
+    sec_ch_ua TEXT,
+    sec_ch_ua_mobile TEXT,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_short_code ON urls(short_code);
+CREATE INDEX IF NOT EXISTS idx_url_id ON url_clicks(url_id);
+CREATE INDEX IF NOT EXISTS idx_created_at ON urls(created_at);
@@ -0,0 +1,4 @@
+-- Shorten-time dedup (URL_DEDUP): truncated SHA-256 of the normalized URL
+
+ALTER TABLE urls ADD COLUMN IF NOT EXISTS url_hash BYTEA;
+CREATE INDEX IF NOT EXISTS idx_url_hash ON urls(url_hash) WHERE url_hash IS NOT NULL;
@@ -0,0 +1,4 @@
+-- The UNIQUE constraint on urls.short_code already provides an index
+-- (urls_short_code_key); idx_short_code only doubled the write and vacuum cost.
+
+DROP INDEX IF EXISTS idx_short_code;
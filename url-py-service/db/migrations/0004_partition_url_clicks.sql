@@ -0,0 +1,73 @@
+-- Monthly range partitions for url_clicks (one row per redirect).
+-- Partitions are named url_clicks_pYYYYMM. Old months are archived and dropped
+-- whole (python -m db.partitions --archive) instead of DELETEd, so insert and
+-- vacuum costs depend on the size of recent months only.
+
+-- Create the partition holding `p_month` unless it exists; returns its name.
+-- Safe to call concurrently and on every load (copy_click_events does).
+CREATE OR REPLACE FUNCTION url_clicks_ensure_partition(p_month DATE) RETURNS TEXT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_month)::date;
+    partition_name TEXT := 'url_clicks_p' || to_char(month_start, 'YYYYMM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF url_clicks FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, (month_start + INTERVAL '1 month')::date
+            );
+        EXCEPTION WHEN duplicate_table THEN
+            NULL;  -- created by a concurrent caller
+        END;
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'url_clicks'::regclass) = 'p' THEN
+        RETURN;  -- already partitioned (fresh schema.sql database)
+    END IF;
+
+    -- Free the names the partitioned table reuses
+    ALTER TABLE url_clicks RENAME TO url_clicks_unpartitioned;
+    ALTER TABLE url_clicks_unpartitioned RENAME CONSTRAINT url_clicks_pkey TO url_clicks_unpartitioned_pkey;
+    ALTER SEQUENCE url_clicks_id_seq RENAME TO url_clicks_unpartitioned_id_seq;
+    ALTER INDEX IF EXISTS idx_url_id RENAME TO idx_url_id_unpartitioned;
+
+    -- The partition key has to be part of the primary key
+    CREATE TABLE url_clicks (
+        id BIGSERIAL,
+        url_id UUID REFERENCES urls(id) ON DELETE CASCADE,
+        user_agent TEXT,
+        ip_address INET,
+        referrer TEXT,
+        device_info TEXT,
+        sec_ch_ua_platform TEXT,
+        sec_ch_ua TEXT,
+        sec_ch_ua_mobile TEXT,
+        timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+    CREATE INDEX idx_url_id ON url_clicks(url_id);
+
+    -- Every month that has rows, through two months ahead
+    PERFORM url_clicks_ensure_partition(month::date)
+    FROM generate_series(
+        date_trunc('month', COALESCE((SELECT min(timestamp) FROM url_clicks_unpartitioned), CURRENT_TIMESTAMP)),
+        date_trunc('month', CURRENT_TIMESTAMP) + INTERVAL '2 months',
+        INTERVAL '1 month'
+    ) AS month;
+
+    INSERT INTO url_clicks (id, url_id, user_agent, ip_address, referrer, device_info,
+        sec_ch_ua_platform, sec_ch_ua, sec_ch_ua_mobile, timestamp)
+    SELECT id, url_id, user_agent, ip_address, referrer, device_info,
+        sec_ch_ua_platform, sec_ch_ua, sec_ch_ua_mobile, COALESCE(timestamp, CURRENT_TIMESTAMP)
+    FROM url_clicks_unpartitioned;
+    PERFORM setval(pg_get_serial_sequence('url_clicks', 'id'),
+                   GREATEST((SELECT max(id) FROM url_clicks), 1));
+
+    DROP TABLE url_clicks_unpartitioned;
+END;
+$$;
@@ -0,0 +1,12 @@
+-- migrate: no-transaction
+--
+-- The listing pages on (created_at DESC, id DESC); the baseline only has the
+-- single-column idx_created_at ON urls(created_at). Build the composite index
+-- under a new name without blocking writes, then drop the old one.
+--
+-- If the CREATE is interrupted it leaves an INVALID index behind; drop it
+-- (DROP INDEX CONCURRENTLY idx_urls_created_at_id) before re-running.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_urls_created_at_id ON urls (created_at DESC, id DESC);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_created_at;
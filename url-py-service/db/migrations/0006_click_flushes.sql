@@ -0,0 +1,9 @@
+-- Redis click counter (CLICK_COUNTER_BACKEND=redis): every flushed batch carries a
+-- token that is recorded in the same transaction as its click UPDATE, so a batch
+-- whose Redis cleanup failed is not added to urls.clicks again when retried.
+
+CREATE TABLE IF NOT EXISTS click_flushes (
+    token TEXT PRIMARY KEY,
+    applied_at TIMESTAMP NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_click_flushes_applied_at ON click_flushes(applied_at);
@@ -0,0 +1,146 @@
+"""
+Partition maintenance for url_clicks (monthly range partitions, see
+db/migrations/0004_partition_url_clicks.sql).
+
+    python -m db.partitions --ensure                       # create this month and the next ones
+    python -m db.partitions --archive --retain-months 6    # archive and drop older months
+
+Archiving a month writes its rows to <archive dir>/url_clicks_pYYYYMM.csv.gz
+(gzip-compressed COPY CSV with a header), then detaches and drops the
+partition in the same transaction. The partition is locked against writes
+while it is copied, so no late event can land between the copy and the drop.
+Restore with:
+
+    gunzip -c url_clicks_p202401.csv.gz | psql -c "COPY url_clicks FROM STDIN WITH (FORMAT csv, HEADER)"
+"""
+import argparse
+import gzip
+import logging
+import os
+import re
+from datetime import date
+from typing import List, Tuple
+
+from psycopg2 import sql
+
+from db.pg_connector import get_db_connection
+
+PARTITION_NAME = re.compile(r'^url_clicks_p(\d{4})(\d{2})$')
+
+CLICK_ARCHIVE_DIR = os.getenv('CLICK_ARCHIVE_DIR', 'archive')
+CLICK_RETAIN_MONTHS = int(os.getenv('CLICK_RETAIN_MONTHS', '6'))
+CLICK_PARTITIONS_AHEAD = int(os.getenv('CLICK_PARTITIONS_AHEAD', '2'))
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def list_partitions() -> List[Tuple[date, str]]:
+    """[(first day of month, partition name), ...], oldest first"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'url_clicks'::regclass
+            """)
+            names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def ensure_partitions(months_ahead: int = CLICK_PARTITIONS_AHEAD) -> List[str]:
+    """Create the current month's partition and `months_ahead` after it"""
+    this_month = date.today().replace(day=1)
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            names = []
+            for offset in range(months_ahead + 1):
+                cursor.execute("SELECT url_clicks_ensure_partition(%s)", (add_months(this_month, offset),))
+                names.append(cursor.fetchone()[0])
+        conn.commit()
+    return names
+
+
+def archive_partition(name: str, archive_dir: str = CLICK_ARCHIVE_DIR) -> str:
+    """Copy one partition to a gzip CSV file, then detach and drop it. Returns the file path."""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    partial = path + '.partial'
+
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                # Writers to this month wait until the partition is gone
+                cursor.execute(sql.SQL("LOCK TABLE {} IN SHARE MODE").format(sql.Identifier(name)))
+                with gzip.open(partial, 'wt', encoding='utf-8') as f:
+                    cursor.copy_expert(
+                        sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER)")
+                        .format(sql.Identifier(name)).as_string(conn),
+                        f,
+                    )
+                with open(partial, 'rb') as f:
+                    os.fsync(f.fileno())
+                os.replace(partial, path)
+
+                cursor.execute(sql.SQL("ALTER TABLE url_clicks DETACH PARTITION {}").format(sql.Identifier(name)))
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+    return path
+
+
+def archive_partitions(retain_months: int = CLICK_RETAIN_MONTHS, archive_dir: str = CLICK_ARCHIVE_DIR,
+                       dry_run: bool = False) -> List[str]:
+    """Archive every partition older than the last `retain_months` months (the current one included)"""
+    cutoff = add_months(date.today().replace(day=1), -(retain_months - 1))
+    archived = []
+    for month, name in list_partitions():
+        if month >= cutoff:
+            continue
+        if dry_run:
+            logging.info("Would archive %s", name)
+        else:
+            logging.info("Archived %s to %s", name, archive_partition(name, archive_dir))
+        archived.append(name)
+    return archived
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Create and archive url_clicks partitions")
+    parser.add_argument('--ensure', action='store_true', help="Create the current and upcoming monthly partitions")
+    parser.add_argument('--months-ahead', type=int, default=CLICK_PARTITIONS_AHEAD)
+    parser.add_argument('--archive', action='store_true', help="Archive and drop partitions past the retention")
+    parser.add_argument('--retain-months', type=int, default=CLICK_RETAIN_MONTHS)
+    parser.add_argument('--archive-dir', default=CLICK_ARCHIVE_DIR)
+    parser.add_argument('--dry-run', action='store_true', help="With --archive, only list what would be archived")
+    args = parser.parse_args()
+
+    if not args.ensure and not args.archive:
+        parser.print_help()
+        return
+    if args.retain_months < 1:
+        parser.error("--retain-months must be at least 1")
+
+    if args.ensure:
+        logging.info("Partitions in place: %s", ', '.join(ensure_partitions(args.months_ahead)))
+    if args.archive:
+        archived = archive_partitions(args.retain_months, args.archive_dir, dry_run=args.dry_run)
+        if not archived:
+            logging.info("Nothing to archive")
+
+
+if __name__ == '__main__':
+    main()
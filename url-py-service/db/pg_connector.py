@@ -1,63 +1,528 @@
+import csv
+import io
+import ipaddress
 import logging
 from typing import Optional
 import os
-import psycopg2
 from psycopg2 import sql
+from psycopg2.errors import UniqueViolation
+from psycopg2.extras import execute_values
 
+from db.pool import PgPool, install_green_support
+from db.replicas import Replica, ReplicaRouter, parse_endpoints
+from metrics import histogram
 
 
-# LOGGING
-logging.basicConfig(level=logging.DEBUG)
-logging.debug("Debug message")
+# Primary: every write goes here
+DB_HOST=os.getenv('DB_HOST')
+DB_NAME=os.getenv('DB_NAME', "yourdbname")
+DB_USER=os.getenv('DB_USER', "yourusername")
+DB_PASSWORD=os.getenv('DB_PASSWORD', "yourpassword")
+DB_PORT=int(os.getenv('DB_PORT', '5432'))
 
+# Streaming replicas for redirect lookups and listings: "host[:port],host[:port]".
+# Same database and credentials as the primary; empty means all reads use the primary
+DB_REPLICA_HOSTS = parse_endpoints(os.getenv('DB_REPLICA_HOSTS', ''), DB_PORT)
+# Replicas further behind than this (seconds) are skipped until they catch up
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', '5'))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5'))
 
-DB_HOST=os.getenv('DB_HOST')
-DB_NAME="yourdbname"
-DB_USER="yourusername"
-DB_PASSWORD="yourpassword"
-DB_PORT=5432
+# Connection pool sizing
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))
+DB_REPLICA_POOL_MIN = int(os.getenv('DB_REPLICA_POOL_MIN', str(DB_POOL_MIN)))
+DB_REPLICA_POOL_MAX = int(os.getenv('DB_REPLICA_POOL_MAX', str(DB_POOL_MAX)))
+
+
+# Make psycopg2 cooperative when running under gevent/eventlet workers
+install_green_support()
+
+# Primary pool: writes, and reads that must see them
+pg_pool = PgPool(
+    minconn=DB_POOL_MIN,
+    maxconn=DB_POOL_MAX,
+    timeout=DB_POOL_TIMEOUT,
+    health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+    dbname=DB_NAME,
+    user=DB_USER,
+    password=DB_PASSWORD,
+    host=DB_HOST,
+    port=DB_PORT,
+    connect_timeout=5,
+)
+
+# One pool per replica, behind a lag-aware router that falls back to the primary
+read_router = ReplicaRouter(
+    pg_pool,
+    [Replica(f"{host}:{port}", PgPool(
+        minconn=DB_REPLICA_POOL_MIN,
+        maxconn=DB_REPLICA_POOL_MAX,
+        timeout=DB_POOL_TIMEOUT,
+        health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        host=host,
+        port=port,
+        connect_timeout=5,
+    )) for host, port in DB_REPLICA_HOSTS],
+    max_lag=DB_REPLICA_MAX_LAG,
+    check_interval=DB_REPLICA_CHECK_INTERVAL,
+)
 
 
+# Wall time per query function, pool checkout included
+DB_QUERY_SECONDS = histogram('db_query_seconds', help="Postgres query time by query, including pool checkout",
+                             labelnames=('query',))
+
+
+def db_timed(fn):
+    """Record every call of `fn` under db_query_seconds{query=<function name>}"""
+    return DB_QUERY_SECONDS.labels(fn.__name__).timed(fn)
+
 
 # Connect to the Postgres Database
 def get_db_connection():
-    return psycopg2.connect(
-        dbname=DB_NAME,  # yourdbname
-        user=DB_USER,    # yourusername
-        password=DB_PASSWORD,  # yourpassword
-        host=DB_HOST,  # localhost or the correct host
-        port=DB_PORT  # 5432
-    )
+    """
+    Check out a pooled connection to the primary. Use as a context manager:
+
+        with get_db_connection() as conn:
+            ...
+            conn.commit()
+    """
+    return pg_pool.connection()
+
+
+def get_read_connection():
+    """Check out a connection for read-only queries: a healthy replica, or the primary"""
+    return read_router.read_connection()
+
+
+def reset_pools():
+    """Drop every pooled connection (primary and replicas), e.g. after a fork"""
+    pg_pool.reset()
+    read_router.reset()
+
+
+def warm_pools():
+    pg_pool.warm()
+    read_router.warm()
+
+
+@db_timed
+def lookup_url_entry(short_url: str) -> Optional[tuple]:
+    """Return (original_url, clicks) for a short code, or None if it does not exist. Raises on DB errors."""
+    def query(conn):
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT original_url, clicks
+                FROM urls
+                WHERE short_code = %s
+                LIMIT 1
+            """, (short_url,))
+            return cursor.fetchone()
+
+    # A miss on a replica may be a link it has not replayed yet
+    return read_router.run(query, recheck=lambda row: row is None)
+
+
+def lookup_url(short_url: str) -> Optional[str]:
+    """Return the original URL for a short code, or None if it does not exist. Raises on DB errors."""
+    # Clicks are counted by the click counter and flushed in bulk via add_clicks()
+    result = lookup_url_entry(short_url)
+    if result:
+        original_url, clicks = result
+        return original_url
+    return None
+
+
+@db_timed
+def lookup_urls(short_codes: list) -> dict:
+    """Return {short_code: original_url} for the codes that exist, in one query. Raises on DB errors."""
+    if not short_codes:
+        return {}
+
+    def query(conn):
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT short_code, original_url FROM urls WHERE short_code = ANY(%s)",
+                (list(short_codes),)
+            )
+            return dict(cursor.fetchall())
+
+    return read_router.run(query, recheck=lambda found: len(found) < len(set(short_codes)))
+
+
+@db_timed
+def find_short_code_by_hash(hex_digest: str, public: bool) -> Optional[str]:
+    """Oldest non-custom link created in dedup mode for this URL hash and visibility (idx_url_hash)"""
+    with get_read_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT short_code
+                FROM urls
+                WHERE url_hash = %s AND custom_url = FALSE AND display = %s
+                ORDER BY created_at
+                LIMIT 1
+            """, (_bytea(hex_digest), public))
+            row = cursor.fetchone()
+    return row[0] if row else None
 
 
 def get_from_database(short_url: str) -> Optional[str]:
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT original_url, clicks 
-            FROM urls 
-            WHERE short_code = %s
-            LIMIT 1
-        """
-        cursor.execute(query, (short_url,))
-        result = cursor.fetchone()
-        
-        if result:
-            original_url, clicks = result
-            # Update click count
+        return lookup_url(short_url)
+    except Exception as e:
+        logging.error("Database error: %s", e)
+
+    return None
+
+
+URL_COLUMNS = (
+    "id", "original_url", "short_code", "display", "clicks", "custom_url", "created_at",
+    "sec_ch_ua_platform", "sec_ch_ua", "sec_ch_ua_mobile",
+)
+
+
+def _bytea(hex_digest: Optional[str]) -> Optional[str]:
+    # Hex-format bytea literal; valid as a query parameter and as COPY input
+    return '\\x' + hex_digest if hex_digest else None
+
+
+def url_columns(url_data_dicts: list) -> tuple:
+    """URL_COLUMNS, plus url_hash when any row carries one (dedup mode)"""
+    if any(d.get('urlHash') for d in url_data_dicts):
+        return URL_COLUMNS + ("url_hash",)
+    return URL_COLUMNS
+
+
+def url_row(url_data_dict: dict, with_hash: bool = False) -> tuple:
+    """Map a serialized URLData dict onto the `urls` column order"""
+    if with_hash:
+        return url_row(url_data_dict) + (_bytea(url_data_dict.get('urlHash')),)
+    return (
+        url_data_dict['id'],
+        url_data_dict['url'],
+        url_data_dict['shortUrl'],
+        url_data_dict['isPublic'],
+        url_data_dict['clicks'],
+        url_data_dict['customUrl'],
+        url_data_dict['createdAt'],
+        url_data_dict['secChUaPlatform'],
+        url_data_dict['secChUa'],
+        url_data_dict['secChUaMobile']
+    )
+
+
+def insert_url(url_data_dict: dict):
+    """Insert a single shortened URL row"""
+    insert_urls([url_data_dict])
+
+
+@db_timed
+class ShortCodeConflict(Exception):
+    """A new row's short_code already belongs to a different row"""
+
+
+def insert_urls(url_data_dicts: list) -> int:
+    """
+    Insert shortened URL rows with one multi-row INSERT.
+    Rows whose id already exists are skipped, so replaying a batch is safe; a
+    short_code taken by another row raises ShortCodeConflict (nothing is inserted).
+    Returns the number of rows inserted.
+    """
+    if not url_data_dicts:
+        return 0
+
+    columns = url_columns(url_data_dicts)
+    with_hash = "url_hash" in columns
+    insert_query = sql.SQL("""
+        INSERT INTO urls ({columns})
+        VALUES %s
+        ON CONFLICT (id) DO NOTHING
+    """).format(columns=sql.SQL(', ').join(map(sql.Identifier, columns)))
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            try:
+                execute_values(
+                    cursor,
+                    insert_query.as_string(conn),
+                    [url_row(d, with_hash) for d in url_data_dicts],
+                    page_size=len(url_data_dicts),
+                )
+            except UniqueViolation as e:
+                conn.rollback()
+                raise ShortCodeConflict(str(e)) from e
+            inserted = cursor.rowcount
+        conn.commit()
+    return inserted
+
+
+@db_timed
+def copy_urls(url_data_dicts: list) -> int:
+    """
+    Bulk-load shortened URL rows for large batches.
+    Rows are COPYed into a per-connection staging table and moved into urls with
+    one INSERT ... SELECT; rows whose id already exists are skipped, and a
+    short_code taken by another row raises ShortCodeConflict as in insert_urls.
+    Returns the number of rows inserted.
+    """
+    if not url_data_dicts:
+        return 0
+
+    column_names = url_columns(url_data_dicts)
+    with_hash = "url_hash" in column_names
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for url_data_dict in url_data_dicts:
+        writer.writerow(url_row(url_data_dict, with_hash))
+    buffer.seek(0)
+
+    columns = sql.SQL(', ').join(map(sql.Identifier, column_names))
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS urls_stage
+                (LIKE urls INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+            """)
+            cursor.copy_expert(
+                sql.SQL("COPY urls_stage ({columns}) FROM STDIN WITH (FORMAT csv)")
+                .format(columns=columns).as_string(conn),
+                buffer,
+            )
+            try:
+                cursor.execute(
+                    sql.SQL("""
+                        INSERT INTO urls ({columns})
+                        SELECT {columns} FROM urls_stage
+                        ON CONFLICT (id) DO NOTHING
+                    """).format(columns=columns)
+                )
+            except UniqueViolation as e:
+                conn.rollback()
+                raise ShortCodeConflict(str(e)) from e
+            inserted = cursor.rowcount
+        conn.commit()
+    return inserted
+
+
+@db_timed
+def add_clicks(deltas: dict, flush_token: Optional[str] = None) -> int:
+    """
+    Apply aggregated click deltas ({short_code: clicks}) with one bulk UPDATE.
+    Returns the number of rows updated.
+
+    With a `flush_token` the batch is applied at most once: the token is
+    recorded in click_flushes in the same transaction, and a batch whose token
+    is already there is skipped (returns 0).
+    """
+    if not deltas:
+        return 0
+
+    update_query = """
+        UPDATE urls AS u
+        SET clicks = u.clicks + v.delta
+        FROM (VALUES %s) AS v(short_code, delta)
+        WHERE u.short_code = v.short_code
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            if flush_token is not None:
+                cursor.execute(
+                    "INSERT INTO click_flushes (token) VALUES (%s) ON CONFLICT (token) DO NOTHING",
+                    (flush_token,),
+                )
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    return 0
+                # Tokens are only needed until the batch's Redis key is gone
+                cursor.execute("DELETE FROM click_flushes WHERE applied_at < now() - interval '1 day'")
+            # Sorted so concurrent flushers lock rows in the same order
+            execute_values(
+                cursor,
+                update_query,
+                sorted(deltas.items()),
+                template="(%s, %s::integer)",
+                page_size=len(deltas),
+            )
+            updated = cursor.rowcount
+        conn.commit()
+    return updated
+
+
+CLICK_EVENT_FIELDS = (
+    "short_code", "user_agent", "ip_address", "referrer", "device_info",
+    "sec_ch_ua_platform", "sec_ch_ua", "sec_ch_ua_mobile", "timestamp",
+)
+
+
+def _valid_ip(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        return None
+
+
+@db_timed
+def copy_click_events(events: list) -> int:
+    """
+    Bulk-load redirect events into url_clicks.
+    Events are COPYed into a per-connection staging table and joined to urls to
+    resolve short_code -> url_id; events for unknown codes are skipped.
+    Returns the number of rows inserted.
+    """
+    if not events:
+        return 0
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for event in events:
+        row = [event.get(field) for field in CLICK_EVENT_FIELDS]
+        row[2] = _valid_ip(row[2])
+        row[8] = row[8] or None
+        writer.writerow(row)
+    buffer.seek(0)
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS click_events_stage (
+                    short_code TEXT,
+                    user_agent TEXT,
+                    ip_address INET,
+                    referrer TEXT,
+                    device_info TEXT,
+                    sec_ch_ua_platform TEXT,
+                    sec_ch_ua TEXT,
+                    sec_ch_ua_mobile TEXT,
+                    timestamp TIMESTAMP
+                ) ON COMMIT DELETE ROWS
+            """)
+            cursor.copy_expert("COPY click_events_stage FROM STDIN WITH (FORMAT csv)", buffer)
+            # url_clicks is partitioned by month: make sure every month in the batch has one
+            cursor.execute("""
+                SELECT url_clicks_ensure_partition(month)
+                FROM (
+                    SELECT DISTINCT date_trunc('month', COALESCE(timestamp, CURRENT_TIMESTAMP))::date AS month
+                    FROM click_events_stage
+                ) months
+            """)
+            cursor.execute("""
+                INSERT INTO url_clicks (url_id, user_agent, ip_address, referrer, device_info,
+                    sec_ch_ua_platform, sec_ch_ua, sec_ch_ua_mobile, timestamp)
+                SELECT u.id, s.user_agent, s.ip_address, s.referrer, s.device_info,
+                    s.sec_ch_ua_platform, s.sec_ch_ua, s.sec_ch_ua_mobile,
+                    COALESCE(s.timestamp, CURRENT_TIMESTAMP)
+                FROM click_events_stage s
+                JOIN urls u ON u.short_code = s.short_code
+            """)
+            inserted = cursor.rowcount
+        conn.commit()
+    return inserted
+
+
+@db_timed
+def existing_short_codes(short_codes: list) -> set:
+    """Return the subset of `short_codes` already present in urls"""
+    if not short_codes:
+        return set()
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
             cursor.execute(
-                "UPDATE urls SET clicks = clicks + 1 WHERE short_code = %s",
-                (short_url,)
+                "SELECT short_code FROM urls WHERE short_code = ANY(%s)",
+                (list(short_codes),)
             )
-            conn.commit()
-            return original_url
-            
-    except Exception as e:
-        logging.error(f"Database error: {str(e)}")
-    finally:
-        cursor.close()
-        conn.close()
-    
-    return None
\ No newline at end of file
+            return {row[0] for row in cursor.fetchall()}
+
+
+# Columns the URL listing may return (never the sec_ch_ua* client hints)
+LISTING_COLUMNS = ("id", "original_url", "short_code", "display", "clicks", "custom_url", "created_at")
+
+
+@db_timed
+def fetch_urls_page(columns: tuple, limit: int = 50, after: Optional[tuple] = None,
+                    public_only: bool = False, custom_only: bool = False) -> list:
+    """
+    Keyset-paginated listing, newest first, ordered by (created_at, id).
+    `after` is the (created_at, id) of the last row of the previous page.
+    Returns dicts holding the requested `columns` plus created_at and id.
+    """
+    selected = list(dict.fromkeys(tuple(columns) + ("created_at", "id")))
+    if not set(selected) <= set(LISTING_COLUMNS):
+        raise ValueError(f"Unknown listing columns: {set(selected) - set(LISTING_COLUMNS)}")
+
+    conditions = []
+    params = []
+    if after is not None:
+        conditions.append(sql.SQL("(created_at, id) < (%s, %s)"))
+        params.extend(after)
+    if public_only:
+        conditions.append(sql.SQL("display = TRUE"))
+    if custom_only:
+        conditions.append(sql.SQL("custom_url = TRUE"))
+    params.append(limit)
+
+    fetch_query = sql.SQL("""
+        SELECT {columns}
+        FROM urls
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """).format(
+        columns=sql.SQL(', ').join(map(sql.Identifier, selected)),
+        where=sql.SQL("WHERE ") + sql.SQL(" AND ").join(conditions) if conditions else sql.SQL(""),
+    )
+
+    with get_read_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(fetch_query, params)
+            return [dict(zip(selected, row)) for row in cursor.fetchall()]
+
+
+@db_timed
+def fetch_top_urls(limit: int) -> list:
+    """The `limit` most-clicked links as (short_code, original_url, clicks)"""
+    with get_read_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT short_code, original_url, clicks FROM urls ORDER BY clicks DESC LIMIT %s",
+                (limit,)
+            )
+            return cursor.fetchall()
+
+
+def url_stats_rollup(top_k: int = 100) -> tuple:
+    """
+    Full-table aggregates used to seed the dashboard stats:
+    ({'urls': n, 'clicks': n}, {platform: (urls, clicks)}, [(short_code, clicks), ...])
+    """
+    with get_read_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*), COALESCE(SUM(clicks), 0) FROM urls")
+            urls, clicks = cursor.fetchone()
+            cursor.execute("""
+                SELECT sec_ch_ua_platform, COUNT(*), COALESCE(SUM(clicks), 0)
+                FROM urls
+                GROUP BY sec_ch_ua_platform
+            """)
+            platforms = {platform: (platform_urls, int(platform_clicks))
+                         for platform, platform_urls, platform_clicks in cursor.fetchall()}
+            cursor.execute(
+                "SELECT short_code, clicks FROM urls WHERE clicks > 0 ORDER BY clicks DESC LIMIT %s",
+                (top_k,)
+            )
+            top = cursor.fetchall()
+    return {'urls': urls, 'clicks': int(clicks)}, platforms, top
+
+
+def pool_stats() -> dict:
+    return pg_pool.stats()
+
+
+def replica_stats() -> dict:
+    return read_router.stats()
@@ -0,0 +1,347 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the wait timeout"""
+
+
+# Failures of the database connection rather than of the statement: worth retrying as-is
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout)
+
+
+def write_isolating(batch: list, write: Callable[[list], Any], dead_letter: Callable[[Any, Exception], None],
+                    max_attempts: int = 3,
+                    on_error: Optional[Callable[[list, Exception, int], None]] = None,
+                    on_written: Optional[Callable[[list, Any], None]] = None):
+    """
+    write(batch), narrowing a failure that persists down to the rows causing it.
+
+    Every failure first goes to on_error(part, error, failures), which may
+    sleep before the retry or raise to give up; without on_error a
+    TRANSIENT_ERRORS failure is re-raised. A connection failure is then retried
+    as-is. Any other failure is retried until `max_attempts`, after which the
+    part is written in halves the same way, so a row that still fails on its
+    own goes to dead_letter(row, error) instead of holding back the rest.
+    on_written(part, result) follows every write that succeeds.
+    """
+    failures = 0
+    attempts = 0
+    while True:
+        try:
+            result = write(batch)
+            break
+        except Exception as e:
+            failures += 1
+            if on_error is not None:
+                on_error(batch, e, failures)
+            elif isinstance(e, TRANSIENT_ERRORS):
+                raise
+            if isinstance(e, TRANSIENT_ERRORS):
+                continue
+            attempts += 1
+            if attempts < max_attempts:
+                continue
+            if len(batch) == 1:
+                dead_letter(batch[0], e)
+                return
+            logging.warning("Batch of %d rows keeps failing, writing it in halves: %s", len(batch), e)
+            middle = len(batch) // 2
+            write_isolating(batch[:middle], write, dead_letter, max_attempts, on_error, on_written)
+            write_isolating(batch[middle:], write, dead_letter, max_attempts, on_error, on_written)
+            return
+    if on_written is not None:
+        on_written(batch, result)
+
+
+def _green_wait_callback():
+    """Return a psycopg2 wait callback for the active green framework, if any"""
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('socket'):
+            from gevent.socket import wait_read, wait_write
+            return _make_wait_callback(wait_read, wait_write)
+    except ImportError:
+        pass
+
+    try:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('socket'):
+            from eventlet.hubs import trampoline
+
+            def wait_read(fd):
+                trampoline(fd, read=True)
+
+            def wait_write(fd):
+                trampoline(fd, write=True)
+
+            return _make_wait_callback(wait_read, wait_write)
+    except ImportError:
+        pass
+
+    return None
+
+
+def _make_wait_callback(wait_read, wait_write):
+    def wait_callback(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                break
+            elif state == extensions.POLL_READ:
+                wait_read(conn.fileno())
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno())
+            else:
+                raise psycopg2.OperationalError(f"Bad result from poll: {state}")
+
+    return wait_callback
+
+
+def install_green_support() -> bool:
+    """
+    Make psycopg2 yield to the gevent/eventlet hub instead of blocking it.
+    Returns True when a wait callback was installed.
+    """
+    callback = _green_wait_callback()
+    if callback is None:
+        return False
+    extensions.set_wait_callback(callback)
+    logging.info("Installed green wait callback for psycopg2")
+    return True
+
+
+class PgPool:
+    """
+    Bounded PostgreSQL connection pool.
+
+    Connections are created lazily up to `maxconn`; when all of them are in use
+    callers wait (cooperatively under gevent/eventlet, since the pool only uses
+    `threading` primitives that get monkey-patched) for up to `timeout` seconds.
+    Idle connections are health-checked on checkout before being handed out.
+    """
+
+    def __init__(self, minconn: int = 1, maxconn: int = 10, timeout: float = 5.0,
+                 health_check_interval: float = 30.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: need 0 <= minconn <= maxconn and maxconn >= 1")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []  # list of (conn, last_used) - used as a LIFO stack
+        self._in_use = 0
+        self._pid = os.getpid()
+        self._closed = False
+
+        # Pool-wait metrics
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+        self.health_check_failures = 0
+        self.connections_created = 0
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.connect_kwargs)
+        self.connections_created += 1
+        return conn
+
+    def _size(self) -> int:
+        return len(self._idle) + self._in_use
+
+    def _check_fork(self):
+        """Drop connections inherited from a parent process (sockets must not be shared)"""
+        if self._pid != os.getpid():
+            self._idle = []
+            self._in_use = 0
+            self._pid = os.getpid()
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logging.warning("Discarding unhealthy pooled connection: %s", e)
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def warm(self):
+        """Open connections until the pool holds at least `minconn` of them"""
+        while True:
+            with self._cond:
+                self._check_fork()
+                if self._closed or self._size() >= self.minconn:
+                    return
+                self._in_use += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                raise
+            with self._cond:
+                self._in_use -= 1
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Check out a healthy connection, waiting up to `timeout` seconds if the pool is exhausted"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        waited = False
+
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    self._check_fork()
+
+                    # Either an idle connection or a free slot is reserved as in-use
+                    # before any I/O happens outside the lock.
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._size() < self.maxconn:
+                        conn, last_used = None, None
+                        self._in_use += 1
+                        break
+
+                    remaining = timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"Timed out after {timeout}s waiting for a database connection")
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if conn is not None:
+                if self._is_healthy(conn, last_used):
+                    break
+                self._discard(conn)
+                with self._cond:
+                    self.health_check_failures += 1
+                    self._in_use -= 1
+                continue
+
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+            break
+
+        with self._cond:
+            self._record_checkout(started, waited)
+        return conn
+
+    def _record_checkout(self, started: float, waited: bool):
+        self.checkouts += 1
+        if waited:
+            elapsed = time.monotonic() - started
+            self.waits += 1
+            self.wait_time_total += elapsed
+            self.wait_time_max = max(self.wait_time_max, elapsed)
+
+    def putconn(self, conn, discard: bool = False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        with self._cond:
+            if self._pid != os.getpid():
+                # Connection belongs to a parent process; never touch its socket
+                return
+            self._in_use = max(self._in_use - 1, 0)
+
+            if not discard and not conn.closed and not self._closed:
+                try:
+                    if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                    self._idle.append((conn, time.monotonic()))
+                    conn = None
+                except Exception as e:
+                    logging.warning("Failed to reset pooled connection: %s", e)
+
+            if conn is not None:
+                self._discard(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Context manager yielding a pooled connection.
+        Any transaction left open is rolled back when the block exits, so callers must commit explicitly.
+        """
+        conn = self.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def reset(self):
+        """Forget all connections without closing them (for use right after fork)"""
+        with self._cond:
+            self._idle = []
+            self._in_use = 0
+            self._pid = os.getpid()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size(),
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_time_total": round(self.wait_time_total, 6),
+                "wait_time_max": round(self.wait_time_max, 6),
+                "timeouts": self.timeouts,
+                "health_check_failures": self.health_check_failures,
+                "connections_created": self.connections_created,
+            }
@@ -0,0 +1,173 @@
+import itertools
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Callable, List, Optional
+
+import psycopg2
+
+from db.pool import PgPool, PoolTimeout
+from periodic import PeriodicTask
+
+# Replay lag in seconds; 0 on a primary, and on a replica that is streaming and
+# has applied everything it received (an idle primary otherwise looks like a
+# growing lag). NULL when the replica is not streaming from the primary, since
+# "applied everything received" then says nothing about how far behind it is.
+# Reading pg_stat_wal_receiver.status needs pg_read_all_stats (or pg_monitor).
+_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def parse_endpoints(value: str, default_port: int) -> List[tuple]:
+    """'db-r1,db-r2:5433' -> [('db-r1', default_port), ('db-r2', 5433)]"""
+    endpoints = []
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        host, _, port = item.partition(':')
+        endpoints.append((host, int(port) if port else default_port))
+    return endpoints
+
+
+class Replica:
+    def __init__(self, name: str, pool: PgPool):
+        self.name = name
+        self.pool = pool
+        self.healthy = True
+        self.lag = 0.0
+        self.reads = 0
+        self.failures = 0
+
+
+class ReplicaRouter:
+    """
+    Routes read-only queries to streaming replicas, with the primary as fallback.
+
+    A background check measures each replica's replay lag every
+    `check_interval` seconds; replicas that are unreachable or more than
+    `max_lag` seconds behind are skipped until a later check passes. Healthy
+    replicas are used round-robin. When none is usable, or a checkout fails,
+    reads go to the primary. Writes never go through the router.
+
+    Point lookups that find nothing on a replica can be re-run on the primary
+    (`run(..., recheck=...)`), so links created within the lag window resolve.
+    """
+
+    def __init__(self, primary: PgPool, replicas: List[Replica], max_lag: float = 5.0,
+                 check_interval: float = 5.0):
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self._cycle = itertools.cycle(replicas) if replicas else None
+        self._cycle_lock = threading.Lock()
+        self._task = PeriodicTask("replica-health-check", check_interval, self.check, run_on_stop=False)
+
+        self.primary_reads = 0
+        self.primary_rechecks = 0
+
+    def check(self):
+        for replica in self.replicas:
+            try:
+                with replica.pool.connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute(_LAG_QUERY)
+                        lag = cursor.fetchone()[0]
+                if lag is None:
+                    logging.warning("Replica %s is not streaming from the primary", replica.name)
+                    healthy = False
+                else:
+                    replica.lag = float(lag)
+                    healthy = replica.lag <= self.max_lag
+            except Exception as e:
+                logging.warning("Replica %s health check failed: %s", replica.name, e)
+                healthy = False
+            if healthy != replica.healthy:
+                logging.warning("Replica %s is now %s (lag %.1fs)",
+                                replica.name, 'healthy' if healthy else 'unhealthy', replica.lag)
+            replica.healthy = healthy
+
+    def _next_replica(self) -> Optional[Replica]:
+        if self._cycle is None:
+            return None
+        with self._cycle_lock:
+            for _ in range(len(self.replicas)):
+                replica = next(self._cycle)
+                if replica.healthy:
+                    return replica
+        return None
+
+    @contextmanager
+    def _checkout(self):
+        """Yield (connection, replica); replica is None when the read went to the primary"""
+        replica = None
+        if self.replicas:
+            self._task.ensure_started()
+            replica = self._next_replica()
+
+        if replica is not None:
+            with ExitStack() as stack:
+                try:
+                    conn = stack.enter_context(replica.pool.connection())
+                except (PoolTimeout, psycopg2.OperationalError) as e:
+                    # Out of rotation until the next health check says otherwise
+                    logging.warning("Replica %s unavailable, reading from the primary: %s", replica.name, e)
+                    replica.healthy = False
+                    replica.failures += 1
+                else:
+                    replica.reads += 1
+                    yield conn, replica
+                    return
+
+        self.primary_reads += 1
+        with self.primary.connection() as conn:
+            yield conn, None
+
+    @contextmanager
+    def read_connection(self):
+        """Connection for a read-only query: a healthy replica if there is one, else the primary"""
+        with self._checkout() as (conn, _replica):
+            yield conn
+
+    def run(self, fn: Callable, recheck: Optional[Callable] = None):
+        """
+        fn(conn) on a read connection. When it ran on a replica and
+        recheck(result) is true (e.g. a row that may not have replicated yet),
+        run it again on the primary and return that result instead.
+        """
+        with self._checkout() as (conn, replica):
+            result = fn(conn)
+        if replica is None or recheck is None or not recheck(result):
+            return result
+        self.primary_rechecks += 1
+        with self.primary.connection() as conn:
+            return fn(conn)
+
+    def reset(self):
+        for replica in self.replicas:
+            replica.pool.reset()
+
+    def warm(self):
+        for replica in self.replicas:
+            try:
+                replica.pool.warm()
+            except Exception as e:
+                logging.error("Failed to warm replica pool %s: %s", replica.name, e)
+
+    def stats(self) -> dict:
+        return {
+            "primary_reads": self.primary_reads,
+            "primary_rechecks": self.primary_rechecks,
+            "max_lag": self.max_lag,
+            "replicas": [{
+                "name": replica.name,
+                "healthy": replica.healthy,
+                "lag": round(replica.lag, 3),
+                "reads": replica.reads,
+                "failures": replica.failures,
+                "pool": replica.pool.stats(),
+            } for replica in self.replicas],
+        }
@@ -0,0 +1,380 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from typing import Callable
+
+from redis.exceptions import ResponseError
+
+from db.pool import TRANSIENT_ERRORS, write_isolating
+
+
+class _Abandoned(Exception):
+    """Shutdown began while a batch was still failing"""
+
+
+class MemoryWriteBehind:
+    """
+    Bounded in-process write-behind queue for new `urls` rows.
+
+    `submit` never blocks longer than `enqueue_timeout`; when the queue is full it
+    returns False so the caller can apply backpressure (e.g. insert inline).
+    A background thread flushes batches of up to `batch_size` records, at least
+    every `flush_interval` seconds. Records still queued when the process dies
+    are lost - use RedisStreamWriteBehind when that matters.
+
+    Connection failures are retried until the database is back. A batch that
+    fails `max_attempts` times for any other reason is flushed in halves, so a
+    bad row is narrowed down to itself and dead-lettered: logged at ERROR with
+    its full contents (the only copy left) instead of blocking the queue.
+    """
+
+    def __init__(self, flush_fn: Callable[[list], int], batch_size: int = 500,
+                 flush_interval: float = 0.5, max_queue: int = 10000,
+                 enqueue_timeout: float = 0.05, max_attempts: int = 3):
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.flush_errors = 0
+        self.dead_lettered = 0
+
+    def _ensure_started(self):
+        # Started lazily (and restarted after fork) so no thread is inherited from a parent process
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="url-write-behind", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def submit(self, record: dict) -> bool:
+        """Queue a serialized URLData dict. Returns False if the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put(record, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush_with_retry(self, batch: list):
+        settled = 0
+
+        def on_error(part: list, error: Exception, failures: int):
+            self.flush_errors += 1
+            logging.error("Write-behind flush of %d rows failed: %s", len(part), error)
+            if self._stop.is_set():
+                raise _Abandoned()
+            # Holding the batch while retrying fills the queue, which pushes back on submitters
+            time.sleep(min(0.1 * 2 ** min(failures - 1, 6), 5.0))
+
+        def on_written(part: list, _result):
+            nonlocal settled
+            settled += len(part)
+            self.flushed += len(part)
+
+        def dead_letter(row: dict, error: Exception):
+            nonlocal settled
+            settled += 1
+            self.dead_lettered += 1
+            logging.error("Write-behind row dead-lettered after %d attempts (%s): %s",
+                          self.max_attempts, error, json.dumps(row, default=str))
+
+        try:
+            write_isolating(batch, self.flush_fn, dead_letter, self.max_attempts, on_error, on_written)
+        except _Abandoned:
+            logging.error("Dropping %d unflushed rows on shutdown", len(batch) - settled)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._flush_with_retry(batch)
+
+    def flush(self):
+        """Synchronously flush everything currently queued"""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._flush_with_retry(batch)
+
+    def stop(self, timeout: float = 5.0):
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self.flush()
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": "memory",
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+# Append to the stream only while it holds fewer than ARGV[1] entries
+_BOUNDED_XADD = """
+if redis.call('XLEN', KEYS[1]) >= tonumber(ARGV[1]) then
+    return false
+end
+return redis.call('XADD', KEYS[1], '*', 'data', ARGV[2])
+"""
+
+
+class RedisStreamWriteBehind:
+    """
+    Durable write-behind backed by a Redis stream and consumer group.
+
+    A record is acknowledged to the client once it is in the stream, so a worker
+    restart loses nothing: entries read but not yet committed stay pending in the
+    group and are reclaimed by any worker after `claim_idle` seconds. The stream
+    should live on a persistent Redis (the pre-gen instance), not on an evicting cache.
+
+    Connection failures leave the entries pending for reclaim. A batch that
+    fails `max_attempts` times for any other reason is flushed in halves; an
+    entry that fails on its own is moved to `<stream_key>:dead` (fields `data`,
+    `error`) and acknowledged, so it no longer comes back on every reclaim.
+    """
+
+    def __init__(self, redis_client, flush_fn: Callable[[list], int],
+                 stream_key: str = 'urls:write-behind', group: str = 'url-writers',
+                 batch_size: int = 500, flush_interval: float = 0.5,
+                 max_queue: int = 100000, claim_idle: float = 30.0, max_attempts: int = 3):
+        self.redis = redis_client
+        self.flush_fn = flush_fn
+        self.stream_key = stream_key
+        self.dead_letter_key = f"{stream_key}:dead"
+        self.max_attempts = max_attempts
+        self.group = group
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.claim_idle = claim_idle
+        self._bounded_xadd = redis_client.register_script(_BOUNDED_XADD)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._consumer = None
+
+        self.submitted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.flush_errors = 0
+        self.dead_lettered = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._consumer = f"{socket.gethostname()}-{self._pid}"
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="url-write-behind", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def submit(self, record: dict) -> bool:
+        """Append a serialized URLData dict to the stream. Returns False if the stream is full."""
+        self._ensure_started()
+        entry_id = self._bounded_xadd(keys=[self.stream_key], args=[self.max_queue, json.dumps(record)])
+        if not entry_id:
+            self.rejected += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def _ensure_group(self):
+        try:
+            self.redis.xgroup_create(self.stream_key, self.group, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def _reclaim(self) -> list:
+        """Take over entries left pending by workers that died mid-flush"""
+        result = self.redis.xautoclaim(
+            self.stream_key, self.group, self._consumer,
+            min_idle_time=int(self.claim_idle * 1000), start_id='0-0', count=self.batch_size,
+        )
+        return result[1] if result else []
+
+    def _read(self) -> list:
+        response = self.redis.xreadgroup(
+            self.group, self._consumer, {self.stream_key: '>'},
+            count=self.batch_size, block=int(self.flush_interval * 1000),
+        )
+        if not response:
+            return []
+        return response[0][1]
+
+    def _ack(self, entries: list, dead: list = ()):
+        """Acknowledge and delete entries, first copying `dead` (entry, error) pairs to the dead-letter stream"""
+        ids = [entry_id for entry_id, _ in entries]
+        if not ids:
+            return
+        pipe = self.redis.pipeline(transaction=True)
+        for (_, fields), error in dead:
+            pipe.xadd(self.dead_letter_key, {'data': fields['data'], 'error': str(error)})
+        pipe.xack(self.stream_key, self.group, *ids)
+        pipe.xdel(self.stream_key, *ids)
+        pipe.execute()
+
+    def _commit(self, entries: list):
+        """Flush entries and acknowledge them; isolates and dead-letters rows that cannot be written"""
+        # Entries deleted from the stream while pending come back without fields
+        missing = [entry for entry in entries if not entry[1]]
+        entries = [entry for entry in entries if entry[1]]
+        written, dead = [], []
+
+        def on_error(part: list, error: Exception, failures: int):
+            if isinstance(error, TRANSIENT_ERRORS):
+                # Left pending; reclaimed once the database is back
+                raise error
+            self.flush_errors += 1
+            logging.error("Write-behind flush of %d entries failed: %s", len(part), error)
+
+        if entries:
+            write_isolating(
+                entries,
+                lambda part: self.flush_fn([json.loads(fields['data']) for _, fields in part]),
+                lambda entry, error: dead.append((entry, error)),
+                self.max_attempts, on_error,
+                lambda part, _result: written.extend(part),
+            )
+        self._ack(missing + written + [entry for entry, _ in dead], dead=dead)
+        self.flushed += len(written)
+        self.dead_lettered += len(dead)
+        for (entry_id, _), error in dead:
+            logging.error("Write-behind entry %s moved to %s: %s", entry_id, self.dead_letter_key, error)
+
+    def _run(self):
+        delay = 0.1
+        last_reclaim = 0.0
+        while not self._stop.is_set():
+            try:
+                self._ensure_group()
+                break
+            except Exception as e:
+                logging.error("Failed to create write-behind consumer group: %s", e)
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+        while not self._stop.is_set():
+            try:
+                entries = []
+                if time.monotonic() - last_reclaim >= self.claim_idle:
+                    entries = self._reclaim()
+                    last_reclaim = time.monotonic()
+                if not entries:
+                    entries = self._read()
+                if entries:
+                    self._commit(entries)
+                delay = 0.1
+            except Exception as e:
+                # Entries stay pending in the group and are retried via reclaim
+                self.flush_errors += 1
+                logging.error("Write-behind stream flush failed: %s", e)
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    def flush(self):
+        """Flush whatever this worker can read right now"""
+        while True:
+            response = self.redis.xreadgroup(
+                self.group, self._consumer, {self.stream_key: '>'}, count=self.batch_size,
+            )
+            if not response or not response[0][1]:
+                return
+            self._commit(response[0][1])
+
+    def stop(self, timeout: float = 5.0):
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error("Final write-behind flush failed, entries remain in the stream: %s", e)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "mode": "redis",
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+def create_write_behind(mode: str, flush_fn: Callable[[list], int], redis_client=None,
+                        batch_size: int = 500, flush_interval: float = 0.5,
+                        max_queue: int = 10000, enqueue_timeout: float = 0.05):
+    """Build the write-behind stage for WRITE_BEHIND_MODE ('off', 'memory' or 'redis')"""
+    mode = (mode or 'off').lower()
+    if mode == 'memory':
+        return MemoryWriteBehind(flush_fn, batch_size=batch_size, flush_interval=flush_interval,
+                                 max_queue=max_queue, enqueue_timeout=enqueue_timeout)
+    if mode == 'redis':
+        if redis_client is None:
+            logging.error("WRITE_BEHIND_MODE=redis needs a Redis client; writing inline instead")
+            return None
+        return RedisStreamWriteBehind(redis_client, flush_fn, batch_size=batch_size,
+                                      flush_interval=flush_interval, max_queue=max_queue)
+    return None
@@ -0,0 +1,130 @@
+"""
+Shorten-time deduplication of identical long URLs (non-custom links only).
+
+Each URL is normalized (scheme and host lowercased, default port dropped,
+empty path -> '/') and hashed to 128 bits of SHA-256. A short code is found by
+that hash in O(1):
+
+    dedup:<hash>:<visibility>   cache Redis string -> short code, expiring after `ttl`
+    urls.url_hash               BYTEA, partial index idx_url_hash (rows created in dedup mode)
+
+Links are only shared between requests asking for the same visibility
+(isPublic), so a private link is never handed out as a public one or the other
+way round: the Redis key carries the visibility and the Postgres lookup filters
+on `display`.
+
+Redis answers repeats within the TTL, including rows still in the write-behind
+queue; older links are found through the index. A new link reserves its hash
+with SET NX before its mapping is cached, so of two concurrent requests for the
+same URL only one consumes a code and the other returns the winner's code.
+"""
+import hashlib
+import logging
+from typing import Callable, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Delete a reservation only if it still points at the caller's code
+_RELEASE_RESERVATION = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form used for hashing; the stored URL is left as submitted"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    if parts.username or parts.password:
+        netloc = parts.netloc.rsplit('@', 1)[0] + '@' + netloc
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is not None and port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, parts.fragment))
+
+
+def url_hash(url: str) -> str:
+    """Hex digest (128 bits) of the normalized URL"""
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()[:32]
+
+
+class URLDeduplicator:
+    def __init__(self, redis_client, lookup_fn: Callable[[str, bool], Optional[str]],
+                 prefix: str = 'dedup', ttl: int = 86400):
+        self.redis = redis_client
+        self.lookup_fn = lookup_fn  # (url hash, public) -> existing short code in Postgres, or None
+        self.prefix = prefix
+        self.ttl = ttl
+        self._release_script = redis_client.register_script(_RELEASE_RESERVATION)
+
+        self.redis_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.races = 0
+        self.unreserved = 0
+
+    def _key(self, digest: str, public: bool) -> str:
+        return f"{self.prefix}:{digest}:{'public' if public else 'private'}"
+
+    def find(self, digest: str, public: bool) -> Optional[str]:
+        """Short code already issued for this hash and visibility, or None"""
+        key = self._key(digest, public)
+        short_code = self.redis.get(key)
+        if short_code:
+            self.redis_hits += 1
+            return short_code
+
+        try:
+            short_code = self.lookup_fn(digest, public)
+        except Exception as e:
+            # Dedup is best effort: a failed lookup only costs a new code
+            logging.error("Dedup lookup failed: %s", e)
+            short_code = None
+        if short_code:
+            self.db_hits += 1
+            self.redis.set(key, short_code, ex=self.ttl)
+            return short_code
+
+        self.misses += 1
+        return None
+
+    def reserve(self, digest: str, public: bool, short_code: str) -> Tuple[bool, Optional[str]]:
+        """
+        Claim `digest` for `short_code`:
+
+            (True, None)     the reservation is ours
+            (False, winner)  a concurrent request reserved it first; use `winner`
+            (False, None)    no reservation could be made either way; create the
+                             link without one (nothing to release)
+        """
+        key = self._key(digest, public)
+        for _ in range(2):
+            if self.redis.set(key, short_code, nx=True, ex=self.ttl):
+                return True, None
+            winner = self.redis.get(key)
+            if winner:
+                self.races += 1
+                return False, winner
+            # Expired between SET NX and GET: try again
+        self.unreserved += 1
+        return False, None
+
+    def release(self, digest: str, public: bool, short_code: str):
+        """Undo a reservation whose link was never created"""
+        self._release_script(keys=[self._key(digest, public)], args=[short_code])
+
+    def stats(self) -> dict:
+        return {
+            "redis_hits": self.redis_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "races": self.races,
+            "unreserved": self.unreserved,
+        }
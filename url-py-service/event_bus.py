@@ -0,0 +1,301 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from periodic import PeriodicTask
+
+
+def _stream_id(entry_id: str) -> tuple:
+    millis, _, seq = entry_id.partition('-')
+    return int(millis), int(seq or 0)
+
+
+class Event:
+    __slots__ = ('id', 'type', 'data')
+
+    def __init__(self, event_id: str, event_type: str, data: str):
+        self.id = event_id
+        self.type = event_type
+        self.data = data  # JSON text, encoded once and shared by every client
+
+    def to_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {self.data}\n\n"
+
+
+class Subscription:
+    """One connected client: a bounded queue of events of the types it asked for"""
+
+    def __init__(self, types: Optional[frozenset], max_queue: int):
+        self.types = types
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def wants(self, event: Event) -> bool:
+        return self.types is None or event.type in self.types
+
+
+class EventBus:
+    """
+    Fan-out of dashboard events (new URLs, clicks, interval stats) to SSE clients.
+
+    Publishing is coalesced per worker: events are buffered locally and written
+    every `coalesce_interval` seconds as one pipelined batch of XADDs to a capped
+    Redis stream, with all clicks of the interval folded into a single
+    `click_update` event. Each worker runs one XREAD subscriber thread and copies
+    every event into the bounded queue of each local client, so a new event
+    costs one Redis read per worker no matter how many viewers are connected.
+
+    A client whose queue fills up is disconnected rather than slowing the
+    others; EventSource reconnects with Last-Event-ID and the missed events are
+    replayed from the stream (XRANGE). When they cannot all be replayed (the
+    stream was trimmed past Last-Event-ID, or more than `client_queue_size`
+    events followed it) the client gets a `reset` event instead, telling it to
+    reload its state, and continues with live events from there.
+
+    A batch whose XADDs fail stays buffered for the next flush (up to `maxlen`
+    events, oldest dropped first).
+    """
+
+    def __init__(self, redis_client, stream_key: str = 'events:dashboard', maxlen: int = 10000,
+                 coalesce_interval: float = 1.0, client_queue_size: int = 256,
+                 max_click_codes: int = 100, heartbeat_interval: float = 15.0):
+        self.redis = redis_client
+        self.stream_key = stream_key
+        self.maxlen = maxlen
+        self.client_queue_size = client_queue_size
+        self.max_click_codes = max_click_codes
+        self.heartbeat_interval = heartbeat_interval
+
+        self._pending = []
+        self._clicks = Counter()
+        self._created = 0
+        self._buffer_lock = threading.Lock()
+        self._flusher = PeriodicTask("event-bus-flusher", coalesce_interval, self.flush)
+
+        self._subscriptions = set()
+        self._subscriptions_lock = threading.Lock()
+        self._listeners: List[Callable[[Event], None]] = []
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.published = 0
+        self.delivered = 0
+        self.evicted = 0
+        self.resets = 0
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def publish_new_url(self, short_code: str, original_url: str, created_at: str):
+        self._flusher.ensure_started()
+        with self._buffer_lock:
+            self._created += 1
+            self._pending.append(('new_url', {
+                'timestamp': created_at,
+                'type': 'new_url',
+                'original_url': original_url,
+                'short_code': short_code,
+                'clicks': 0,
+                'created_at': created_at,
+            }))
+
+    def count_new_urls(self, count: int):
+        """Count URLs created in bulk in the interval stats without one event per URL"""
+        self._flusher.ensure_started()
+        with self._buffer_lock:
+            self._created += count
+
+    def record_click(self, short_code: str):
+        self._flusher.ensure_started()
+        with self._buffer_lock:
+            self._clicks[short_code] += 1
+
+    def flush(self):
+        """Write this interval's events to the stream in one pipeline"""
+        with self._buffer_lock:
+            pending, self._pending = self._pending, []
+            clicks, self._clicks = self._clicks, Counter()
+            created, self._created = self._created, 0
+        if not pending and not clicks and not created:
+            return
+
+        events = list(pending)
+        timestamp = datetime.utcnow().isoformat()
+        if clicks:
+            events.append(('click_update', {
+                'timestamp': timestamp,
+                'type': 'click_update',
+                'clicks': dict(clicks.most_common(self.max_click_codes)),
+            }))
+        events.append(('stats', {
+            'timestamp': timestamp,
+            'type': 'stats',
+            'urls_created': created,
+            'clicks': sum(clicks.values()),
+            'active_links': len(clicks),
+        }))
+
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for event_type, data in events:
+                pipe.xadd(self.stream_key, {'event': event_type, 'data': json.dumps(data)},
+                          maxlen=self.maxlen, approximate=True)
+            pipe.execute()
+        except Exception:
+            # Merge back so the next flush retries them; click and stats events are rebuilt from the counts
+            with self._buffer_lock:
+                self._pending[:0] = pending
+                del self._pending[:-self.maxlen]
+                self._clicks.update(clicks)
+                self._created += created
+            raise
+        self.published += len(events)
+
+    # ------------------------------------------------------------------
+    # Subscribing
+    # ------------------------------------------------------------------
+
+    def add_listener(self, fn: Callable[[Event], None]):
+        """Also hand every event to `fn` on the subscriber thread (e.g. a Socket.IO broadcast)"""
+        self._listeners.append(fn)
+        self.ensure_started()
+
+    def ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                self._subscriptions = set()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="event-bus-subscriber", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        last_id = '$'
+        delay = 0.5
+        while True:
+            try:
+                # Block for less than the client's socket timeout
+                entries = self.redis.xread({self.stream_key: last_id}, count=500, block=2000)
+                delay = 0.5
+                for _stream, messages in entries or []:
+                    for entry_id, fields in messages:
+                        last_id = entry_id
+                        self._dispatch(Event(entry_id, fields.get('event', 'message'), fields.get('data', '{}')))
+            except Exception as e:
+                logging.error("Event bus subscriber error, retrying in %ss: %s", delay, e)
+                time.sleep(delay)
+                delay = min(delay * 2, 10.0)
+
+    def _dispatch(self, event: Event):
+        with self._subscriptions_lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if not subscription.wants(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+                self.delivered += 1
+            except queue.Full:
+                # Slow consumer: drop it, it resumes from Last-Event-ID on reconnect
+                subscription.overflowed = True
+                self._unsubscribe(subscription)
+                self.evicted += 1
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logging.error("Event listener failed: %s", e)
+
+    def _unsubscribe(self, subscription: Subscription):
+        with self._subscriptions_lock:
+            self._subscriptions.discard(subscription)
+
+    def _replay(self, last_event_id: str, types: Optional[frozenset]) -> Tuple[List[Event], bool]:
+        """
+        Events after `last_event_id`, and whether that is all of them: False when
+        the stream no longer reaches back to it or more than a queue's worth followed.
+        """
+        try:
+            oldest = self.redis.xrange(self.stream_key, count=1)
+            entries = self.redis.xrange(self.stream_key, min=f"({last_event_id}", count=self.client_queue_size + 1)
+        except Exception as e:
+            logging.error("Event replay from %s failed: %s", last_event_id, e)
+            return [], False
+        trimmed = bool(oldest) and _stream_id(oldest[0][0]) > _stream_id(last_event_id)
+        if trimmed or len(entries) > self.client_queue_size:
+            return [], False
+        events = [Event(entry_id, fields.get('event', 'message'), fields.get('data', '{}'))
+                  for entry_id, fields in entries]
+        return [event for event in events if types is None or event.type in types], True
+
+    def _reset_event(self) -> Event:
+        """Tells a client to reload its state; its id is the newest entry, so live events resume after it"""
+        try:
+            newest = self.redis.xrevrange(self.stream_key, count=1)
+        except Exception as e:
+            logging.error("Reading the newest event failed: %s", e)
+            newest = []
+        event_id = newest[0][0] if newest else '0-0'
+        self.resets += 1
+        return Event(event_id, 'reset', json.dumps({'type': 'reset', 'reason': 'replay_window_exceeded'}))
+
+    def stream(self, types: Optional[Iterable[str]] = None, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """
+        SSE text for one client: events newer than `last_event_id` replayed from
+        the stream (or a `reset` event when they no longer can be), then live
+        events, with heartbeat comments while idle.
+        """
+        self.ensure_started()
+        types = frozenset(types) if types else None
+        subscription = Subscription(types, self.client_queue_size)
+        with self._subscriptions_lock:
+            self._subscriptions.add(subscription)
+
+        try:
+            yield "retry: 3000\n\n"
+            last_seen = (0, 0)
+            if last_event_id:
+                try:
+                    last_seen = _stream_id(last_event_id)
+                except ValueError:
+                    last_event_id = None
+            if last_event_id:
+                events, complete = self._replay(last_event_id, types)
+                if not complete:
+                    events = [self._reset_event()]
+                for event in events:
+                    last_seen = _stream_id(event.id)
+                    yield event.to_sse()
+
+            while not subscription.overflowed:
+                try:
+                    event = subscription.queue.get(timeout=self.heartbeat_interval)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                # Skip anything the replay already sent
+                if _stream_id(event.id) <= last_seen:
+                    continue
+                yield event.to_sse()
+        finally:
+            self._unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._subscriptions),
+            "published": self.published,
+            "delivered": self.delivered,
+            "evicted": self.evicted,
+            "resets": self.resets,
+        }
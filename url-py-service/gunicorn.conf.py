@@ -0,0 +1,90 @@
+"""
+Multi-process serving profile.
+
+    gunicorn -c gunicorn.conf.py app_prod:app
+
+The app is imported once in the master (preload_app) so workers share its code
+pages copy-on-write. Redis, Postgres and Kafka clients are created per worker in
+post_fork, so no socket or background thread is inherited across fork. Workers
+are recycled after a jittered number of requests, and each one hands back leased
+short codes and flushes buffered rows/clicks/events on exit. Workers share
+their metrics through METRICS_MULTIPROC_DIR, so /metrics on any worker reports
+the whole server (see metrics.py).
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'eventlet')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+# app_prod, not the legacy app.py: only app_prod defers its client setup to post_fork
+wsgi_app = os.getenv('APP_MODULE', 'app_prod:app')
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Preload this many of the most-clicked links into the Redis cache on startup (0 = off)
+cache_warmup_top = int(os.getenv('CACHE_WARMUP_TOP', '0'))
+
+# Graceful worker recycling
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '100000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '10000'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+if preload_app:
+    # Locks and queues created while importing the app must be green ones, so
+    # patch the master before the preload rather than in each worker afterwards.
+    if worker_class == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif worker_class == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+    os.environ['DEFER_WORKER_INIT'] = '1'
+
+# Before the app (and metrics.py) is imported, so the master and workers agree on it
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'url-py-service-metrics'))
+
+
+# The per-worker hooks only exist in app_prod
+_has_worker_hooks = wsgi_app.startswith('app_prod:')
+
+
+def on_starting(server):
+    if _has_worker_hooks:
+        import metrics
+        metrics.clear_multiproc_dir()
+
+
+def when_ready(server):
+    if cache_warmup_top > 0:
+        # Separate process: the master must not open Redis/Postgres sockets the workers would inherit
+        warmup = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'warmup.py')
+        subprocess.Popen([sys.executable, warmup, '--top', str(cache_warmup_top)])
+        server.log.info("Cache warmup started for the top %s links", cache_warmup_top)
+
+
+def post_fork(server, worker):
+    if preload_app and _has_worker_hooks:
+        import app_prod
+        app_prod.init_worker()
+
+
+def worker_exit(server, worker):
+    if _has_worker_hooks:
+        import app_prod
+        import metrics
+        app_prod.shutdown_worker()
+        metrics.write_snapshot()
+
+
+def child_exit(server, worker):
+    if _has_worker_hooks:
+        import metrics
+        metrics.mark_process_dead(worker.pid)
@@ -17,11 +17,14 @@ CREATE TABLE urls (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     sec_ch_ua_platform TEXT,
     sec_ch_ua TEXT,
-    sec_ch_ua_mobile TEXT
+    sec_ch_ua_mobile TEXT,
+    url_hash BYTEA
 );
 
+-- One row per redirect, in monthly partitions url_clicks_pYYYYMM (created on
+-- demand by url_clicks_ensure_partition; archived with python -m db.partitions)
 CREATE TABLE url_clicks (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     url_id UUID REFERENCES urls(id) ON DELETE CASCADE,
     user_agent TEXT,
     ip_address INET,
@@ -30,10 +33,39 @@ CREATE TABLE url_clicks (
     sec_ch_ua_platform TEXT,
     sec_ch_ua TEXT,
     sec_ch_ua_mobile TEXT,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE OR REPLACE FUNCTION url_clicks_ensure_partition(p_month DATE) RETURNS TEXT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_month)::date;
+    partition_name TEXT := 'url_clicks_p' || to_char(month_start, 'YYYYMM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF url_clicks FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, (month_start + INTERVAL '1 month')::date
+            );
+        EXCEPTION WHEN duplicate_table THEN
+            NULL;  -- created by a concurrent caller
+        END;
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
 
--- Indexes for performance
-CREATE INDEX idx_short_code ON urls(short_code);
+-- Indexes for performance (short_code lookups use the UNIQUE constraint's index)
 CREATE INDEX idx_url_id ON url_clicks(url_id);
-CREATE INDEX idx_created_at ON urls(created_at);
+-- Keyset pagination for the URL listing: ORDER BY created_at DESC, id DESC
+CREATE INDEX idx_urls_created_at_id ON urls(created_at DESC, id DESC);
+-- Shorten-time dedup (URL_DEDUP): truncated SHA-256 of the normalized URL
+CREATE INDEX idx_url_hash ON urls(url_hash) WHERE url_hash IS NOT NULL;
+
+-- Applied Redis click-counter batches, so a retried flush is not counted twice
+CREATE TABLE click_flushes (
+    token TEXT PRIMARY KEY,
+    applied_at TIMESTAMP NOT NULL DEFAULT now()
+);
+CREATE INDEX idx_click_flushes_applied_at ON click_flushes(applied_at);
@@ -0,0 +1,209 @@
+"""
+Logging for the web service: non-blocking, sampled, structured.
+
+    configure_logging()     # once at import; safe to call again per worker
+
+Request threads only build a LogRecord and put it on a bounded in-memory
+queue; formatting and the write to stderr happen on a listener thread (one per
+worker process, restarted after fork). When the queue is full, records are
+dropped and counted rather than blocking a request.
+
+Records emitted while serving a request carry its method, route and path. Below
+WARNING they are sampled per route (LOG_SAMPLE_RATES), decided once per
+request so a sampled request keeps all of its lines; warnings and errors are
+always kept.
+
+Environment:
+
+    APP_ENV / FLASK_ENV   development | staging | production (default)
+    LOG_LEVEL             overrides the environment's level (DEBUG in
+                          development, INFO otherwise)
+    LOG_FORMAT            json (default) or text (default in development)
+    LOG_SAMPLE_RATES      "route=rate,...", e.g. "/<short_url>=0.01,*=1"
+    LOG_QUEUE_SIZE        records buffered before dropping (default 10000)
+
+Messages are formatted on the listener thread, so log with %-style arguments
+(`logging.info("stored %s", code)`) and do not mutate objects passed as
+arguments after logging them.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import g, has_request_context, request
+
+ENV_LEVELS = {'development': 'DEBUG', 'staging': 'INFO', 'production': 'INFO'}
+
+APP_ENV = os.getenv('APP_ENV') or os.getenv('FLASK_ENV') or 'production'
+LOG_LEVEL = os.getenv('LOG_LEVEL') or ENV_LEVELS.get(APP_ENV, 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT') or ('text' if APP_ENV == 'development' else 'json')
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# LogRecord attributes that are not `extra=` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+_REQUEST_ATTRIBUTES = ('method', 'route', 'path')
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """'/<short_url>=0.01,*=0.5' -> {'/<short_url>': 0.01, '*': 0.5}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        route, _, rate = item.rpartition('=')
+        if not route:
+            raise ValueError(f"Invalid LOG_SAMPLE_RATES entry: {item}")
+        rates[route.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class RequestContextFilter(logging.Filter):
+    """Tags records with the current request and applies per-route sampling"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.default_rate = rates.get('*', 1.0)
+
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not has_request_context():
+            return True
+        route = request.url_rule.rule if request.url_rule is not None else None
+        record.method = request.method
+        record.route = route
+        record.path = request.path
+        if record.levelno >= logging.WARNING:
+            return True
+
+        keep = g.get('_log_sampled')
+        if keep is None:
+            rate = self.rates.get(route, self.default_rate)
+            keep = g._log_sampled = rate >= 1.0 or random.random() < rate
+        if not keep:
+            self.sampled_out += 1
+        return keep
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks, defers formatting to the listener and
+    starts the listener lazily in each process (threads do not survive fork).
+    """
+
+    def __init__(self, target: logging.Handler, max_size: int = 10000):
+        super().__init__(queue.Queue(maxsize=max_size))
+        self.target = target
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.dropped = 0
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Records queued by a parent process were its to write
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() formats the message here; leave that to the listener
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record: logging.LogRecord):
+        if self._pid != os.getpid():
+            self._ensure_listener()
+        super().emit(record)
+
+    def stop(self):
+        """Flush queued records and stop the listener (at exit)"""
+        with self._lock:
+            if self._listener is None or self._pid != os.getpid():
+                return
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request fields and any `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        route = getattr(record, 'route', None)
+        if route:
+            text += f" ({record.method} {route})"
+        return text
+
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_context_filter: Optional[RequestContextFilter] = None
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, sample_rates: str = LOG_SAMPLE_RATES,
+                      queue_size: int = LOG_QUEUE_SIZE):
+    """Route the root logger through the queue handler; replaces any handlers already installed"""
+    global _handler, _context_filter
+    if _handler is not None:
+        return _handler
+
+    target = logging.StreamHandler()
+    target.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    _context_filter = RequestContextFilter(parse_sample_rates(sample_rates))
+    _handler = NonBlockingQueueHandler(target, max_size=queue_size)
+    _handler.addFilter(_context_filter)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(level.upper())
+    return _handler
+
+
+def logging_stats() -> dict:
+    return {
+        "level": logging.getLevelName(logging.getLogger().getEffectiveLevel()),
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "sampled_out": _context_filter.sampled_out if _context_filter else 0,
+    }
@@ -0,0 +1,401 @@
+"""
+In-process metrics: counters, latency histograms and scrape-time gauges,
+rendered in the Prometheus text format by render_prometheus() (GET /metrics).
+
+Hot-path updates take no lock. A labelled metric is a family whose children are
+bound once per label set; bind the ones a hot path uses at import time
+
+    RESOLVE_L1_HIT = resolve_outcomes.labels('l1_hit')
+    ...
+    RESOLVE_L1_HIT.inc()
+
+so recording is an attribute increment. Updates are plain `+=`: under the
+eventlet/gevent workers they cannot interleave, and with OS threads an
+occasional lost increment is accepted in exchange for never contending.
+
+Every worker process keeps its own values. A scrape lands on one worker, so
+with several workers set METRICS_MULTIPROC_DIR (gunicorn.conf.py does): each
+worker then writes a snapshot there every METRICS_SYNC_INTERVAL seconds and
+on exit, the master folds the counters and histograms of exited workers into
+an archive, and /metrics reports counters and histograms summed over all
+workers past and present (so they never go backwards when a worker is
+recycled) and gauges combined over the live ones. Other workers' values are
+up to one sync interval old. Without the directory a scrape shows only the
+worker that served it.
+"""
+import bisect
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Tuple, Union
+
+from periodic import PeriodicTask
+
+# Latency buckets in seconds, tuned for sub-millisecond Redis calls up to slow DB queries
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Shared by the workers of one server; empty = report this process only
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+METRICS_SYNC_INTERVAL = float(os.getenv('METRICS_SYNC_INTERVAL', '5'))
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount: Union[int, float] = 1):
+        self.value += amount
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (seconds)"""
+
+    def __init__(self, name: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+
+    def observe(self, seconds: float):
+        self._counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self._sum += seconds
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def timed(self, fn: Callable) -> Callable:
+        """Decorator form of time()"""
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - started)
+        return wrapper
+
+    def snapshot(self) -> dict:
+        counts = list(self._counts)
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return {
+            "count": running,
+            "sum": self._sum,
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], cumulative)),
+        }
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (coarse, but cheap)"""
+        snapshot = self.snapshot()
+        if not snapshot["count"]:
+            return 0.0
+        target = q * snapshot["count"]
+        for bound, cumulative in zip(self.buckets, snapshot["buckets"].values()):
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+
+class Family:
+    """A labelled metric: one child Counter/Histogram per label set"""
+
+    def __init__(self, name: str, labelnames: Tuple[str, ...], factory: Callable[[], object]):
+        self.name = name
+        self.labelnames = labelnames
+        self._factory = factory
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The child for these label values (positional, in labelnames order)"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is not None:
+            return child
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        with self._lock:
+            return self._children.setdefault(key, self._factory())
+
+    def children(self) -> list:
+        return list(self._children.items())
+
+
+class Gauge:
+    """
+    Value read at scrape time from `fn`: a number, or with `labelnames` a dict
+    of label-value tuple -> number. None (or an exception) skips the sample.
+    Across workers the values are summed, or with `aggregate='max'` the
+    largest is reported (for a shared quantity every worker reads).
+    """
+
+    def __init__(self, name: str, fn: Callable, labelnames: Tuple[str, ...] = (), aggregate: str = 'sum'):
+        if aggregate not in ('sum', 'max'):
+            raise ValueError(f"Unknown gauge aggregate {aggregate!r}")
+        self.name = name
+        self.fn = fn
+        self.labelnames = labelnames
+        self.aggregate = aggregate
+
+    def samples(self) -> list:
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        if not self.labelnames:
+            return [((), value)]
+        return [(tuple(map(str, key)), v) for key, v in value.items() if v is not None]
+
+
+_histograms = {}
+_metrics = {}  # name -> (type, help, metric)
+_registry_lock = threading.Lock()
+
+
+def _register(name: str, kind: str, help_text: str, create: Callable[[], object]):
+    existing = _metrics.get(name)
+    if existing is not None:
+        return existing[2]
+    with _registry_lock:
+        if name not in _metrics:
+            _metrics[name] = (kind, help_text, create())
+        return _metrics[name][2]
+
+
+def histogram(name: str, buckets: tuple = DEFAULT_BUCKETS, help: str = '',
+              labelnames: Tuple[str, ...] = ()) -> Union[Histogram, Family]:
+    """Get or create the named histogram (a Family of histograms when labelnames are given)"""
+    if labelnames:
+        return _register(name, 'histogram', help, lambda: Family(name, labelnames, lambda: Histogram(name, buckets)))
+    existing = _histograms.get(name)
+    if existing is not None:
+        return existing
+    hist = _register(name, 'histogram', help, lambda: Histogram(name, buckets))
+    _histograms.setdefault(name, hist)
+    return hist
+
+
+def counter(name: str, help: str = '', labelnames: Tuple[str, ...] = ()) -> Union[Counter, Family]:
+    """Get or create the named counter (a Family of counters when labelnames are given)"""
+    if labelnames:
+        return _register(name, 'counter', help, lambda: Family(name, labelnames, lambda: Counter(name)))
+    return _register(name, 'counter', help, lambda: Counter(name))
+
+
+def gauge(name: str, fn: Callable, help: str = '', labelnames: Tuple[str, ...] = (),
+          aggregate: str = 'sum') -> Gauge:
+    """Register a scrape-time gauge; registering the same name again replaces its callback"""
+    metric = _register(name, 'gauge', help, lambda: Gauge(name, fn, labelnames, aggregate))
+    metric.fn = fn
+    return metric
+
+
+def latency_summary(prefix: str = '') -> dict:
+    """count / mean / p50 / p99 per histogram, for health and debug endpoints"""
+    summary = {}
+    for name, hist in sorted(_histograms.items()):
+        if not name.startswith(prefix):
+            continue
+        snapshot = hist.snapshot()
+        count = snapshot["count"]
+        summary[name] = {
+            "count": count,
+            "mean_ms": round(snapshot["sum"] / count * 1000, 3) if count else 0.0,
+            "p50_ms": round(hist.quantile(0.5) * 1000, 3),
+            "p99_ms": round(hist.quantile(0.99) * 1000, 3),
+        }
+    return summary
+
+
+def snapshot() -> dict:
+    """
+    This process's values as plain data: metric name -> [kind, help, series],
+    series being [labels, value] pairs, where labels is a list of [name, value]
+    and a histogram's value is [bounds, per-bucket counts, sum]. Gauges also
+    carry their aggregate.
+    """
+    metrics = {}
+    for name, (kind, help_text, metric) in list(_metrics.items()):
+        if isinstance(metric, Gauge):
+            series = [[list(zip(metric.labelnames, values)), value] for values, value in metric.samples()]
+            metrics[name] = [kind, help_text, series, metric.aggregate]
+            continue
+        if isinstance(metric, Family):
+            children = [(list(zip(metric.labelnames, key)), child) for key, child in metric.children()]
+        else:
+            children = [([], metric)]
+        series = []
+        for labels, child in children:
+            if isinstance(child, Counter):
+                series.append([labels, child.value])
+            else:
+                series.append([labels, [list(child.buckets), list(child._counts), child._sum]])
+        metrics[name] = [kind, help_text, series]
+    return metrics
+
+
+def merge(snapshots: list, include_gauges: bool = True) -> dict:
+    """Combine snapshots from several processes into one, series by series"""
+    merged = {}
+    for metrics in snapshots:
+        for name, entry in metrics.items():
+            kind = entry[0]
+            if kind == 'gauge' and not include_gauges:
+                continue
+            target = merged.setdefault(name, [kind, entry[1], {}] + entry[3:])
+            series = target[2]
+            for labels, value in entry[2]:
+                key = tuple(map(tuple, labels))
+                current = series.get(key)
+                if current is None:
+                    series[key] = value
+                elif kind == 'histogram':
+                    bounds, counts, total = current
+                    series[key] = [bounds, [a + b for a, b in zip(counts, value[1])], total + value[2]]
+                elif kind == 'gauge' and target[3] == 'max':
+                    series[key] = max(current, value)
+                else:
+                    series[key] = current + value
+    for entry in merged.values():
+        entry[2] = [[list(map(list, key)), value] for key, value in entry[2].items()]
+    return merged
+
+
+def _worker_path(pid: int) -> str:
+    return os.path.join(METRICS_MULTIPROC_DIR, f"worker-{pid}.json")
+
+
+def _archive_path() -> str:
+    return os.path.join(METRICS_MULTIPROC_DIR, "archive.json")
+
+
+@contextmanager
+def _dir_lock(exclusive: bool):
+    """Keeps a scrape from reading an exited worker both in its file and in the archive"""
+    with open(os.path.join(METRICS_MULTIPROC_DIR, ".lock"), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(path: str, metrics: dict):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(metrics, f)
+    os.replace(tmp, path)
+
+
+def write_snapshot():
+    """Publish this worker's values to METRICS_MULTIPROC_DIR"""
+    if METRICS_MULTIPROC_DIR:
+        _write(_worker_path(os.getpid()), snapshot())
+
+
+_sync_task = PeriodicTask("metrics-sync", METRICS_SYNC_INTERVAL, write_snapshot)
+
+
+def ensure_sync_started():
+    """Start publishing this worker's snapshot (no-op without METRICS_MULTIPROC_DIR)"""
+    if METRICS_MULTIPROC_DIR:
+        os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+        _sync_task.ensure_started()
+
+
+def clear_multiproc_dir():
+    """Start a server from zero: drop snapshots and the archive left by a previous run"""
+    if not METRICS_MULTIPROC_DIR:
+        return
+    os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(METRICS_MULTIPROC_DIR, '*.json')):
+        os.remove(path)
+
+
+def mark_process_dead(pid: int):
+    """Fold an exited worker's counters and histograms into the archive (run in the master)"""
+    if not METRICS_MULTIPROC_DIR:
+        return
+    path = _worker_path(pid)
+    if not os.path.exists(path):
+        return
+    with _dir_lock(exclusive=True):
+        _write(_archive_path(), merge([_read(_archive_path()), _read(path)], include_gauges=False))
+        os.remove(path)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs) -> str:
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus() -> str:
+    """
+    Every registered metric in the Prometheus text exposition format (0.0.4):
+    this worker's, or with METRICS_MULTIPROC_DIR all workers' combined.
+    """
+    if METRICS_MULTIPROC_DIR:
+        write_snapshot()
+        with _dir_lock(exclusive=False):
+            paths = glob.glob(os.path.join(METRICS_MULTIPROC_DIR, 'worker-*.json')) + [_archive_path()]
+            metrics = merge([_read(path) for path in paths])
+    else:
+        metrics = merge([snapshot()])
+
+    lines = []
+    for name, entry in sorted(metrics.items()):
+        kind, help_text, series = entry[:3]
+        if help_text:
+            lines.append(f"# HELP {name} {_escape(help_text)}")
+        lines.append(f"# TYPE {name} {kind}")
+
+        for labels, value in series:
+            labels = tuple(map(tuple, labels))
+            if kind != 'histogram':
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            bounds, counts, total = value
+            cumulative = 0
+            for bound, count in zip([*map(str, bounds), "+Inf"], counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
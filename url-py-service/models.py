@@ -0,0 +1,56 @@
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from dataclass_wizard import JSONSerializable
+
+
+@dataclass
+class RequestMetadata:
+    user_agent: str = ''
+    ip_address: str = ''
+    referrer: str = ''
+    sec_ch_ua_platform: str = ''
+    sec_ch_ua: str = ''
+    sec_ch_ua_mobile: str = ''
+
+    @classmethod
+    def from_headers(cls, headers, remote_addr: Optional[str]) -> 'RequestMetadata':
+        """Build from any case-insensitive mapping of request headers"""
+        forwarded_for = headers.get('X-Forwarded-For', '')
+        return cls(
+            user_agent=headers.get('User-Agent', ''),
+            ip_address=forwarded_for.split(',')[0].strip() if forwarded_for else remote_addr,
+            referrer=headers.get('Referer', ''),
+            sec_ch_ua_platform=headers.get('sec-ch-ua-platform', ''),
+            sec_ch_ua=headers.get('sec-ch-ua', ''),
+            sec_ch_ua_mobile=headers.get('sec-ch-ua-mobile', '')
+        )
+
+
+@dataclass
+class URLData(JSONSerializable):
+    url: str = ""
+    short_url: str = ""
+    is_public: bool = False
+    clicks: int = 0
+    custom_url: bool = False
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    user_agent: Optional[str] = None
+    ip_address: Optional[str] = None
+    referrer: Optional[str] = None
+    device_info: Optional[str] = None
+    sec_ch_ua_platform: Optional[str] = None
+    sec_ch_ua: Optional[str] = None
+    sec_ch_ua_mobile: Optional[str] = None
+
+    def apply_metadata(self, metadata: RequestMetadata):
+        """Populate additional fields from request metadata"""
+        self.user_agent = metadata.user_agent
+        self.ip_address = metadata.ip_address
+        self.referrer = metadata.referrer
+        self.sec_ch_ua_platform = metadata.sec_ch_ua_platform
+        self.sec_ch_ua = metadata.sec_ch_ua
+        self.sec_ch_ua_mobile = metadata.sec_ch_ua_mobile
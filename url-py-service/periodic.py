@@ -0,0 +1,67 @@
+import atexit
+import logging
+import os
+import threading
+from typing import Callable
+
+
+class PeriodicTask:
+    """
+    Run `fn` every `interval` seconds on a daemon thread.
+
+    The thread is started lazily by `ensure_started()` and restarted in a forked
+    child, so nothing is inherited across gunicorn's pre-fork. On interpreter exit
+    the task is stopped and `fn` runs one last time (when `run_on_stop` is set).
+    `wake()` runs `fn` early instead of waiting out the rest of the interval.
+    """
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], None], run_on_stop: bool = True):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.run_on_stop = run_on_stop
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run_once(self):
+        try:
+            self.fn()
+        except Exception as e:
+            logging.error("Periodic task %s failed: %s", self.name, e)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self._run_once()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout: float = 5.0):
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+        if self.run_on_stop:
+            self._run_once()
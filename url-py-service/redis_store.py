@@ -0,0 +1,243 @@
+from typing import Dict, List, Optional, Tuple
+
+from cache_codec import EscapedCodec
+from metrics import histogram
+
+
+def hash_bucket(short_code: str, buckets: int) -> int:
+    """Bucket index of a code in the hash layout; mirrored in _CLAIM_AND_STORE"""
+    h = 0
+    for byte in short_code.encode():
+        h = (h * 31 + byte) % buckets
+    return h
+
+
+# A bucket's expiry only ever moves later: set on a bucket this write creates,
+# extended on one expiring sooner than `ttl`, left alone on a persistent one.
+# Inlined in _CLAIM_AND_STORE. KEYS[1] = bucket; ARGV = field, value, ttl
+_STORE_IN_BUCKET = """
+local before = redis.call('PTTL', KEYS[1])
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+local ttl = tonumber(ARGV[3])
+if before == -2 or (before >= 0 and before < ttl * 1000) then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+"""
+
+# Extend (never shorten) the expiry of an existing key. KEYS[1] = key; ARGV[1] = ttl
+_EXTEND_TTL = """
+local remaining = redis.call('PTTL', KEYS[1])
+if remaining >= 0 and remaining < tonumber(ARGV[1]) * 1000 then
+    return redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+# Claim a pre-generated code and store its mapping in one round trip.
+# KEYS[1] = pre-gen list; ARGV = value, ttl (0 = none), invalidation channel ('' = none),
+# hash bucket prefix ('' = one key per code), hash bucket count
+_CLAIM_AND_STORE = """
+local code = redis.call('LPOP', KEYS[1])
+if not code then
+    return false
+end
+local ttl = tonumber(ARGV[2])
+if ARGV[4] ~= '' then
+    local buckets = tonumber(ARGV[5])
+    local h = 0
+    for i = 1, #code do
+        h = (h * 31 + string.byte(code, i)) % buckets
+    end
+    local bucket = ARGV[4] .. h
+    local before = redis.call('PTTL', bucket)
+    redis.call('HSET', bucket, code, ARGV[1])
+    if ttl > 0 and (before == -2 or (before >= 0 and before < ttl * 1000)) then
+        redis.call('EXPIRE', bucket, ttl)
+    end
+elseif ttl > 0 then
+    redis.call('SET', code, ARGV[1], 'EX', ttl)
+else
+    redis.call('SET', code, ARGV[1])
+end
+if ARGV[3] ~= '' then
+    redis.call('PUBLISH', ARGV[3], code)
+end
+return code
+"""
+
+
+class URLStore:
+    """
+    Data-access layer for the Redis URL cache and the pre-generated code pool.
+
+    Every operation is a single round trip and is timed into a per-operation
+    latency histogram (`redis_<op>_seconds`). When the cache and the pre-gen pool
+    live on the same Redis instance, claiming a code and caching its mapping is
+    one atomic Lua call; otherwise it is an LPOP followed by one pipelined write.
+
+    Values are written and read through `codec` (see cache_codec.py), so callers
+    deal in plain URLs. With a `hash_prefix`, mappings are spread over
+    `hash_buckets` small hashes (`<hash_prefix><bucket>`, field = code), which
+    Redis stores as compact listpacks instead of one top-level key per link as
+    long as each stays under hash-max-listpack-entries/-value (raise the value
+    limit to ~256 bytes for long URLs); size the bucket count to about
+    links / 100.
+
+    Expiry then applies per bucket rather than per link, and writes and
+    touch() only ever extend a bucket's TTL. A hot link therefore keeps its
+    ~100 neighbours cached as long as it stays hot, and a cold link written
+    into its bucket cannot cut that short. The cost is memory: cold links
+    live as long as the longest-lived link in their bucket, and a bucket
+    that holds a mapping stored without a TTL never expires. Use the
+    one-key-per-link layout when exact per-link expiry matters more.
+    """
+
+    def __init__(self, cache_client, pre_gen_client, same_instance: bool = False,
+                 pool_key: str = 'short_urls', invalidation_channel: str = '',
+                 codec=None, hash_prefix: str = '', hash_buckets: int = 65536):
+        self.cache = cache_client
+        self.pre_gen = pre_gen_client
+        self.same_instance = same_instance
+        self.pool_key = pool_key
+        self.invalidation_channel = invalidation_channel
+        self.codec = codec or EscapedCodec()
+        self.hash_prefix = hash_prefix
+        self.hash_buckets = hash_buckets
+        self._claim_and_store = pre_gen_client.register_script(_CLAIM_AND_STORE) if same_instance else None
+        self._store_in_bucket = cache_client.register_script(_STORE_IN_BUCKET)
+        self._extend_ttl = cache_client.register_script(_EXTEND_TTL)
+
+        self._get_latency = histogram('redis_get_seconds')
+        self._mget_latency = histogram('redis_mget_seconds')
+        self._store_latency = histogram('redis_store_seconds')
+        self._claim_latency = histogram('redis_claim_seconds')
+        self._claim_and_store_latency = histogram('redis_claim_and_store_seconds')
+
+    def _bucket(self, short_code: str):
+        return f"{self.hash_prefix}{hash_bucket(short_code, self.hash_buckets)}", short_code
+
+    def _write(self, pipe, short_code: str, value, ttl: Optional[int]):
+        if self.hash_prefix:
+            bucket, field = self._bucket(short_code)
+            if ttl:
+                self._store_in_bucket(keys=[bucket], args=[field, value, ttl], client=pipe)
+            else:
+                pipe.hset(bucket, field, value)
+        elif ttl:
+            pipe.set(short_code, value, ex=ttl)
+        else:
+            pipe.set(short_code, value)
+
+    def get_url(self, short_code: str) -> Optional[str]:
+        """Single GET (or HGET); None on a miss"""
+        with self._get_latency.time():
+            if self.hash_prefix:
+                value = self.cache.hget(*self._bucket(short_code))
+            else:
+                value = self.cache.get(short_code)
+        return self.codec.decode(value)
+
+    def get_url_with_ttl(self, short_code: str) -> Tuple[Optional[str], int]:
+        """GET (or HGET) and PTTL in one pipeline: (url or None, remaining ms; -1 = no expiry)"""
+        with self._get_latency.time():
+            pipe = self.cache.pipeline(transaction=False)
+            if self.hash_prefix:
+                bucket, field = self._bucket(short_code)
+                pipe.hget(bucket, field)
+                pipe.pttl(bucket)
+            else:
+                pipe.get(short_code)
+                pipe.pttl(short_code)
+            value, ttl_ms = pipe.execute()
+        return self.codec.decode(value), ttl_ms
+
+    def get_urls(self, short_codes: List[str]) -> List[Optional[str]]:
+        """Single MGET (or pipelined HGETs); one URL (or None) per code, in order"""
+        if not short_codes:
+            return []
+        with self._mget_latency.time():
+            if self.hash_prefix:
+                pipe = self.cache.pipeline(transaction=False)
+                for short_code in short_codes:
+                    pipe.hget(*self._bucket(short_code))
+                values = pipe.execute()
+            else:
+                values = self.cache.mget(short_codes)
+        return [self.codec.decode(value) for value in values]
+
+    def store_url(self, short_code: str, url: str, ttl: Optional[int] = None, publish: bool = False):
+        """Cache a mapping (with optional TTL) and optionally broadcast an L1 invalidation, pipelined"""
+        with self._store_latency.time():
+            pipe = self.cache.pipeline(transaction=False)
+            self._write(pipe, short_code, self.codec.encode(url), ttl)
+            if publish and self.invalidation_channel:
+                pipe.publish(self.invalidation_channel, short_code)
+            pipe.execute()
+
+    def store_urls(self, mappings: Dict[str, str], ttl: Optional[int] = None, publish: bool = False):
+        """Cache many mappings (and optionally broadcast their L1 invalidations) in one pipeline"""
+        if not mappings:
+            return
+        with self._store_latency.time():
+            pipe = self.cache.pipeline(transaction=False)
+            for short_code, url in mappings.items():
+                self._write(pipe, short_code, self.codec.encode(url), ttl)
+                if publish and self.invalidation_channel:
+                    pipe.publish(self.invalidation_channel, short_code)
+            pipe.execute()
+
+    def delete_urls(self, short_codes: List[str], publish: bool = False):
+        """Drop cached mappings (and optionally broadcast their L1 invalidations) in one pipeline"""
+        if not short_codes:
+            return
+        with self._store_latency.time():
+            pipe = self.cache.pipeline(transaction=False)
+            for short_code in short_codes:
+                if self.hash_prefix:
+                    pipe.hdel(*self._bucket(short_code))
+                else:
+                    pipe.delete(short_code)
+                if publish and self.invalidation_channel:
+                    pipe.publish(self.invalidation_channel, short_code)
+            pipe.execute()
+
+    def touch(self, short_code: str, ttl: int):
+        """Extend a cached mapping's expiry to `ttl` (its whole bucket in the hash layout); never shortens it"""
+        key = self._bucket(short_code)[0] if self.hash_prefix else short_code
+        self._extend_ttl(keys=[key], args=[ttl])
+
+    def claim_code(self) -> Optional[str]:
+        with self._claim_latency.time():
+            return self.pre_gen.lpop(self.pool_key)
+
+    def claim_codes(self, count: int) -> List[str]:
+        """Take up to `count` codes from the pool in one LPOP (Redis >= 6.2)"""
+        with self._claim_latency.time():
+            return self.pre_gen.lpop(self.pool_key, count) or []
+
+    def return_codes(self, codes: List[str]):
+        """Put unused codes back at the head of the pool so they are handed out next"""
+        if codes:
+            self.pre_gen.lpush(self.pool_key, *reversed(codes))
+
+    def claim_and_store(self, url: str, ttl: Optional[int] = None) -> Optional[str]:
+        """
+        Take a code from the pre-gen pool and cache `url` under it.
+        Returns the claimed code, or None when the pool is empty.
+        """
+        if self._claim_and_store is not None:
+            with self._claim_and_store_latency.time():
+                return self._claim_and_store(
+                    keys=[self.pool_key],
+                    args=[self.codec.encode(url), ttl or 0, self.invalidation_channel,
+                          self.hash_prefix, self.hash_buckets],
+                ) or None
+
+        short_code = self.claim_code()
+        if not short_code:
+            return None
+        self.store_url(short_code, url, ttl=ttl, publish=True)
+        return short_code
+
+    def ping(self) -> bool:
+        return bool(self.cache.ping() and self.pre_gen.ping())
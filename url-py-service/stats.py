@@ -0,0 +1,245 @@
+"""
+Pre-aggregated dashboard stats.
+
+Shorten and redirect events are counted in process and merged into Redis every
+`flush_interval` seconds with one pipeline:
+
+    stats:total                 hash   urls, clicks
+    stats:platform:<metric>     hash   platform -> count (sec-ch-ua-platform)
+    stats:<g>:<bucket>          hash   urls, clicks per minute/hour/day bucket,
+                                       expiring after the granularity's retention
+    stats:top                   zset   all-time top links by clicks
+    stats:top:<hour bucket>     zset   top links of that hour (trending)
+
+Top links are tracked per worker with a Space-Saving summary, so only the
+worker's heaviest `top_k` codes are sent per flush, and the Redis sorted sets
+are trimmed to a bounded size. Reading the stats is a fixed number of Redis
+commands no matter how large the urls table grows.
+
+    python stats.py --backfill    # seed totals, platforms and top links from Postgres
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from periodic import PeriodicTask
+
+# name, bucket size (s), retention (s), points returned by snapshot()
+GRANULARITIES = (
+    ('minute', 60, 2 * 3600, 60),
+    ('hour', 3600, 8 * 86400, 24),
+    ('day', 86400, 400 * 86400, 30),
+)
+
+
+def normalize_platform(sec_ch_ua_platform: Optional[str]) -> str:
+    """'"Windows"' -> 'Windows'; missing -> 'unknown'"""
+    platform = (sec_ch_ua_platform or '').strip().strip('"').strip()
+    return platform or 'unknown'
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters summary over at most `capacity` keys.
+
+    Every key whose true count exceeds total/capacity is guaranteed to be kept;
+    a count may be overestimated by at most the count of the key it replaced.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+
+    def add(self, key: str, amount: int = 1):
+        if key in self.counts:
+            self.counts[key] += amount
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = amount
+        else:
+            victim = min(self.counts, key=self.counts.get)
+            self.counts[key] = self.counts.pop(victim) + amount
+
+    def drain(self) -> Dict[str, int]:
+        counts, self.counts = self.counts, {}
+        return counts
+
+
+class StatsAggregator:
+    def __init__(self, redis_client, prefix: str = 'stats', flush_interval: float = 5.0, top_k: int = 100):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.top_k = top_k
+        self._created = Counter()  # (minute bucket, platform) -> urls
+        self._clicks = Counter()   # (minute bucket, platform) -> clicks
+        self._top = SpaceSaving(top_k)
+        self._lock = threading.Lock()
+        self._task = PeriodicTask("stats-flusher", flush_interval, self.flush)
+
+        self.flushes = 0
+        self.flush_errors = 0
+
+    def record_created(self, platform: Optional[str], count: int = 1):
+        self._task.ensure_started()
+        minute = int(time.time()) // 60 * 60
+        with self._lock:
+            self._created[(minute, normalize_platform(platform))] += count
+
+    def record_click(self, short_code: str, platform: Optional[str]):
+        self._task.ensure_started()
+        minute = int(time.time()) // 60 * 60
+        with self._lock:
+            self._clicks[(minute, normalize_platform(platform))] += 1
+            self._top.add(short_code)
+
+    def _key(self, *parts) -> str:
+        return ':'.join((self.prefix,) + tuple(str(part) for part in parts))
+
+    def flush(self):
+        """Merge everything counted since the last flush into Redis in one pipeline"""
+        with self._lock:
+            created, self._created = self._created, Counter()
+            clicks, self._clicks = self._clicks, Counter()
+            top = self._top.drain()
+        if not created and not clicks:
+            return
+
+        # MULTI/EXEC, so a failed flush applied nothing and can be merged back as a whole
+        pipe = self.redis.pipeline(transaction=True)
+        for metric, counts in (('urls', created), ('clicks', clicks)):
+            if not counts:
+                continue
+            pipe.hincrby(self._key('total'), metric, sum(counts.values()))
+
+            by_platform = Counter()
+            by_bucket = Counter()
+            for (minute, platform), amount in counts.items():
+                by_platform[platform] += amount
+                for name, size, _retention, _points in GRANULARITIES:
+                    by_bucket[(name, minute // size * size)] += amount
+            for platform, amount in by_platform.items():
+                pipe.hincrby(self._key('platform', metric), platform, amount)
+            for (name, bucket), amount in by_bucket.items():
+                pipe.hincrby(self._key(name, bucket), metric, amount)
+
+        for name, size, retention, _points in GRANULARITIES:
+            buckets = {minute // size * size for minute, _platform in list(created) + list(clicks)}
+            for bucket in buckets:
+                pipe.expire(self._key(name, bucket), retention)
+
+        if top:
+            hour = int(time.time()) // 3600 * 3600
+            for key, ttl in ((self._key('top'), None), (self._key('top', hour), 2 * 3600)):
+                for short_code, amount in top.items():
+                    pipe.zincrby(key, amount, short_code)
+                # Keep the sorted set bounded; the tail holds no heavy hitters
+                pipe.zremrangebyrank(key, 0, -(self.top_k * 10) - 1)
+                if ttl:
+                    pipe.expire(key, ttl)
+
+        try:
+            pipe.execute()
+            self.flushes += 1
+        except Exception:
+            self.flush_errors += 1
+            # Counted again with the next flush instead of being lost
+            with self._lock:
+                self._created.update(created)
+                self._clicks.update(clicks)
+                for short_code, amount in top.items():
+                    self._top.add(short_code, amount)
+            raise
+
+    def snapshot(self) -> dict:
+        """Totals, per-bucket series, platform breakdowns, top and trending links"""
+        now = int(time.time())
+        hour = now // 3600 * 3600
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(self._key('total'))
+        pipe.hgetall(self._key('platform', 'urls'))
+        pipe.hgetall(self._key('platform', 'clicks'))
+        pipe.zrevrange(self._key('top'), 0, self.top_k - 1, withscores=True)
+        pipe.zrevrange(self._key('top', hour), 0, self.top_k - 1, withscores=True)
+        series_buckets: List[Tuple[str, int]] = []
+        for name, size, _retention, points in GRANULARITIES:
+            current = now // size * size
+            for i in range(points - 1, -1, -1):
+                bucket = current - i * size
+                series_buckets.append((name, bucket))
+                pipe.hgetall(self._key(name, bucket))
+        results = pipe.execute()
+
+        totals, platform_urls, platform_clicks, top, trending = results[:5]
+        series = {name: [] for name, _size, _retention, _points in GRANULARITIES}
+        for (name, bucket), values in zip(series_buckets, results[5:]):
+            series[name].append({
+                "t": datetime.fromtimestamp(bucket, tz=timezone.utc).isoformat(),
+                "urls": int(values.get('urls', 0)),
+                "clicks": int(values.get('clicks', 0)),
+            })
+
+        def as_ints(mapping: dict) -> dict:
+            return {key: int(value) for key, value in mapping.items()}
+
+        def as_links(pairs: list) -> list:
+            return [{"short_code": code, "clicks": int(score)} for code, score in pairs]
+
+        return {
+            "totals": {"urls": int(totals.get('urls', 0)), "clicks": int(totals.get('clicks', 0))},
+            "platforms": {"urls": as_ints(platform_urls), "clicks": as_ints(platform_clicks)},
+            "top_links": as_links(top),
+            "trending": as_links(trending),
+            "series": series,
+        }
+
+    def backfill(self, totals: dict, platforms: Dict[Optional[str], Tuple[int, int]], top: List[Tuple[str, int]]):
+        """Overwrite totals, platform hashes and the all-time top set with values computed from Postgres"""
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.delete(self._key('total'), self._key('platform', 'urls'),
+                    self._key('platform', 'clicks'), self._key('top'))
+        pipe.hset(self._key('total'), mapping={'urls': totals['urls'], 'clicks': totals['clicks']})
+        # Raw header values ('"Windows"', 'Windows', NULL, ...) can normalize to the same platform
+        for platform, (urls, clicks) in platforms.items():
+            pipe.hincrby(self._key('platform', 'urls'), normalize_platform(platform), urls)
+            pipe.hincrby(self._key('platform', 'clicks'), normalize_platform(platform), clicks)
+        if top:
+            pipe.zadd(self._key('top'), {code: clicks for code, clicks in top})
+        pipe.execute()
+
+    def stats(self) -> dict:
+        return {"flushes": self.flushes, "flush_errors": self.flush_errors, "top_k": self.top_k}
+
+
+def main():
+    import redis
+
+    from db.pg_connector import url_stats_rollup
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Dashboard stats maintenance")
+    parser.add_argument('--backfill', action='store_true', help="Seed totals, platforms and top links from Postgres")
+    parser.add_argument('--top-k', type=int, default=100, help="Top links to seed")
+    args = parser.parse_args()
+
+    client = redis.Redis(
+        host=os.getenv('REDIS_PC'),
+        port=6379,
+        password=os.getenv('REDIS_PASSWORD', 'Welcome@Inf0r'),
+        decode_responses=True,
+    )
+    aggregator = StatsAggregator(client, top_k=args.top_k)
+
+    if args.backfill:
+        totals, platforms, top = url_stats_rollup(args.top_k)
+        aggregator.backfill(totals, platforms, top)
+        logging.info("Backfilled totals %s, %d platforms and %d top links", totals, len(platforms), len(top))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
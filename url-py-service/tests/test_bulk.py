@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+
+from bulk import (BulkItem, batched, bulk_format, csv_header, encode_results, read_items,
+                  result_line)
+
+
+def body(text):
+    """A request stream as Flask hands it over: bytes, one line at a time"""
+    return io.BytesIO(text.encode('utf-8'))
+
+
+def fields(items):
+    return [(item.line, item.fields, item.error) for item in items]
+
+
+def test_ndjson_objects_strings_and_bad_lines():
+    items = read_items(body(
+        '{"url": " https://a.example ", "isPublic": true}\n'
+        '\n'
+        '"https://b.example"\n'
+        '{"url": "https://c.example", "is_public": "yes", "custom_url": 1}\n'
+        'not json\n'
+        '[1, 2]\n'
+    ), 'ndjson')
+
+    assert fields(items) == [
+        (1, {'url': 'https://a.example', 'isPublic': True, 'customUrl': False}, None),
+        (3, {'url': 'https://b.example', 'isPublic': False, 'customUrl': False}, None),
+        (4, {'url': 'https://c.example', 'isPublic': True, 'customUrl': True}, None),
+        (5, None, 'Invalid JSON'),
+        (6, None, 'Expected a JSON object or string'),
+    ]
+
+
+def test_csv_with_header_in_any_column_order():
+    items = read_items(body(
+        'is_public,URL\r\n'
+        'true,https://a.example\r\n'
+        ',\r\n'
+        'no,"https://b.example/?a=1,2"\r\n'
+    ), 'csv')
+
+    assert fields(items) == [
+        (2, {'url': 'https://a.example', 'isPublic': True, 'customUrl': False}, None),
+        (4, {'url': 'https://b.example/?a=1,2', 'isPublic': False, 'customUrl': False}, None),
+    ]
+
+
+def test_csv_without_header_uses_the_first_column():
+    items = read_items(body('https://a.example,ignored\nhttps://b.example\n'), 'csv')
+
+    assert [(item.line, item.fields['url']) for item in items] == [(1, 'https://a.example'), (2, 'https://b.example')]
+
+
+def test_input_is_read_lazily():
+    consumed = []
+
+    def lines():
+        for i in range(1000):
+            consumed.append(i)
+            yield f'"https://example.com/{i}"\n'.encode()
+
+    first = next(batched(read_items(lines(), 'ndjson'), 10))
+
+    assert len(first) == 10
+    assert len(consumed) == 10
+
+
+def test_batched_keeps_order_and_the_short_tail():
+    assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batched([], 3)) == []
+
+
+def test_results_in_both_formats():
+    ok = result_line(BulkItem(1, {'url': 'https://a.example'}), short_code='abc1234')
+    failed = result_line(BulkItem(2, error='Invalid JSON'))
+
+    ndjson = [json.loads(line) for line in encode_results([ok, failed], 'ndjson').splitlines()]
+    assert ndjson == [
+        {'line': 1, 'success': True, 'url': 'https://a.example', 'shortUrl': 'www.bigshort.one/abc1234'},
+        {'line': 2, 'success': False, 'url': None, 'message': 'Invalid JSON'},
+    ]
+
+    rows = list(csv.reader(io.StringIO(csv_header() + encode_results([ok, failed], 'csv'))))
+    assert rows == [
+        ['line', 'success', 'url', 'shortUrl', 'message'],
+        ['1', 'True', 'https://a.example', 'www.bigshort.one/abc1234', ''],
+        ['2', 'False', '', '', 'Invalid JSON'],
+    ]
+
+
+def test_format_follows_the_mimetype():
+    assert bulk_format('text/csv') == 'csv'
+    assert bulk_format('application/x-ndjson') == 'ndjson'
+    assert bulk_format(None) == 'ndjson'
@@ -0,0 +1,51 @@
+import html
+
+import pytest
+
+from cache_codec import DEFLATE_TAG, PLAIN_TAG, CompactCodec, EscapedCodec, create_codec
+
+URLS = [
+    'https://x.com/',
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://example.org/search?q=<script>&lang=en&utm_source=newsletter',
+    'https://例え.テスト/パス?ü=ß',
+    'https://github.com/' + 'a' * 2000,
+]
+
+# Written by an earlier deploy; every release must still read it
+STORED_YOUTUBE_VALUE = b'\x02#d_J`\xb9I\xb9exzDr \x00'
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_compact_round_trip(url):
+    codec = CompactCodec()
+    assert codec.decode(codec.encode(url)) == url
+
+
+def test_short_urls_are_stored_plain_and_long_ones_compressed():
+    codec = CompactCodec(compress_min_length=24)
+
+    assert codec.encode('https://x.com/') == PLAIN_TAG + b'https://x.com/'
+    packed = codec.encode('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+    assert packed.startswith(DEFLATE_TAG)
+    assert len(packed) < len('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+
+
+def test_values_written_with_the_preset_dictionary_still_decode():
+    assert CompactCodec().decode(STORED_YOUTUBE_VALUE) == 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+
+def test_compact_reads_legacy_escaped_values():
+    url = 'https://example.com/?a=1&b=<2>'
+    legacy = EscapedCodec().encode(url)
+
+    assert legacy == html.escape(url)
+    assert CompactCodec().decode(legacy) == url
+    assert CompactCodec().decode(legacy.encode('utf-8')) == url
+    assert CompactCodec().decode(None) is None
+
+
+def test_unknown_codec_name_is_rejected():
+    assert create_codec('compact', compress_min_length=8).compress_min_length == 8
+    with pytest.raises(ValueError):
+        create_codec('gzip')
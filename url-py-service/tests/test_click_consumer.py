@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+import click_consumer  # noqa: E402
+from click_consumer import DeadLetterFile, FileEventSource, load_events, run  # noqa: E402
+
+
+def event(code, **fields):
+    return {"short_code": code, "user_agent": "test", **fields}
+
+
+def write_events(path, lines):
+    path.write_text('\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines) + '\n')
+    return str(path)
+
+
+class FakeCopy:
+    """COPY that chokes on any batch holding a poison event, after an optional run of dropped connections"""
+
+    def __init__(self, transient_failures=0):
+        self.transient_failures = transient_failures
+        self.loaded = []
+        self.calls = 0
+
+    def __call__(self, events):
+        self.calls += 1
+        if self.transient_failures:
+            self.transient_failures -= 1
+            raise psycopg2.OperationalError("server closed the connection")
+        if any(e.get("poison") for e in events):
+            raise ValueError("invalid input syntax for type timestamp")
+        self.loaded.extend(e["short_code"] for e in events)
+        return len(events)
+
+
+@pytest.fixture
+def fake_copy(monkeypatch):
+    fake = FakeCopy()
+    monkeypatch.setattr(click_consumer, 'copy_click_events', fake)
+    return fake
+
+
+def test_file_source_batches_and_skips_malformed_lines(tmp_path):
+    path = write_events(tmp_path / 'events.ndjson', [
+        event('a'), '', 'not json', 'null', '[1, 2]', '42', event('b'), event('c'),
+    ])
+    source = FileEventSource(path)
+
+    assert [e["short_code"] for e in source.read_batch(2, 0)] == ['a', 'b']
+    assert not source.exhausted
+    assert [e["short_code"] for e in source.read_batch(2, 0)] == ['c']
+    assert source.exhausted
+    source.close()
+
+
+def test_run_loads_every_event_from_a_file(tmp_path, fake_copy):
+    path = write_events(tmp_path / 'events.ndjson', [event(str(i)) for i in range(25)])
+    dead_letter = DeadLetterFile(str(tmp_path / 'dead.ndjson'))
+
+    assert run(FileEventSource(path), batch_size=10, dead_letter=dead_letter, retry_delay=0) == 25
+    assert fake_copy.loaded == [str(i) for i in range(25)]
+    assert dead_letter.count == 0
+
+
+def test_poison_event_is_dead_lettered_and_the_rest_load(tmp_path, fake_copy):
+    events = [event(str(i)) for i in range(10)]
+    events[6]["poison"] = True
+    path = write_events(tmp_path / 'events.ndjson', events)
+    dead_path = tmp_path / 'dead.ndjson'
+    dead_letter = DeadLetterFile(str(dead_path))
+
+    loaded = run(FileEventSource(path), batch_size=10, dead_letter=dead_letter, max_attempts=2, retry_delay=0)
+
+    assert loaded == 9
+    assert sorted(fake_copy.loaded, key=int) == [str(i) for i in range(10) if i != 6]
+    assert dead_letter.count == 1
+    assert [json.loads(line)["short_code"] for line in dead_path.read_text().splitlines()] == ['6']
+
+
+def test_dead_letter_file_replays_through_the_file_source(tmp_path):
+    dead_letter = DeadLetterFile(str(tmp_path / 'dead.ndjson'))
+    dead_letter.write([event('x'), event('y')], ValueError("bad"))
+
+    source = FileEventSource(dead_letter.path)
+    assert [e["short_code"] for e in source.read_batch(10, 0)] == ['x', 'y']
+    source.close()
+
+
+def test_transient_errors_are_retried_without_splitting(tmp_path, monkeypatch):
+    fake = FakeCopy(transient_failures=5)
+    monkeypatch.setattr(click_consumer, 'copy_click_events', fake)
+    dead_letter = DeadLetterFile(str(tmp_path / 'dead.ndjson'))
+
+    assert load_events([event('a'), event('b')], dead_letter, max_attempts=2, retry_delay=0) == 2
+    assert fake.calls == 6
+    assert dead_letter.count == 0
+
+
+def test_stop_request_interrupts_transient_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr(click_consumer, 'copy_click_events', FakeCopy(transient_failures=100))
+    dead_letter = DeadLetterFile(str(tmp_path / 'dead.ndjson'))
+
+    with pytest.raises(click_consumer.LoadInterrupted):
+        load_events([event('a')], dead_letter, retry_delay=0, should_stop=lambda: True)
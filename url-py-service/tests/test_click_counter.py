@@ -0,0 +1,113 @@
+import pytest
+
+pytest.importorskip('redis')
+from redis.exceptions import ResponseError  # noqa: E402
+
+from click_counter import LocalClickCounter, RedisClickCounter  # noqa: E402
+
+
+class HashRedis:
+    """Just enough of Redis for the shared counter: hashes, RENAME and a lock; DEL can be made to fail"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.strings = {}
+        self.failing_deletes = 0
+
+    def register_script(self, script):
+        def release(keys, args):
+            if self.strings.get(keys[0]) == args[0]:
+                del self.strings[keys[0]]
+                return 1
+            return 0
+        return release
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    def hincrby(self, key, field, amount):
+        bucket = self.hashes.setdefault(key, {})
+        bucket[field] = str(int(bucket.get(field, 0)) + amount)
+
+    def hsetnx(self, key, field, value):
+        return int(self.hashes.setdefault(key, {}).setdefault(field, value) == value)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def exists(self, key):
+        return int(key in self.hashes)
+
+    def rename(self, source, target):
+        if source not in self.hashes:
+            raise ResponseError("no such key")
+        self.hashes[target] = self.hashes.pop(source)
+
+    def delete(self, key):
+        if self.failing_deletes:
+            self.failing_deletes -= 1
+            raise ConnectionError("Connection reset by peer")
+        self.hashes.pop(key, None)
+
+
+class ClicksTable:
+    """urls.clicks plus the set of applied flush tokens, as add_clicks keeps them"""
+
+    def __init__(self):
+        self.clicks = {}
+        self.tokens = set()
+
+    def __call__(self, deltas, token=None):
+        if token is not None:
+            if token in self.tokens:
+                return 0
+            self.tokens.add(token)
+        for code, amount in deltas.items():
+            self.clicks[code] = self.clicks.get(code, 0) + amount
+        return len(deltas)
+
+
+def test_retried_flush_does_not_count_twice():
+    redis, table = HashRedis(), ClicksTable()
+    counter = RedisClickCounter(redis, table)
+    counter.redis.hincrby(counter.pending_key, 'abc1234', 3)
+
+    redis.failing_deletes = 1
+    counter.flush()  # applied, but the batch is still in Redis
+    counter.flush()  # retried with the same token
+
+    assert table.clicks == {'abc1234': 3}
+    assert counter.stats()['flush_errors'] == 1
+    assert not redis.exists(counter.flushing_key)
+
+
+def test_next_batch_gets_a_new_token():
+    redis, table = HashRedis(), ClicksTable()
+    counter = RedisClickCounter(redis, table)
+
+    for _ in range(2):
+        redis.hincrby(counter.pending_key, 'abc1234', 1)
+        counter.flush()
+
+    assert table.clicks == {'abc1234': 2}
+    assert len(table.tokens) == 2
+
+
+def test_local_counter_merges_deltas_back_after_a_failed_flush():
+    attempts = []
+
+    def flaky_update(deltas):
+        attempts.append(dict(deltas))
+        if len(attempts) == 1:
+            raise ConnectionError("server closed the connection unexpectedly")
+
+    counter = LocalClickCounter(flaky_update)
+    counter.incr('abc1234')
+    counter.flush()
+    counter.incr('abc1234')
+    counter.flush()
+
+    assert attempts == [{'abc1234': 1}, {'abc1234': 2}]
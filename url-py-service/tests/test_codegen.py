@@ -0,0 +1,84 @@
+import pytest
+
+from codegen import BASE62_ALPHABET, CodeGenerator, FeistelPermutation, PoolRefiller, encode_base62
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.lists = {}
+
+    def incrby(self, key, amount):
+        self.values[key] = self.values.get(key, 0) + amount
+        return self.values[key]
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    def execute(self):
+        return []
+
+    def register_script(self, script):
+        return None
+
+
+@pytest.mark.parametrize('space', [2, 62, 62 ** 2, 62 ** 3, 1000])
+def test_permutation_is_a_bijection(space):
+    permutation = FeistelPermutation(space)
+    assert sorted(permutation.permute(i) for i in range(space)) == list(range(space))
+
+
+def test_permutation_depends_on_the_key():
+    first, second = FeistelPermutation(62 ** 7, 'one'), FeistelPermutation(62 ** 7, 'two')
+    assert [first.permute(i) for i in range(10)] != [second.permute(i) for i in range(10)]
+
+
+def test_permutation_rejects_values_outside_the_space():
+    with pytest.raises(ValueError):
+        FeistelPermutation(62).permute(62)
+
+
+def test_encode_base62_pads_to_length():
+    assert encode_base62(0, 7) == '0000000'
+    assert encode_base62(61, 3) == '00z'
+    assert encode_base62(62, 3) == '010'
+
+
+def test_codes_are_unique_and_well_formed():
+    codes = CodeGenerator(FakeRedis()).generate(20000)
+    assert len(set(codes)) == len(codes)
+    assert all(len(code) == 7 and set(code) <= set(BASE62_ALPHABET) for code in codes)
+
+
+def test_adjacent_sequence_numbers_differ_beyond_the_trailing_characters():
+    codes = CodeGenerator(FakeRedis()).generate(2000)
+    pairs = list(zip(codes, codes[1:]))
+
+    # The leading characters of neighbours should almost never coincide ...
+    shared_prefix = sum(1 for a, b in pairs if a[:3] == b[:3])
+    assert shared_prefix <= len(pairs) * 0.01
+    # ... and on average most positions differ, not just the last one or two
+    differing = sum(sum(x != y for x, y in zip(a, b)) for a, b in pairs) / len(pairs)
+    assert differing > 6
+
+
+def test_neighbour_differences_are_not_constant():
+    generator = CodeGenerator(FakeRedis())
+    values = [generator.permutation.permute(i) for i in range(100)]
+    deltas = {(b - a) % generator.space for a, b in zip(values, values[1:])}
+    assert len(deltas) > 90
+
+
+def test_top_up_pushes_only_the_codes_asked_for():
+    redis = FakeRedis()
+    refiller = PoolRefiller(redis, CodeGenerator(redis), low_water=100, high_water=500, interval=60)
+
+    assert refiller.top_up(3) == 3
+    assert redis.llen('short_urls') == 3
+    assert refiller.stats()["top_ups"] == 1
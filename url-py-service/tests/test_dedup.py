@@ -0,0 +1,99 @@
+import pytest
+
+from dedup import URLDeduplicator, normalize_url, url_hash
+
+
+class StringRedis:
+    """Redis strings with SET NX; TTLs are recorded but never expire"""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    def register_script(self, script):
+        def release(keys, args):
+            if self.values.get(keys[0]) == args[0]:
+                del self.values[keys[0]]
+                return 1
+            return 0
+        return release
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        self.ttls[key] = ex
+        return True
+
+
+@pytest.mark.parametrize('submitted, canonical', [
+    ('HTTPS://Example.COM', 'https://example.com/'),
+    ('https://example.com:443/a?b=1', 'https://example.com/a?b=1'),
+    ('http://example.com:80/', 'http://example.com/'),
+    ('http://example.com:8080/', 'http://example.com:8080/'),
+    ('  https://user:pw@Example.com/x  ', 'https://user:pw@example.com/x'),
+])
+def test_normalize_url(submitted, canonical):
+    assert normalize_url(submitted) == canonical
+
+
+def test_path_query_and_fragment_case_is_significant():
+    assert url_hash('https://example.com/Docs') != url_hash('https://example.com/docs')
+    assert url_hash('https://example.com/?q=A') != url_hash('https://example.com/?q=a')
+    assert url_hash('HTTPS://EXAMPLE.com:443') == url_hash('https://example.com/')
+    assert len(url_hash('https://example.com/')) == 32
+
+
+def test_public_and_private_links_are_never_shared():
+    redis = StringRedis()
+    lookups = []
+    dedup = URLDeduplicator(redis, lambda digest, public: lookups.append(public))
+    digest = url_hash('https://example.com/')
+
+    assert dedup.reserve(digest, True, 'pub1234') == (True, None)
+    assert dedup.find(digest, True) == 'pub1234'
+    assert dedup.find(digest, False) is None
+    assert dedup.reserve(digest, False, 'prv1234') == (True, None)
+
+    assert dedup.find(digest, False) == 'prv1234'
+    assert lookups == [False]
+
+
+def test_database_hit_is_cached_per_visibility():
+    redis = StringRedis()
+    rows = {(url_hash('https://example.com/a'), False): 'old1234'}
+    dedup = URLDeduplicator(redis, lambda digest, public: rows.get((digest, public)), ttl=60)
+    digest = url_hash('https://example.com/a')
+
+    assert dedup.find(digest, False) == 'old1234'
+    assert dedup.find(digest, True) is None
+    assert redis.values == {f'dedup:{digest}:private': 'old1234'}
+    assert redis.ttls[f'dedup:{digest}:private'] == 60
+    assert dedup.stats()['db_hits'] == 1 and dedup.stats()['misses'] == 1
+
+
+def test_concurrent_reservation_returns_the_winner_and_release_is_owner_only():
+    redis = StringRedis()
+    dedup = URLDeduplicator(redis, lambda digest, public: None)
+    digest = url_hash('https://example.com/')
+
+    assert dedup.reserve(digest, True, 'first12') == (True, None)
+    assert dedup.reserve(digest, True, 'second1') == (False, 'first12')
+
+    dedup.release(digest, True, 'second1')
+    assert dedup.find(digest, True) == 'first12'
+    dedup.release(digest, True, 'first12')
+    assert redis.values == {}
+
+
+def test_failed_database_lookup_is_a_miss():
+    def broken_lookup(digest, public):
+        raise ConnectionError("server closed the connection unexpectedly")
+
+    dedup = URLDeduplicator(StringRedis(), broken_lookup)
+
+    assert dedup.find(url_hash('https://example.com/'), True) is None
+    assert dedup.stats()['misses'] == 1
@@ -0,0 +1,97 @@
+import json
+import time
+
+from event_bus import EventBus, _stream_id
+
+
+class StreamRedis:
+    """A Redis stream in a list, with a switch to make pipelines fail"""
+
+    def __init__(self):
+        self.entries = []
+        self.down = False
+        self._batch = []
+
+    def pipeline(self, transaction=True):
+        self._batch = []
+        return self
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        self._batch.append(dict(fields))
+
+    def execute(self):
+        if self.down:
+            raise ConnectionError("Connection refused")
+        for fields in self._batch:
+            self.entries.append((f"{len(self.entries) + 1}-0", fields))
+
+    def xrange(self, key, min='-', max='+', count=None):
+        entries = self.entries
+        if min.startswith('('):
+            after = _stream_id(min[1:])
+            entries = [entry for entry in entries if _stream_id(entry[0]) > after]
+        return entries[:count]
+
+    def xrevrange(self, key, max='+', min='-', count=None):
+        return list(reversed(self.entries))[:count]
+
+    def xread(self, streams, count=None, block=None):
+        time.sleep((block or 0) / 1000)
+        return []
+
+
+def event_types(redis):
+    return [fields['event'] for _, fields in redis.entries]
+
+
+def test_failed_flush_keeps_the_batch_for_the_next_one():
+    redis = StreamRedis()
+    bus = EventBus(redis)
+    bus.publish_new_url('abc1234', 'https://example.com', '2026-01-01T00:00:00')
+    bus.record_click('abc1234')
+    bus.record_click('abc1234')
+
+    redis.down = True
+    try:
+        bus.flush()
+    except ConnectionError:
+        pass
+    redis.down = False
+    bus.flush()
+
+    assert event_types(redis) == ['new_url', 'click_update', 'stats']
+    stats = json.loads(redis.entries[-1][1]['data'])
+    assert stats['urls_created'] == 1 and stats['clicks'] == 2
+
+
+def test_reconnect_within_the_window_replays_missed_events():
+    redis = StreamRedis()
+    bus = EventBus(redis, client_queue_size=10)
+    redis.entries = [(f"{i}-0", {'event': 'new_url', 'data': '{}'}) for i in range(1, 6)]
+
+    events, complete = bus._replay('3-0', None)
+
+    assert complete
+    assert [event.id for event in events] == ['4-0', '5-0']
+
+
+def test_reconnect_past_the_window_gets_a_reset():
+    redis = StreamRedis()
+    bus = EventBus(redis, client_queue_size=3)
+    redis.entries = [(f"{i}-0", {'event': 'new_url', 'data': '{}'}) for i in range(1, 10)]
+
+    stream = bus.stream(last_event_id='2-0')
+    assert next(stream).startswith('retry:')
+    reset = next(stream)
+    stream.close()
+
+    assert reset.startswith('id: 9-0\nevent: reset\n')
+    assert bus.stats()['resets'] == 1
+
+
+def test_reconnect_after_the_stream_was_trimmed_gets_a_reset():
+    redis = StreamRedis()
+    bus = EventBus(redis, client_queue_size=10)
+    redis.entries = [(f"{i}-0", {'event': 'new_url', 'data': '{}'}) for i in range(5, 8)]
+
+    assert bus._replay('2-0', None) == ([], False)
@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def multiproc_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_MULTIPROC_DIR', str(tmp_path))
+    return tmp_path
+
+
+def sample(text, series):
+    for line in text.splitlines():
+        if line.startswith(series + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+def other_worker(directory, pid, metrics_snapshot):
+    (directory / f"worker-{pid}.json").write_text(json.dumps(metrics_snapshot))
+
+
+def test_single_process_has_no_worker_label():
+    metrics.counter('test_plain_total').inc(3)
+
+    text = metrics.render_prometheus()
+    assert sample(text, 'test_plain_total') == 3
+    assert 'worker=' not in text
+
+
+def test_counters_and_histograms_sum_across_workers(multiproc_dir):
+    requests = metrics.counter('test_requests_total', labelnames=('route',))
+    latency = metrics.histogram('test_latency_seconds', buckets=(0.1, 1.0))
+    requests.labels('/a').inc(2)
+    latency.observe(0.05)
+
+    other_worker(multiproc_dir, 1, {
+        'test_requests_total': ['counter', '', [[[['route', '/a']], 5]]],
+        'test_latency_seconds': ['histogram', '', [[[], [[0.1, 1.0], [0, 1, 1], 3.5]]]],
+    })
+
+    text = metrics.render_prometheus()
+    assert sample(text, 'test_requests_total{route="/a"}') == 7
+    assert sample(text, 'test_latency_seconds_bucket{le="0.1"}') == 1
+    assert sample(text, 'test_latency_seconds_bucket{le="1.0"}') == 2
+    assert sample(text, 'test_latency_seconds_count') == 3
+
+
+def test_exited_worker_counts_are_kept_and_its_gauges_dropped(multiproc_dir):
+    metrics.counter('test_redirects_total').inc(1)
+    metrics.gauge('test_queue_depth', lambda: 4)
+    other_worker(multiproc_dir, 2, {
+        'test_redirects_total': ['counter', '', [[[], 10]]],
+        'test_queue_depth': ['gauge', '', [[[], 6]], 'sum'],
+    })
+    assert sample(metrics.render_prometheus(), 'test_queue_depth') == 10
+
+    metrics.mark_process_dead(2)
+
+    text = metrics.render_prometheus()
+    assert not os.path.exists(multiproc_dir / 'worker-2.json')
+    assert sample(text, 'test_redirects_total') == 11
+    assert sample(text, 'test_queue_depth') == 4
+
+
+def test_max_gauge_reports_the_largest_value(multiproc_dir):
+    metrics.gauge('test_pool_depth', lambda: 100, aggregate='max')
+    other_worker(multiproc_dir, 3, {'test_pool_depth': ['gauge', '', [[[], 250]], 'max']})
+
+    assert sample(metrics.render_prometheus(), 'test_pool_depth') == 250
@@ -0,0 +1,165 @@
+from contextlib import contextmanager
+
+import pytest
+
+pytest.importorskip('psycopg2')
+
+from db.pool import PoolTimeout  # noqa: E402
+from db.replicas import Replica, ReplicaRouter  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.queries.append(query)
+
+    def fetchone(self):
+        return (self.conn.lag,)
+
+
+class FakeConnection:
+    def __init__(self, name, lag=0.0):
+        self.name = name
+        self.lag = lag
+        self.queries = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakePool:
+    """Stands in for PgPool: one connection, counts checkouts and returns"""
+
+    def __init__(self, name, lag=0.0, fail=None):
+        self.conn = FakeConnection(name, lag)
+        self.fail = fail
+        self.checked_out = 0
+        self.returned = 0
+
+    @contextmanager
+    def connection(self):
+        if self.fail is not None:
+            raise self.fail
+        self.checked_out += 1
+        try:
+            yield self.conn
+        finally:
+            self.returned += 1
+
+    def stats(self):
+        return {"checked_out": self.checked_out, "returned": self.returned}
+
+
+def make_router(*replica_pools, max_lag=5.0):
+    primary = FakePool('primary')
+    replicas = [Replica(pool.conn.name, pool) for pool in replica_pools]
+    # A long interval keeps the background check out of the way; tests call check() themselves
+    return primary, replicas, ReplicaRouter(primary, replicas, max_lag=max_lag, check_interval=3600)
+
+
+def source(conn):
+    return conn.name
+
+
+def test_reads_go_to_a_healthy_replica():
+    primary, (replica,), router = make_router(FakePool('r1'))
+
+    assert router.run(source) == 'r1'
+    with router.read_connection() as conn:
+        assert conn.name == 'r1'
+
+    assert replica.reads == 2
+    assert replica.pool.checked_out == replica.pool.returned == 2
+    assert primary.checked_out == 0
+
+
+def test_replicas_are_used_round_robin():
+    _, replicas, router = make_router(FakePool('r1'), FakePool('r2'))
+
+    assert [router.run(source) for _ in range(4)] == ['r1', 'r2', 'r1', 'r2']
+
+
+def test_lagging_replica_is_skipped():
+    _, (fresh, lagging), router = make_router(FakePool('r1'), FakePool('r2', lag=30.0), max_lag=5.0)
+    router.check()
+
+    assert fresh.healthy and not lagging.healthy
+    assert lagging.lag == 30.0
+    assert {router.run(source) for _ in range(4)} == {'r1'}
+    assert lagging.reads == 0
+
+
+def test_replica_not_streaming_is_skipped():
+    # The lag query yields NULL when the WAL receiver is down
+    _, (replica,), router = make_router(FakePool('r1', lag=None))
+    router.check()
+
+    assert not replica.healthy
+    assert router.run(source) == 'primary'
+
+
+def test_replica_back_in_rotation_once_caught_up():
+    _, (replica,), router = make_router(FakePool('r1', lag=30.0))
+    router.check()
+    assert router.run(source) == 'primary'
+
+    replica.pool.conn.lag = 0.0
+    router.check()
+    assert replica.healthy
+    assert router.run(source) == 'r1'
+
+
+def test_no_usable_replica_reads_from_primary():
+    primary, _, router = make_router()
+
+    assert router.run(source) == 'primary'
+    assert router.primary_reads == 1
+    assert primary.checked_out == primary.returned == 1
+
+
+def test_checkout_failure_falls_back_to_primary():
+    _, (replica,), router = make_router(FakePool('r1', fail=PoolTimeout("exhausted")))
+
+    assert router.run(source) == 'primary'
+    assert not replica.healthy
+    assert replica.failures == 1
+    assert router.primary_reads == 1
+
+
+def test_connection_is_returned_when_the_query_fails():
+    _, (replica,), router = make_router(FakePool('r1'))
+
+    def query(conn):
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        router.run(query)
+    assert replica.pool.checked_out == replica.pool.returned == 1
+
+
+def test_recheck_on_miss_goes_to_primary():
+    primary, (replica,), router = make_router(FakePool('r1'))
+
+    def lookup(conn):
+        return 'row' if conn.name == 'primary' else None
+
+    assert router.run(lookup, recheck=lambda row: row is None) == 'row'
+    assert router.primary_rechecks == 1
+    assert replica.reads == 1
+    assert primary.checked_out == 1
+
+
+def test_no_recheck_when_the_replica_found_the_row():
+    primary, _, router = make_router(FakePool('r1'))
+
+    assert router.run(source, recheck=lambda row: row is None) == 'r1'
+    assert router.primary_rechecks == 0
+    assert primary.checked_out == 0
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def start_leader(flight, key, fn):
+    """Run a call for `key` on its own thread; returns once it is in flight"""
+    outcome = {}
+
+    def lead():
+        try:
+            outcome['result'] = flight.do(key, fn)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    while not flight.in_flight(key):
+        pass
+    return thread, outcome
+
+
+def test_waiters_share_the_leaders_result():
+    flight = SingleFlight(wait_timeout=5.0)
+    release = threading.Event()
+    calls = []
+
+    def lookup():
+        calls.append(1)
+        release.wait()
+        return 'https://example.com'
+
+    leader, outcome = start_leader(flight, 'abc1234', lookup)
+    shared = []
+    waiters = [threading.Thread(target=lambda: shared.append(flight.do('abc1234', lookup))) for _ in range(3)]
+    for waiter in waiters:
+        waiter.start()
+    while flight.stats()['coalesced'] < 3:
+        pass
+    release.set()
+    for thread in [leader] + waiters:
+        thread.join()
+
+    assert calls == [1]
+    assert outcome['result'] == 'https://example.com'
+    assert shared == ['https://example.com'] * 3
+    assert flight.stats() == {'in_flight': 0, 'executions': 1, 'coalesced': 3}
+
+
+def test_waiters_get_the_leaders_exception():
+    flight = SingleFlight(wait_timeout=5.0)
+    release = threading.Event()
+
+    def failing_lookup():
+        release.wait()
+        raise ConnectionError("server closed the connection unexpectedly")
+
+    leader, outcome = start_leader(flight, 'abc1234', failing_lookup)
+    threading.Timer(0.05, release.set).start()
+
+    with pytest.raises(ConnectionError):
+        flight.do('abc1234', lambda: 'never called')
+    leader.join()
+    assert isinstance(outcome['error'], ConnectionError)
+
+
+def test_waiter_times_out_on_a_stuck_leader():
+    flight = SingleFlight(wait_timeout=0.05)
+    release = threading.Event()
+    leader, _ = start_leader(flight, 'abc1234', release.wait)
+
+    with pytest.raises(TimeoutError):
+        flight.do('abc1234', lambda: 'never called')
+    assert flight.in_flight('abc1234')
+
+    release.set()
+    leader.join()
+    assert flight.do('abc1234', lambda: 'fresh') == 'fresh'
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight = SingleFlight(wait_timeout=0.05)
+    release = threading.Event()
+    leader, _ = start_leader(flight, 'abc1234', release.wait)
+
+    assert flight.do('xyz9876', lambda: 'other') == 'other'
+    release.set()
+    leader.join()
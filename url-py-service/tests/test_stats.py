@@ -0,0 +1,55 @@
+import random
+from collections import Counter
+
+import pytest
+
+from stats import SpaceSaving, normalize_platform
+
+
+def test_counts_are_exact_while_under_capacity():
+    top = SpaceSaving(4)
+    for code in ['a', 'b', 'a', 'c', 'a', 'b']:
+        top.add(code)
+
+    assert top.counts == {'a': 3, 'b': 2, 'c': 1}
+
+
+def test_new_key_replaces_the_smallest_and_inherits_its_count():
+    top = SpaceSaving(2)
+    top.add('a', 5)
+    top.add('b', 2)
+    top.add('c')
+
+    assert top.counts == {'a': 5, 'c': 3}
+
+
+def test_heavy_hitters_survive_a_long_tail():
+    rng = random.Random(7)
+    clicks = ['hot1'] * 400 + ['hot2'] * 250 + ['hot3'] * 150
+    clicks += [f'cold{rng.randrange(2000)}' for _ in range(1200)]
+    rng.shuffle(clicks)
+
+    top = SpaceSaving(20)
+    for code in clicks:
+        top.add(code)
+    true_counts = Counter(clicks)
+
+    assert len(top.counts) == 20
+    ranked = sorted(top.counts, key=top.counts.get, reverse=True)
+    assert ranked[:3] == ['hot1', 'hot2', 'hot3']
+    for code, estimate in top.counts.items():
+        assert true_counts[code] <= estimate <= true_counts[code] + len(clicks) // 20
+
+
+def test_drain_hands_over_and_resets():
+    top = SpaceSaving(3)
+    top.add('a', 2)
+
+    assert top.drain() == {'a': 2}
+    assert top.counts == {}
+
+
+@pytest.mark.parametrize('header, platform', [('"Windows"', 'Windows'), (' "macOS" ', 'macOS'),
+                                              ('""', 'unknown'), (None, 'unknown')])
+def test_normalize_platform(header, platform):
+    assert normalize_platform(header) == platform
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from url_listing import ListingCache, decode_cursor, encode_cursor
+
+
+class VersionRedis:
+    """Only the listing version counter; can be taken down"""
+
+    def __init__(self):
+        self.values = {}
+        self.down = False
+
+    def get(self, key):
+        if self.down:
+            raise ConnectionError("Connection refused")
+        return self.values.get(key)
+
+    def incr(self, key):
+        if self.down:
+            raise ConnectionError("Connection refused")
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+
+
+@pytest.mark.parametrize('created_at, url_id', [
+    (datetime(2026, 3, 1, 12, 30, 15, 123456), 42),
+    (datetime(2026, 3, 1, 12, 30, tzinfo=timezone.utc), '9f1c2b7e-0d4a-4f8e-9a4b-3c1d2e5f6a7b'),
+])
+def test_cursor_round_trip(created_at, url_id):
+    cursor = encode_cursor(created_at, url_id)
+
+    assert decode_cursor(cursor) == (created_at, str(url_id))
+    assert '=' not in cursor and '/' not in cursor and '+' not in cursor
+
+
+@pytest.mark.parametrize('cursor', ['', 'not-a-cursor', encode_cursor(datetime(2026, 1, 1), 1)[:-3],
+                                    'WyJub3QtYS1kYXRlIiwgIjEiXQ'])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_bump_makes_cached_pages_unreachable():
+    redis = VersionRedis()
+    pages = ListingCache(redis)
+    key = f"{pages.version()}:limit=20"
+    etag = pages.set(key, b'{"urls": []}')
+
+    assert pages.get(key) == (b'{"urls": []}', etag)
+    pages.bump()
+    assert pages.version() == '1'
+    assert pages.get(f"{pages.version()}:limit=20") is None
+
+
+def test_listing_is_served_uncached_while_redis_is_down():
+    redis = VersionRedis()
+    redis.down = True
+    pages = ListingCache(redis)
+
+    assert pages.version() is None
+    pages.bump()
+    assert pages.stats()['bumps'] == 0
@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip('validators')
+pytest.importorskip('bleach')
+
+import validations  # noqa: E402
+from codegen import BASE62_ALPHABET, SHORT_CODE_LENGTH, encode_base62  # noqa: E402
+from validations import is_valid_short_code  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def reset_rejects():
+    for reason in validations.short_code_rejects:
+        validations.short_code_rejects[reason] = 0
+
+
+@pytest.mark.parametrize('code', [
+    encode_base62(0),
+    encode_base62(len(BASE62_ALPHABET) ** SHORT_CODE_LENGTH - 1),
+    'a',
+    'Ab-_9',
+])
+def test_generated_and_legacy_codes_are_accepted(code):
+    assert is_valid_short_code(code) == (True, None)
+
+
+@pytest.mark.parametrize('code', ['', 'x' * (SHORT_CODE_LENGTH + 1)])
+def test_empty_and_overlong_codes_are_rejected_by_length(code):
+    assert is_valid_short_code(code) == (False, "Invalid short code")
+    assert validations.short_code_rejects == {"length": 1, "alphabet": 0}
+
+
+@pytest.mark.parametrize('code', ['abc.def', 'ab/cd', 'ab cd', 'ab%20', 'ünï', 'abc\n', '../etc'])
+def test_codes_outside_the_alphabet_are_rejected(code):
+    assert is_valid_short_code(code) == (False, "Invalid short code")
+    assert validations.short_code_rejects == {"length": 0, "alphabet": 1}
+
+
+def test_max_length_follows_the_generator():
+    assert validations.SHORT_CODE_MAX_LENGTH == SHORT_CODE_LENGTH
+    assert is_valid_short_code(encode_base62(12345)) == (True, None)
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+pytest.importorskip('redis')
+psycopg2 = pytest.importorskip('psycopg2')
+
+from db.write_behind import MemoryWriteBehind  # noqa: E402
+
+
+class UrlsTable:
+    """Keeps the short codes it is given; an over-long URL fails the whole INSERT, as the column would"""
+
+    def __init__(self, connection_drops=0):
+        self.connection_drops = connection_drops
+        self.short_codes = []
+
+    def insert(self, records):
+        if self.connection_drops:
+            self.connection_drops -= 1
+            raise psycopg2.OperationalError("could not connect to server")
+        if any(len(record["url"]) > 2048 for record in records):
+            raise ValueError("value too long for type character varying(2048)")
+        self.short_codes.extend(record["shortUrl"] for record in records)
+        return len(records)
+
+
+def url_rows(count, too_long=()):
+    return [{"shortUrl": f"c{i}", "url": "https://example.com/" + ("x" * 3000 if i in too_long else str(i))}
+            for i in range(count)]
+
+
+def drain(writer, rows, timeout=10.0):
+    for row in rows:
+        assert writer.submit(row)
+    deadline = time.monotonic() + timeout
+    while writer.stats()["flushed"] + writer.stats()["dead_lettered"] < len(rows):
+        assert time.monotonic() < deadline, writer.stats()
+        time.sleep(0.01)
+    writer.stop()
+
+
+def test_bad_row_is_dead_lettered_and_the_rest_are_written():
+    table = UrlsTable()
+    writer = MemoryWriteBehind(table.insert, batch_size=8, flush_interval=0.05, max_attempts=1)
+
+    drain(writer, url_rows(8, too_long={3}))
+
+    assert sorted(table.short_codes) == ['c0', 'c1', 'c2', 'c4', 'c5', 'c6', 'c7']
+    assert writer.stats()["flushed"] == 7
+    assert writer.stats()["dead_lettered"] == 1
+
+
+def test_connection_failures_are_retried_without_dead_lettering():
+    table = UrlsTable(connection_drops=2)
+    writer = MemoryWriteBehind(table.insert, batch_size=4, flush_interval=0.05, max_attempts=1)
+
+    drain(writer, url_rows(4))
+
+    assert sorted(table.short_codes) == ['c0', 'c1', 'c2', 'c3']
+    assert writer.stats()["flush_errors"] == 2
+    assert writer.stats()["dead_lettered"] == 0
+
+
+def test_full_queue_rejects_instead_of_blocking():
+    table = UrlsTable(connection_drops=1000)
+    writer = MemoryWriteBehind(table.insert, batch_size=1, flush_interval=0.05, max_queue=2,
+                               enqueue_timeout=0.01)
+
+    accepted = [writer.submit(row) for row in url_rows(10)]
+
+    assert not all(accepted)
+    assert writer.stats()["rejected"] == accepted.count(False)
+    table.connection_drops = 0
+    writer.stop()
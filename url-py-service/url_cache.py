@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class LocalURLCache:
+    """
+    Bounded per-worker cache of short_code -> original_url.
+
+    Entries are evicted least-recently-used once `max_size` is reached and expire
+    after `ttl` seconds. Codes known not to exist are cached as negative entries
+    for `negative_ttl` seconds so repeated 404s skip Redis and Postgres.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60.0, negative_ttl: float = 5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # short_code -> (original_url or None, expires_at)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, short_code: str) -> Tuple[bool, Optional[str]]:
+        """
+        Returns (found, original_url). A found entry with original_url None is a
+        cached "does not exist".
+        """
+        with self._lock:
+            entry = self._entries.get(short_code)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            original_url, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[short_code]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(short_code)
+            if original_url is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, original_url
+
+    def _store(self, short_code: str, original_url: Optional[str], ttl: float):
+        with self._lock:
+            self._entries[short_code] = (original_url, time.monotonic() + ttl)
+            self._entries.move_to_end(short_code)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def set(self, short_code: str, original_url: str):
+        self._store(short_code, original_url, self.ttl)
+
+    def set_negative(self, short_code: str):
+        self._store(short_code, None, self.negative_ttl)
+
+    def invalidate(self, short_code: str):
+        with self._lock:
+            if self._entries.pop(short_code, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+class CacheInvalidator:
+    """
+    Cross-worker invalidation for LocalURLCache over Redis pub/sub.
+
+    `publish` broadcasts a short code on `channel`; every worker runs one
+    subscriber thread that drops that code from its local cache. Whenever the
+    subscription is (re)established the local cache is cleared, since messages
+    sent while disconnected are lost.
+    """
+
+    def __init__(self, redis_client, cache: LocalURLCache, channel: str = 'url-cache:invalidate'):
+        self.redis = redis_client
+        self.cache = cache
+        self.channel = channel
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="url-cache-invalidator", daemon=True)
+            self._thread.start()
+
+    def publish(self, short_code: str):
+        self.cache.invalidate(short_code)
+        self.redis.publish(self.channel, short_code)
+
+    def _run(self):
+        delay = 0.5
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.cache.clear()
+                delay = 0.5
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        self.cache.invalidate(message['data'])
+            except Exception as e:
+                logging.error("Cache invalidation subscriber error, resubscribing in %ss: %s", delay, e)
+                time.sleep(delay)
+                delay = min(delay * 2, 10.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
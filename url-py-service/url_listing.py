@@ -0,0 +1,75 @@
+import base64
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+from url_cache import LocalURLCache
+
+
+def encode_cursor(created_at: datetime, url_id) -> str:
+    """Opaque keyset cursor for the row a page ended on"""
+    raw = json.dumps([created_at.isoformat(), str(url_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor. Raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, url_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(url_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class ListingCache:
+    """
+    Short-TTL per-worker cache of rendered /api/v1/urls pages.
+
+    Pages are keyed by their query plus a listing version kept in Redis
+    (`version_key`). Writers call `bump()` once new rows are in Postgres, which
+    makes every worker's cached pages unreachable at once; the TTL bounds how
+    stale click counts can get in between. Each page carries an ETag derived
+    from its body so polling clients can revalidate with If-None-Match.
+    """
+
+    def __init__(self, redis_client, version_key: str = 'urls:list-version',
+                 ttl: float = 2.0, max_size: int = 256):
+        self.redis = redis_client
+        self.version_key = version_key
+        self._pages = LocalURLCache(max_size=max_size, ttl=ttl, negative_ttl=0)
+        self.bumps = 0
+
+    def version(self) -> Optional[str]:
+        """Current listing version; None when Redis is unavailable (serve uncached)"""
+        try:
+            return self.redis.get(self.version_key) or '0'
+        except Exception as e:
+            logging.error("Failed to read listing version: %s", e)
+            return None
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        found, page = self._pages.get(key)
+        return page if found else None
+
+    @staticmethod
+    def etag_for(body: bytes) -> str:
+        return hashlib.md5(body).hexdigest()
+
+    def set(self, key: str, body: bytes) -> str:
+        """Cache a rendered page and return its ETag"""
+        etag = self.etag_for(body)
+        self._pages.set(key, (body, etag))
+        return etag
+
+    def bump(self):
+        try:
+            self.redis.incr(self.version_key)
+            self.bumps += 1
+        except Exception as e:
+            logging.error("Failed to bump listing version: %s", e)
+
+    def stats(self) -> dict:
+        return dict(self._pages.stats(), bumps=self.bumps)
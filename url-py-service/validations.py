@@ -1,11 +1,15 @@
 # NEW
-from urllib.parse import urlparse
+import os
 import re
-from typing import Optional
+import string
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
 import validators
 from bleach import clean
 import logging
 
+from codegen import SHORT_CODE_LENGTH
+
 
 # Check for shell command injection attempts
 
@@ -23,52 +27,101 @@ DANGEROUS_PATTERNS = [
     r'\$\(',              # Command substitution
 ]
 
+# All patterns compiled once into a single alternation: one scan per URL instead of one per pattern
+DANGEROUS_RE = re.compile('|'.join(f'(?:{pattern})' for pattern in DANGEROUS_PATTERNS), re.IGNORECASE)
+
+INTERNAL_HOSTS = ('localhost', '127.0.0.1')
+INTERNAL_PREFIXES = ('192.168.', '10.')
+SHELL_EXTENSIONS = ('.sh', '.bash', '.zsh', '.fish')
+
+# Short codes: base62 plus the URL-safe '-' and '_' some pre-generators use,
+# no longer than the codes the generator issues
+SHORT_CODE_MAX_LENGTH = SHORT_CODE_LENGTH
+SHORT_CODE_CHARS = frozenset(string.ascii_letters + string.digits + '-_')
+
+# Rejected redirect lookups by reason
+short_code_rejects = {"length": 0, "alphabet": 0}
+
+# Distinct URLs whose verdict is remembered per worker
+VALIDATION_CACHE_SIZE = int(os.getenv('VALIDATION_CACHE_SIZE', '65536'))
+
+
 def check(url):
-    parsed = urlparse(url)
-    
     # Block localhost and internal IP addresses
     hostname = url.lower()
-    if hostname in ['localhost', '127.0.0.1'] or hostname.startswith('192.168.') or hostname.startswith('10.'):
-        
+    if hostname in INTERNAL_HOSTS or hostname.startswith(INTERNAL_PREFIXES):
+
         return False, "Internal/localhost URLs are not allowed"
-        
+
     # Block common shell script extensions
-    if any(url.endswith(ext) for ext in ['.sh', '.bash', '.zsh', '.fish']):
+    if url.endswith(SHELL_EXTENSIONS):
         return False, "Shell script URLs are not allowed"
-        
-    
-    
-    for pattern in DANGEROUS_PATTERNS:
-        if re.search(pattern, url, re.IGNORECASE):
-            return False, "URL contains potentially dangerous patterns"
-            
+
+    if DANGEROUS_RE.search(url):
+        return False, "URL contains potentially dangerous patterns"
+
+    return True, None
+
+
+def is_valid_short_code(code: str) -> Tuple[bool, Optional[str]]:
+    """
+    Fast path for redirect lookups: a length check plus a set-membership scan
+    over the code's characters. No regex and no URL parsing.
+    """
+    if not code or len(code) > SHORT_CODE_MAX_LENGTH:
+        short_code_rejects["length"] += 1
+        return False, "Invalid short code"
+    if not SHORT_CODE_CHARS.issuperset(code):
+        short_code_rejects["alphabet"] += 1
+        return False, "Invalid short code"
     return True, None
 
 
 def is_valid_url_cache(url: str):
     if len(url) > 7:
         return False, "Invalid Cache"
-    
+
     return check(url)
 
-def is_valid_url(url: str) -> tuple[bool, Optional[str]]:
-    """
-    Validate URLs against various security criteria.
-    Returns (is_valid, error_message)
-    """
-    if not url:
-        return False, "URL cannot be empty"
-        
+
+@lru_cache(maxsize=VALIDATION_CACHE_SIZE)
+def _validate_url(url: str) -> Tuple[bool, Optional[str]]:
     # Basic URL cleanup
     url = url.strip()
     url = clean(url)  # Sanitize HTML/scripts
-    
+
     try:
         # Basic URL validation
         if not validators.url(url):
             return False, "Invalid URL format"
-            
+
         return check(url)
-        
+
     except Exception as e:
         return False, f"URL validation error: {str(e)}"
+
+
+def is_valid_url(url: str) -> tuple[bool, Optional[str]]:
+    """
+    Validate URLs against various security criteria.
+    Returns (is_valid, error_message)
+    """
+    if not url:
+        return False, "URL cannot be empty"
+
+    return _validate_url(url)
+
+
+def validate_many(urls: Iterable[str]) -> List[Tuple[bool, Optional[str]]]:
+    """
+    Validate a batch of URLs, returning one (is_valid, error_message) per input in order.
+    Duplicates within the batch are validated once.
+    """
+    urls = list(urls)
+    verdicts = {url: is_valid_url(url) for url in set(urls)}
+    return [verdicts[url] for url in urls]
+
+
+def validation_cache_stats() -> dict:
+    info = _validate_url.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
@@ -0,0 +1,65 @@
+"""
+Preload the most-clicked links from `urls` into the Redis URL cache.
+
+    python warmup.py --top 100000 --batch 1000
+
+Writes go through URLStore with the same codec/layout settings as the app
+(CACHE_CODEC, CACHE_HASH_PREFIX, ...), one pipeline per batch, with the hot
+TTL. gunicorn.conf.py runs this in the background on startup when
+CACHE_WARMUP_TOP is set.
+"""
+import argparse
+import logging
+import os
+import time
+
+from cache_codec import create_codec
+from redis_store import URLStore
+
+
+def warm_cache(url_store: URLStore, rows: list, ttl: int, batch: int = 1000) -> int:
+    """Store (short_code, original_url, clicks) rows in pipelined batches; returns the number written"""
+    written = 0
+    for start in range(0, len(rows), batch):
+        chunk = rows[start:start + batch]
+        url_store.store_urls({short_code: original_url for short_code, original_url, _clicks in chunk}, ttl=ttl)
+        written += len(chunk)
+    return written
+
+
+def main():
+    import redis
+
+    from db.pg_connector import fetch_top_urls
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Preload the most-clicked links into the Redis URL cache")
+    parser.add_argument('--top', type=int, default=int(os.getenv('CACHE_WARMUP_TOP', '10000')),
+                        help="Number of most-clicked links to load")
+    parser.add_argument('--batch', type=int, default=1000, help="Links written per pipeline")
+    parser.add_argument('--ttl', type=int, default=int(os.getenv('CACHE_TTL_HOT', str(30 * 86400))),
+                        help="TTL for warmed entries (seconds)")
+    args = parser.parse_args()
+
+    client = redis.Redis(
+        host=os.getenv('REDIS_PC'),
+        port=6379,
+        password=os.getenv('REDIS_PASSWORD', 'Welcome@Inf0r'),
+    )
+    url_store = URLStore(
+        client,
+        client,
+        codec=create_codec(os.getenv('CACHE_CODEC', 'compact'),
+                           compress_min_length=int(os.getenv('CACHE_COMPRESS_MIN_LENGTH', '24'))),
+        hash_prefix=os.getenv('CACHE_HASH_PREFIX', ''),
+        hash_buckets=int(os.getenv('CACHE_HASH_BUCKETS', '65536')),
+    )
+
+    started = time.monotonic()
+    rows = fetch_top_urls(args.top)
+    written = warm_cache(url_store, rows, args.ttl, args.batch)
+    logging.info("Warmed %d links in %.1fs", written, time.monotonic() - started)
+
+
+if __name__ == '__main__':
+    main()
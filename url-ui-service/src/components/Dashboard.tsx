@@ -130,6 +130,12 @@ export function Dashboard() {
         }
       };
 
+      // Sent when the events missed while disconnected could not all be replayed
+      urlUpdatesEventSource.addEventListener('reset', () => {
+        setUrlUpdates([]);
+        fetchUrls();
+      });
+
       urlUpdatesEventSource.onerror = (error) => {
         console.error('URL Updates SSE error:', error);
         setSseStatus(prev => ({ ...prev, urlUpdates: 'Error' }));